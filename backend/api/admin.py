@@ -1,33 +1,297 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from . import signals, summaries
 from .models import (
     MuscleGroup, Exercise, Workout, WorkoutExercise, Plan,
-    ExerciseMuscleActivation # Import the new model
+    ExerciseMuscleActivation, # Import the new model
+    RequestProfile,
 )
 
+# Tables smaller than this are counted exactly
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    COUNT(*) on a 100k+ row table is a full scan in Postgres. For unfiltered
+    changelists use the planner's row estimate instead (kept fresh by autovacuum);
+    searches and filters still get an exact count.
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist defaults for big tables: estimated counts and no second 'show all' count query."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def is_changelist(self, request):
+        # get_queryset also backs autocomplete lookups, which shouldn't pay for list-only annotations
+        match = request.resolver_match
+        return match is not None and match.url_name.endswith('_changelist')
+
+
+class MuscleGroupAdmin(ScalableAdmin):
+    list_display = ('name', 'exercise_count')
+    search_fields = ('name',) # Used by the autocomplete widgets below
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.is_changelist(request):
+            queryset = queryset.annotate(exercise_count=Count('exercise_activations'))
+        return queryset
+
+    @admin.display(ordering='exercise_count', description='Exercises')
+    def exercise_count(self, obj):
+        return obj.exercise_count
+
 # Inline admin for the Exercise<->MuscleGroup relationship
 class ExerciseMuscleActivationInline(admin.TabularInline):
     model = ExerciseMuscleActivation
     extra = 1 # Show one empty form by default
+    # Search-as-you-type instead of a <select> with every muscle group, repeated per row
+    autocomplete_fields = ('muscle_group',)
 
-class ExerciseAdmin(admin.ModelAdmin):
+    def get_queryset(self, request):
+        # __str__ shows the exercise and muscle group names
+        return super().get_queryset(request).select_related('exercise', 'muscle_group')
+
+class ExerciseAdmin(ScalableAdmin):
     inlines = (ExerciseMuscleActivationInline,)
-    list_display = ('name', 'description') # Customize as needed
+    list_display = ('name', 'description', 'activation_count') # Customize as needed
     search_fields = ('name',)
+    ordering = ('id',)
+    change_list_template = 'admin/api/exercise/change_list.html' # Adds the activation matrix link
+    matrix_page_size = 50
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.is_changelist(request):
+            queryset = queryset.annotate(activation_count=Count('muscle_activations'))
+        return queryset
+
+    @admin.display(ordering='activation_count', description='Muscle groups')
+    def activation_count(self, obj):
+        return obj.activation_count
+
+    def get_urls(self):
+        return [
+            path('activation-matrix/', self.admin_site.admin_view(self.activation_matrix_view),
+                 name='api_exercise_activation_matrix'),
+        ] + super().get_urls()
+
+    def activation_matrix_view(self, request):
+        """Edit the activation levels of a page of exercises against every muscle group at once."""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        if request.method == 'POST':
+            try:
+                exercise_ids = [int(value) for value in request.POST.getlist('exercise')]
+            except ValueError:
+                self.message_user(request, 'Invalid exercise id in the submitted form; nothing was saved.', messages.ERROR)
+                return redirect(request.get_full_path())
+            # Ids of exercises deleted since the page was rendered would fail the insert
+            exercise_ids = list(Exercise.objects.filter(id__in=exercise_ids).values_list('id', flat=True))
+            group_ids = list(MuscleGroup.objects.values_list('id', flat=True))
+            levels = {
+                (exercise_id, group_id): request.POST.get(f'act-{exercise_id}-{group_id}', '')
+                for exercise_id in exercise_ids for group_id in group_ids
+            }
+            changed = save_activation_matrix(exercise_ids, levels)
+            self.message_user(request, f'Saved {changed} activation changes.', messages.SUCCESS)
+            return redirect(request.get_full_path())
+
+        exercises = Exercise.objects.order_by('id').only('id', 'name')
+        query = request.GET.get('q', '')
+        if query:
+            exercises = exercises.filter(name__icontains=query)
+        page = Paginator(exercises, self.matrix_page_size).get_page(request.GET.get('p'))
+        groups = list(MuscleGroup.objects.order_by('name'))
+        current = {
+            (exercise_id, group_id): level
+            for exercise_id, group_id, level in ExerciseMuscleActivation.objects.filter(
+                exercise__in=[exercise.id for exercise in page]
+            ).values_list('exercise_id', 'muscle_group_id', 'activation_level')
+        }
+        rows = [
+            (exercise, [(group.id, current.get((exercise.id, group.id), '')) for group in groups])
+            for exercise in page
+        ]
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Muscle activation matrix',
+            'groups': groups,
+            'rows': rows,
+            'page': page,
+            'query': query,
+            'levels': ExerciseMuscleActivation.ActivationLevel.choices,
+            'changelist_url': reverse('admin:api_exercise_changelist'),
+        }
+        return TemplateResponse(request, 'admin/api/exercise/activation_matrix.html', context)
+
+
+@transaction.atomic
+def save_activation_matrix(exercise_ids, levels):
+    """
+    Apply {(exercise_id, muscle_group_id): level or ''} for the given exercises with
+    one bulk insert, update and delete. Returns the number of changed cells.
+    """
+    existing = {
+        (activation.exercise_id, activation.muscle_group_id): activation
+        for activation in ExerciseMuscleActivation.objects.select_for_update().filter(exercise_id__in=exercise_ids)
+    }
+    valid_levels = set(ExerciseMuscleActivation.ActivationLevel.values)
+    now = timezone.now() # bulk_update doesn't apply auto_now, and delta sync relies on updated_at
+    to_create, to_update, to_delete = [], [], []
+    for (exercise_id, group_id), level in levels.items():
+        activation = existing.get((exercise_id, group_id))
+        if level not in valid_levels:
+            if activation is not None:
+                to_delete.append(activation.pk)
+        elif activation is None:
+            to_create.append(ExerciseMuscleActivation(exercise_id=exercise_id, muscle_group_id=group_id, activation_level=level))
+        elif activation.activation_level != level:
+            activation.activation_level = level
+            activation.updated_at = now
+            to_update.append(activation)
+    ExerciseMuscleActivation.objects.bulk_create(to_create)
+    ExerciseMuscleActivation.objects.bulk_update(to_update, ['activation_level', 'updated_at'])
+    ExerciseMuscleActivation.objects.filter(pk__in=to_delete).delete() # Sends the signals (sync tombstones)
+    if to_create or to_update:
+        # Bulk writes skip the per-row signals: bump the catalog once and refresh affected workouts and rankings
+        signals.catalog_changed()
+        signals.refresh_summaries_later(exercise_ids=sorted(set(exercise_ids)))
+        signals.refresh_rankings_later(exercise_ids=sorted(set(exercise_ids)))
+    return len(to_create) + len(to_update) + len(to_delete)
+
 
 class WorkoutExerciseInline(admin.TabularInline): # Optional: Inline for Workout<->Exercise
     model = WorkoutExercise
     extra = 1
+    autocomplete_fields = ('exercise',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('workout', 'exercise')
 
-class WorkoutAdmin(admin.ModelAdmin):
+class WorkoutAdmin(ScalableAdmin):
     inlines = (WorkoutExerciseInline,)
-    list_display = ('name', 'description')
+    # exercise_count / total_sets are the denormalized summary columns, so no joins here
+    list_display = ('name', 'owner', 'is_public', 'exercise_count', 'total_sets')
+    list_select_related = ('owner',)
+    list_filter = ('is_public',)
     search_fields = ('name',)
+    autocomplete_fields = ('owner',)
+    readonly_fields = ('exercise_count', 'total_sets', 'muscle_group_ids')
+    ordering = ('id',)
+
+    def save_model(self, request, obj, form, change):
+        if change: # Read by the save signal, like WorkoutSerializer.update sets it
+            obj._was_public = form.initial.get('is_public', True)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        with signals.enqueue_once(): # One rankings refresh for all the inline rows
+            super().save_related(request, form, formsets, change)
+        # The inline rows are saved one by one, so recompute the summary once at the end
+        summaries.refresh([form.instance.pk])
+
+class PlanAdmin(ScalableAdmin):
+    list_display = ('name', 'owner', 'is_active', 'start_date')
+    list_select_related = ('owner',) # __str__ shows the owner's username
+    list_filter = ('is_active',)
+    search_fields = ('name', 'owner__username')
+    autocomplete_fields = ('owner', *[f'day{day}_workout' for day in range(1, 8)])
+    ordering = ('id',)
+
+class RequestProfileAdmin(ScalableAdmin):
+    """Profiles captured by api.profiling (X-Profile header / PROFILING_SAMPLE_RATE). Read-only."""
+    list_display = ('created_at', 'method', 'path', 'user', 'status_code', 'duration_ms', 'query_count', 'mode', 'trigger')
+    list_select_related = ('user',)
+    list_filter = ('mode', 'trigger')
+    search_fields = ('path',)
+    ordering = ('-id',)
+    fields = (
+        'created_at', 'method', 'path', 'user', 'status_code', 'mode', 'trigger',
+        'duration_ms', 'query_count', 'breakdown_table', 'download', 'report_text',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.is_changelist(request):
+            queryset = queryset.defer('report', 'data') # Can be hundreds of KB each
+        return queryset
+
+    @admin.display(description='Time by subsystem')
+    def breakdown_table(self, obj):
+        total = sum(obj.breakdown.values()) or 1
+        rows = sorted(obj.breakdown.items(), key=lambda item: -item[1])
+        return format_html('<table>{}</table>', format_html_join(
+            '', '<tr><th>{}</th><td>{} ms</td><td>{}%</td></tr>',
+            ((name, ms, round(ms * 100 / total, 1)) for name, ms in rows),
+        ))
+
+    @admin.display(description='Report')
+    def report_text(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto">{}</pre>', obj.report)
+
+    @admin.display(description='Raw profile')
+    def download(self, obj):
+        url = reverse('admin:api_requestprofile_download', args=[obj.pk])
+        hint = 'pstats dump (snakeviz, python -m pstats)' if obj.mode == 'cprofile' else 'collapsed stacks (speedscope, flamegraph.pl)'
+        return format_html('<a href="{}">Download</a> – {}', url, hint)
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                 name='api_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = RequestProfile.objects.filter(pk=pk).first()
+        if profile is None:
+            return HttpResponse(status=404)
+        extension, content_type = ('prof', 'application/octet-stream') if profile.mode == 'cprofile' else ('txt', 'text/plain')
+        response = HttpResponse(bytes(profile.data), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.{extension}"'
+        return response
 
 
-admin.site.register(MuscleGroup)
+admin.site.register(MuscleGroup, MuscleGroupAdmin)
 admin.site.register(Exercise, ExerciseAdmin) # Use the custom admin
 admin.site.register(Workout, WorkoutAdmin) # Use the custom admin
-admin.site.register(Plan)
+admin.site.register(Plan, PlanAdmin)
+admin.site.register(RequestProfile, RequestProfileAdmin)
 # Optional: Register intermediate models directly if needed for debugging
 # admin.site.register(WorkoutExercise)
-# admin.site.register(ExerciseMuscleActivation)
\ No newline at end of file
+# admin.site.register(ExerciseMuscleActivation)
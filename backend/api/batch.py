@@ -0,0 +1,130 @@
+"""
+Run several API operations in one request and one transaction.
+
+Each operation is {"method": "POST", "path": "workouts/", "body": {...}}.
+Later operations can use results of earlier ones:
+  - in a path:   "plans/{1.id}/"          -> id from operation 1's response body
+  - in a body:   {"day3_workout": {"$ref": "0.id"}}
+Indexes are 0-based and refer to operations earlier in the list.
+
+Operations are dispatched straight to the viewsets (no middleware) with the
+already authenticated user, so the JWT is verified once per batch.
+"""
+import io
+import json
+import re
+from urllib.parse import urlsplit
+
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+ALLOWED_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+API_PREFIX = '/api/'
+_PATH_REF = re.compile(r'\{(\d+)\.([\w.]+)\}')
+
+
+class BatchError(Exception):
+    """An operation is malformed or references something unavailable."""
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _lookup(results, index, field_path, current):
+    if index >= current:
+        raise BatchError(current, f'Operation {current} can only reference earlier operations.')
+    value = results[index]['body']
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            raise BatchError(current, f'Operation {index} has no "{field_path}" in its result.')
+        value = value[part]
+    return value
+
+
+def _resolve_refs(value, results, current):
+    if isinstance(value, dict):
+        if set(value) == {'$ref'}:
+            index, _, field_path = str(value['$ref']).partition('.')
+            if not index.isdigit() or not field_path:
+                raise BatchError(current, f'Bad reference "{value["$ref"]}", expected "<index>.<field>".')
+            return _lookup(results, int(index), field_path, current)
+        return {key: _resolve_refs(item, results, current) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve_refs(item, results, current) for item in value]
+    return value
+
+
+def _build_request(outer, method, path, body):
+    """A bare HttpRequest for one operation, carrying the outer request's user."""
+    split = urlsplit(path)
+    payload = json.dumps(body).encode() if body is not None else b''
+    inner = HttpRequest()
+    inner.method = method
+    inner.path = inner.path_info = split.path
+    inner.META = {
+        key: value for key, value in outer.META.items()
+        if key not in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH')
+    }
+    inner.META.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': split.path,
+        'QUERY_STRING': split.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+    })
+    inner.GET = QueryDict(split.query)
+    inner._stream = io.BytesIO(payload)
+    inner._read_started = False
+    # DRF's ForcedAuthentication picks these up, so the JWT isn't decoded again
+    inner._force_auth_user = outer.user
+    inner._force_auth_token = outer.auth
+    return inner
+
+
+def run_batch(request, operations, allowed_views):
+    """
+    Execute operations in order inside one transaction.
+    Returns (ok, results). On the first failing operation everything is rolled back
+    and the remaining operations are reported as skipped.
+    """
+    results = []
+    try:
+        with transaction.atomic():
+            for index, operation in enumerate(operations):
+                if not isinstance(operation, dict):
+                    raise BatchError(index, 'Each operation must be an object.')
+                method = str(operation.get('method', '')).upper()
+                if method not in ALLOWED_METHODS:
+                    raise BatchError(index, f'Unsupported method "{method}".')
+                path = _PATH_REF.sub(
+                    lambda m: str(_lookup(results, int(m.group(1)), m.group(2), index)),
+                    str(operation.get('path', '')),
+                )
+                if not path.startswith(API_PREFIX):
+                    path = API_PREFIX + path.lstrip('/')
+                try:
+                    match = resolve(urlsplit(path).path)
+                except Resolver404:
+                    raise BatchError(index, f'No endpoint at "{path}".')
+                if getattr(match.func, 'cls', None) not in allowed_views:
+                    raise BatchError(index, f'"{path}" cannot be used in a batch.')
+
+                body = _resolve_refs(operation.get('body'), results, index)
+                response = match.func(_build_request(request, method, path, body), *match.args, **match.kwargs)
+                results.append({'status': response.status_code, 'body': getattr(response, 'data', None)})
+                if response.status_code >= 400:
+                    raise _Rollback()
+    except BatchError as exc:
+        results.append({'status': 400, 'body': {'detail': str(exc)}})
+    except _Rollback:
+        pass
+    else:
+        return True, results
+
+    results.extend({'status': None, 'body': {'detail': 'Skipped.'}} for _ in operations[len(results):])
+    return False, results
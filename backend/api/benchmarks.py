@@ -0,0 +1,77 @@
+"""
+Shared helpers for the bench_* management commands.
+"""
+import statistics
+import threading
+import time
+
+
+def run_concurrent(fn, concurrency, iterations, setup=None, teardown=None):
+    """
+    Call fn() `iterations` times on each of `concurrency` threads.
+    Returns (latencies_in_seconds, wall_time_in_seconds).
+
+    setup/teardown run once per thread (e.g. to close that thread's DB connection).
+    """
+    latencies = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency)
+
+    def worker():
+        if setup:
+            setup()
+        local = []
+        start_barrier.wait() # Start every thread at the same moment
+        try:
+            for _ in range(iterations):
+                t0 = time.perf_counter()
+                fn()
+                local.append(time.perf_counter() - t0)
+        finally:
+            if teardown:
+                teardown()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - wall_start
+
+
+def summarize(latencies, wall_time=None):
+    """Percentiles in milliseconds (plus throughput if wall_time is given)."""
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    summary = {
+        'n': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+        'max_ms': ordered[-1] * 1000,
+    }
+    if wall_time:
+        summary['rps'] = len(ordered) / wall_time
+    return summary
+
+
+def format_summary(label, summary):
+    if not summary:
+        return f'{label}: no samples'
+    line = (
+        f"{label}: n={summary['n']} mean={summary['mean_ms']:.2f}ms "
+        f"p50={summary['p50_ms']:.2f}ms p95={summary['p95_ms']:.2f}ms "
+        f"p99={summary['p99_ms']:.2f}ms max={summary['max_ms']:.2f}ms"
+    )
+    if 'rps' in summary:
+        line += f" rps={summary['rps']:.0f}"
+    return line
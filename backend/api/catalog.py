@@ -0,0 +1,271 @@
+"""
+In-memory snapshot of the exercise catalog (MuscleGroup, Exercise, ExerciseMuscleActivation).
+
+The catalog changes rarely, so instead of prefetching it on every workout/plan
+read each worker keeps an immutable snapshot and reloads it lazily when the
+'catalog' DataVersion counter moves. The version is re-checked at most every
+CATALOG_VERSION_CHECK_INTERVAL seconds; writes made by this process invalidate
+the local snapshot immediately (see signals.py).
+
+If CATALOG_SNAPSHOT_PATH is set, the snapshot is also written to a compact
+binary file which other worker processes memory-map instead of querying the
+database themselves.
+
+Records only carry the attributes the read serializers use, so
+ExerciseSerializer / MuscleGroupSerializer can render them directly.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+from . import versioning
+from .models import Exercise, ExerciseMuscleActivation, MuscleGroup
+
+LEVEL_DISPLAY = dict(ExerciseMuscleActivation.ActivationLevel.choices)
+
+
+class MuscleGroupRecord:
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+class ActivationRecord:
+    __slots__ = ('id', 'muscle_group', 'activation_level')
+
+    def __init__(self, id, muscle_group, activation_level):
+        self.id = id
+        self.muscle_group = muscle_group # MuscleGroupRecord
+        self.activation_level = activation_level
+
+    def get_activation_level_display(self):
+        return LEVEL_DISPLAY.get(self.activation_level, self.activation_level)
+
+
+class ExerciseRecord:
+    __slots__ = ('id', 'name', 'description', 'muscle_activations')
+
+    def __init__(self, id, name, description, muscle_activations):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.muscle_activations = muscle_activations # tuple of ActivationRecord
+
+    def __str__(self):
+        return self.name
+
+
+class CatalogSnapshot:
+    """
+    Immutable catalog at one version. The activation table is kept column-wise
+    in arrays; the records above are built once from those columns.
+    """
+    __slots__ = (
+        'version', 'group_ids', 'group_names', 'exercise_ids', 'exercise_names',
+        'exercise_descriptions', 'act_ids', 'act_exercise_ids', 'act_group_ids', 'act_levels',
+        'muscle_groups', 'exercises',
+    )
+
+    def __init__(self, version, group_ids, group_names, exercise_ids, exercise_names,
+                 exercise_descriptions, act_ids, act_exercise_ids, act_group_ids, act_levels):
+        self.version = version
+        self.group_ids = group_ids
+        self.group_names = group_names
+        self.exercise_ids = exercise_ids
+        self.exercise_names = exercise_names
+        self.exercise_descriptions = exercise_descriptions
+        self.act_ids = act_ids
+        self.act_exercise_ids = act_exercise_ids
+        self.act_group_ids = act_group_ids
+        self.act_levels = act_levels # bytes, one ASCII level code per activation
+
+        self.muscle_groups = {
+            group_id: MuscleGroupRecord(group_id, name)
+            for group_id, name in zip(group_ids, group_names)
+        }
+        activations = {exercise_id: [] for exercise_id in exercise_ids}
+        for i, act_id in enumerate(act_ids):
+            activations[act_exercise_ids[i]].append(ActivationRecord(
+                act_id, self.muscle_groups[act_group_ids[i]], chr(act_levels[i])
+            ))
+        self.exercises = {
+            exercise_id: ExerciseRecord(exercise_id, name, description, tuple(activations[exercise_id]))
+            for exercise_id, name, description in zip(exercise_ids, exercise_names, exercise_descriptions)
+        }
+
+    def exercise_list(self):
+        """Exercises in primary-key order (the default queryset order)."""
+        return [self.exercises[exercise_id] for exercise_id in self.exercise_ids]
+
+    def muscle_group_list(self):
+        return [self.muscle_groups[group_id] for group_id in self.group_ids]
+
+
+def build_from_db(version):
+    groups = list(MuscleGroup.objects.order_by('pk').values_list('id', 'name'))
+    exercises = list(Exercise.objects.order_by('pk').values_list('id', 'name', 'description'))
+    acts = list(
+        ExerciseMuscleActivation.objects.order_by('pk')
+        .values_list('id', 'exercise_id', 'muscle_group_id', 'activation_level')
+    )
+    return CatalogSnapshot(
+        version,
+        array('q', (g[0] for g in groups)), [g[1] for g in groups],
+        array('q', (e[0] for e in exercises)), [e[1] for e in exercises], [e[2] for e in exercises],
+        array('q', (a[0] for a in acts)), array('q', (a[1] for a in acts)),
+        array('q', (a[2] for a in acts)), ''.join(a[3] for a in acts).encode('ascii'),
+    )
+
+
+# --- Shared snapshot file ---
+# Layout (little endian):
+#   header: magic, format, catalog version, n_groups, n_exercises, n_activations
+#   int64 columns: group ids, exercise ids, activation ids, activation exercise ids, activation group ids
+#   n_activations bytes of level codes
+#   int32 string lengths (-1 = NULL) for group names, exercise names, exercise descriptions
+#   UTF-8 string blob
+_HEADER = struct.Struct('<4sHQIII')
+_MAGIC = b'FTCS'
+_FORMAT = 1
+
+
+def write_snapshot_file(path, snapshot):
+    strings = [*snapshot.group_names, *snapshot.exercise_names, *snapshot.exercise_descriptions]
+    encoded = [s.encode('utf-8') if s is not None else None for s in strings]
+    lengths = array('i', (len(b) if b is not None else -1 for b in encoded))
+    parts = [
+        _HEADER.pack(_MAGIC, _FORMAT, snapshot.version, len(snapshot.group_ids),
+                     len(snapshot.exercise_ids), len(snapshot.act_ids)),
+        array('q', snapshot.group_ids).tobytes(),
+        array('q', snapshot.exercise_ids).tobytes(),
+        array('q', snapshot.act_ids).tobytes(),
+        array('q', snapshot.act_exercise_ids).tobytes(),
+        array('q', snapshot.act_group_ids).tobytes(),
+        bytes(snapshot.act_levels),
+        lengths.tobytes(),
+        b''.join(b for b in encoded if b is not None),
+    ]
+    # Write then rename, so readers only ever map a complete file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for part in parts:
+            f.write(part)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_file(path, version):
+    """Map the shared file; returns None if it is missing, corrupt or for another version."""
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError): # ValueError: empty file
+        return None
+    with mapped:
+        if len(mapped) < _HEADER.size:
+            return None
+        magic, fmt, file_version, n_groups, n_exercises, n_acts = _HEADER.unpack_from(mapped, 0)
+        if magic != _MAGIC or fmt != _FORMAT or file_version != version:
+            return None
+        n_strings = n_groups + 2 * n_exercises
+        # Slicing past the end doesn't fail, it comes back short: check the size instead
+        if len(mapped) < _HEADER.size + 8 * (n_groups + n_exercises + 3 * n_acts) + n_acts + 4 * n_strings:
+            return None
+        view = memoryview(mapped)
+        offset = _HEADER.size
+
+        def take_int64(count):
+            nonlocal offset
+            column = array('q')
+            column.frombytes(view[offset:offset + count * 8])
+            offset += count * 8
+            return column
+
+        try:
+            group_ids = take_int64(n_groups)
+            exercise_ids = take_int64(n_exercises)
+            act_ids = take_int64(n_acts)
+            act_exercise_ids = take_int64(n_acts)
+            act_group_ids = take_int64(n_acts)
+            act_levels = bytes(view[offset:offset + n_acts])
+            offset += n_acts
+            lengths = array('i')
+            lengths.frombytes(view[offset:offset + n_strings * 4])
+            offset += n_strings * 4
+            if len(mapped) != offset + sum(length for length in lengths if length > 0):
+                return None
+            strings = []
+            for length in lengths:
+                if length < 0:
+                    strings.append(None)
+                else:
+                    strings.append(str(view[offset:offset + length], 'utf-8'))
+                    offset += length
+        except ValueError: # Not UTF-8
+            return None
+        finally:
+            view.release()
+
+    return CatalogSnapshot(
+        version, group_ids, strings[:n_groups], exercise_ids,
+        strings[n_groups:n_groups + n_exercises], strings[n_groups + n_exercises:],
+        act_ids, act_exercise_ids, act_group_ids, act_levels,
+    )
+
+
+# --- Per-process cache ---
+_lock = threading.Lock()
+_snapshot = None
+_checked_at = 0.0
+
+
+def _load(version):
+    path = getattr(settings, 'CATALOG_SNAPSHOT_PATH', None)
+    if path:
+        snapshot = read_snapshot_file(path, version)
+        if snapshot is not None:
+            return snapshot
+    snapshot = build_from_db(version)
+    if path:
+        try:
+            write_snapshot_file(path, snapshot)
+        except OSError:
+            pass # Sharing is an optimisation; this worker still has its own copy
+    return snapshot
+
+
+def get_snapshot():
+    """Return the current catalog snapshot, reloading it if the catalog version changed."""
+    global _snapshot, _checked_at
+    snapshot = _snapshot
+    interval = getattr(settings, 'CATALOG_VERSION_CHECK_INTERVAL', 2.0)
+    if snapshot is not None and time.monotonic() - _checked_at < interval:
+        return snapshot
+    with _lock:
+        if _snapshot is not None and time.monotonic() - _checked_at < interval:
+            return _snapshot # Another thread just refreshed it
+        version = versioning.get_version(versioning.CATALOG)
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = _load(version)
+        _checked_at = time.monotonic()
+        return _snapshot
+
+
+def invalidate():
+    """Force the next get_snapshot() call to re-check the catalog version."""
+    global _checked_at
+    _checked_at = 0.0
+
+
+def get_exercise(exercise_id):
+    """ExerciseRecord for an id, or None if it isn't in the snapshot (yet)."""
+    return get_snapshot().exercises.get(exercise_id)
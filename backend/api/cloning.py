@@ -0,0 +1,89 @@
+"""
+Server-side deep copies of plans and workouts.
+
+A copy takes a fixed number of statements whatever its size: one SELECT of the
+source workouts, one bulk INSERT of the copies, one INSERT ... SELECT for all of
+their WorkoutExercise rows and (for plans) one INSERT of the plan itself.
+Workouts used on several days of a plan are copied once and shared by the
+copied days, like in the original.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import versioning
+from .models import Plan, Workout, WorkoutExercise
+
+DAYS = range(1, 8)
+
+
+def copy_name(name, model):
+    """'<name> (copy)', shortened to fit the model's name column."""
+    suffix = ' (copy)'
+    return name[:model._meta.get_field('name').max_length - len(suffix)] + suffix
+
+
+def _copy_workout_exercises(new_id_by_old_id, now):
+    """Copy the exercise rows of many workouts in a single INSERT ... SELECT."""
+    if not new_id_by_old_id:
+        return
+    qn = connection.ops.quote_name
+    table = qn(WorkoutExercise._meta.db_table)
+    rows = ', '.join(['(CAST(%s AS bigint), CAST(%s AS bigint))'] * len(new_id_by_old_id))
+    params = [value for pair in new_id_by_old_id.items() for value in pair]
+    sql = (
+        f'WITH id_map (old_id, new_id) AS (VALUES {rows}) '
+        f'INSERT INTO {table} ({qn("workout_id")}, {qn("exercise_id")}, {qn("target_sets")}, '
+        f'{qn("target_reps")}, {qn("updated_at")}) '
+        f'SELECT id_map.new_id, src.{qn("exercise_id")}, src.{qn("target_sets")}, '
+        f'src.{qn("target_reps")}, %s '
+        f'FROM {table} src JOIN id_map ON src.{qn("workout_id")} = id_map.old_id'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, connection.ops.adapt_datetimefield_value(now)])
+
+
+def clone_workouts(workout_ids, owner, names=None):
+    """
+    Copy workouts (and their exercise rows) into `owner`'s account as private workouts.
+    `names` optionally renames copies: {source workout id: name}.
+    Returns {source workout id: new Workout}.
+    """
+    names = names or {}
+    now = timezone.now()
+    sources = list(Workout.objects.filter(id__in=set(workout_ids)).order_by('id'))
+    copies = Workout.objects.bulk_create([
+        Workout(
+            name=names.get(source.id, source.name), description=source.description, owner=owner, is_public=False,
+            exercise_count=source.exercise_count, total_sets=source.total_sets,
+            muscle_group_ids=source.muscle_group_ids,
+        )
+        for source in sources
+    ])
+    mapping = {source.id: copy for source, copy in zip(sources, copies)}
+    _copy_workout_exercises({old_id: copy.id for old_id, copy in mapping.items()}, now)
+    # bulk_create / raw SQL don't send signals, so bump the owner's version by hand
+    versioning.bump_version(versioning.user_key(owner.id))
+    return mapping
+
+
+@transaction.atomic
+def clone_workout(workout, owner, name=None):
+    return clone_workouts([workout.id], owner, names={workout.id: name or copy_name(workout.name, Workout)})[workout.id]
+
+
+@transaction.atomic
+def clone_plan(plan, owner, name=None):
+    """Copy a plan together with every distinct workout its days reference."""
+    workout_ids = [getattr(plan, f'day{day}_workout_id') for day in DAYS]
+    mapping = clone_workouts([wid for wid in workout_ids if wid is not None], owner)
+    copy = Plan(
+        name=name or copy_name(plan.name, Plan),
+        description=plan.description,
+        owner=owner,
+        is_active=False,
+    )
+    for day, workout_id in zip(DAYS, workout_ids):
+        setattr(copy, f'day{day}_workout', mapping.get(workout_id))
+        setattr(copy, f'day{day}_is_rest', getattr(plan, f'day{day}_is_rest'))
+    copy.save()
+    return copy
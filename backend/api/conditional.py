@@ -0,0 +1,73 @@
+"""
+Conditional GET (ETag / If-None-Match) for list and detail endpoints.
+
+ETags are built from DataVersion counters, not from the response body, so an
+unchanged refetch is answered with 304 before any rows are loaded or serialized.
+"""
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import catalog, versioning
+
+
+def catalog_version():
+    """Version of the catalog snapshot this worker is serving (no query once loaded)."""
+    return catalog.get_snapshot().version
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    if '*' in candidates:
+        return True
+    # If-None-Match uses weak comparison, so ignore a W/ prefix added by proxies
+    bare = etag.removeprefix('W/')
+    return any(candidate.removeprefix('W/') == bare for candidate in candidates)
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag handling to list() and retrieve() of a viewset.
+    The tag is built from the version numbers the response depends on; any
+    write that changes the response must bump one of them. Catalog responses
+    only depend on the catalog; set etag_per_user for responses that embed
+    the caller's own workouts and the public templates.
+    """
+    etag_per_user = False
+
+    def get_etag_parts(self):
+        if not self.etag_per_user:
+            return (catalog_version(),)
+        # Rendered workouts embed catalog data; public ones can change under other owners
+        user_id = self.request.user.id
+        own_version, public_version = versioning.get_versions(
+            versioning.user_key(user_id), versioning.PUBLIC_WORKOUTS
+        )
+        return (user_id, own_version, public_version, catalog_version())
+
+    def get_etag(self):
+        parts = '.'.join(str(part) for part in self.get_etag_parts())
+        return quote_etag(f'{self.basename}-{parts}')
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag() # Before loading data, so the tag can only be older than the body
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        # Clients may keep the body but must revalidate; never share it between users
+        response['Cache-Control'] = 'private, no-cache'
+        response['Vary'] = 'Authorization'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,40 @@
+"""
+Helpers around the database connection pool configured in settings.DATABASES.
+"""
+from django.db import connections
+
+
+def get_pool(alias='default'):
+    """
+    Return the psycopg ConnectionPool for a database alias, or None when pooling is off.
+    """
+    return getattr(connections[alias], 'pool', None)
+
+
+def get_pool_stats(alias='default'):
+    """
+    Snapshot of the pool counters (empty dict when pooling is off).
+
+    in_use is derived from psycopg's pool_size/pool_available; the request
+    counters are cumulative since the pool was opened.
+    """
+    pool = get_pool(alias)
+    if pool is None:
+        return {}
+    stats = pool.get_stats()
+    size = stats.get('pool_size', 0)
+    return {
+        'size': size,
+        'min_size': stats.get('pool_min', pool.min_size),
+        'max_size': stats.get('pool_max', pool.max_size),
+        'available': stats.get('pool_available', 0),
+        'in_use': size - stats.get('pool_available', 0),
+        'requests_waiting': stats.get('requests_waiting', 0), # Waiting right now
+        'requests_total': stats.get('requests_num', 0),
+        'requests_queued': stats.get('requests_queued', 0), # Had to wait for a connection
+        'requests_wait_ms': stats.get('requests_wait_ms', 0),
+        'requests_errors': stats.get('requests_errors', 0), # Timed out / failed to get a connection
+        'connections_total': stats.get('connections_num', 0),
+        'connections_errors': stats.get('connections_errors', 0),
+        'connections_lost': stats.get('connections_lost', 0), # Failed the health check
+    }
@@ -0,0 +1,32 @@
+"""
+Password hashers that run on the bounded hashing pool (api/hashing.py).
+
+The algorithm names are unchanged ("argon2", "pbkdf2_sha256"), so existing
+hashes stay valid. Because the argon2 hasher is first in PASSWORD_HASHERS,
+Django's check_password() transparently re-hashes a user's password on their
+next successful login whenever it was made by another hasher or with
+different cost parameters (ARGON2_* settings).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+from . import hashing
+
+
+class PooledHasherMixin:
+    def encode(self, password, salt, *args, **kwargs):
+        return hashing.run(lambda: super(PooledHasherMixin, self).encode(password, salt, *args, **kwargs))
+
+    def verify(self, password, encoded):
+        return hashing.run(lambda: super(PooledHasherMixin, self).verify(password, encoded))
+
+
+class PooledArgon2PasswordHasher(PooledHasherMixin, Argon2PasswordHasher):
+    """Argon2id with costs tuned through settings (memory_cost is in KiB)."""
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class PooledPBKDF2PasswordHasher(PooledHasherMixin, PBKDF2PasswordHasher):
+    """Verifies passwords stored before the switch to argon2."""
@@ -0,0 +1,91 @@
+"""
+Bounded executor for password hashing.
+
+Hashing is deliberately slow, so during a login burst it could occupy every
+request worker. Instead, hashes run on a small thread pool (argon2 and
+PBKDF2 release the GIL) behind an admission limit: at most
+PASSWORD_HASHING_MAX_PENDING hashes may be running or queued per process.
+Inside reject_when_busy() (the API's login and registration views) a hash
+beyond that raises HashingBusy straight away, which the view answers with
+HTTP 429 + Retry-After, freeing the worker to serve ordinary API reads.
+Other callers (the admin login, authenticate() in a management command)
+can't answer 429, so they wait for a slot.
+
+Used by the hashers in api/hashers.py, so login, registration and password
+changes all go through it.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_stats = {'submitted': 0, 'rejected': 0, 'in_flight': 0}
+
+
+_rejecting = threading.local()
+
+
+class HashingBusy(Exception):
+    """The admission limit is reached; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Password hashing is busy, retry in {retry_after} s')
+        self.retry_after = retry_after
+
+
+@contextmanager
+def reject_when_busy():
+    """Within the block, run() raises HashingBusy at the admission limit instead of waiting for a slot."""
+    previous = getattr(_rejecting, 'active', False)
+    _rejecting.active = True
+    try:
+        yield
+    finally:
+        _rejecting.active = previous
+
+
+def _get_executor():
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_MAX_PENDING)
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='password-hash',
+                )
+    return _executor
+
+
+def run(fn, *args):
+    """
+    Run fn(*args) on the hashing pool and wait for the result.
+    At the admission limit, raises HashingBusy inside reject_when_busy() and waits for a slot elsewhere.
+    """
+    if not settings.PASSWORD_HASHING_POOL:
+        return fn(*args)
+    executor = _get_executor()
+    if getattr(_rejecting, 'active', False):
+        if not _slots.acquire(blocking=False):
+            with _lock:
+                _stats['rejected'] += 1
+            raise HashingBusy(settings.PASSWORD_HASHING_RETRY_AFTER)
+    else:
+        _slots.acquire()
+    with _lock:
+        _stats['submitted'] += 1
+        _stats['in_flight'] += 1
+    try:
+        return executor.submit(fn, *args).result()
+    finally:
+        with _lock:
+            _stats['in_flight'] -= 1
+        _slots.release()
+
+
+def get_stats():
+    with _lock:
+        return dict(_stats)
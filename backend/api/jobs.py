@@ -0,0 +1,196 @@
+"""
+Background jobs stored in the database (the api_job table); no broker needed.
+
+Code registers a task with @task('name') and queues it with enqueue('name', ...).
+The run_jobs management command claims due jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers (threads and
+processes, on one machine or several) can share the table without handing out
+the same job twice. A claimed job holds a lease (JOBS_LEASE_SECONDS), which the
+worker renews while the job runs. If the worker dies, the lease runs out and the
+job is picked up again.
+
+A failing job is retried with exponential backoff and jitter until it reaches
+max_attempts, then marked failed with the last error.
+
+Maintenance tasks listed in JOBS_SCHEDULE (task name -> seconds) are queued by
+every run_jobs process that often; unique=True keeps one copy in the queue.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+class UnknownTask(Exception):
+    pass
+
+
+def task(name, max_attempts=None):
+    """Register a function as a job task: @task('catalog.rebuild_snapshot')."""
+    def decorator(fn):
+        _tasks[name] = (fn, max_attempts)
+        return fn
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise UnknownTask(name) from None
+
+
+def enqueue(name, args=None, owner=None, priority=0, delay=0, unique=False):
+    """
+    Queue a job and return it. `args` are keyword arguments for the task (JSON-serialisable).
+    With unique=True nothing is added if the same task (with the same args) is already waiting to run.
+    """
+    _, max_attempts = get_task(name)
+    args = args or {}
+    if unique:
+        pending = Job.objects.filter(task=name, args=args, status=Job.Status.QUEUED, owner=owner).first()
+        if pending is not None:
+            return pending
+    return Job.objects.create(
+        task=name,
+        args=args,
+        owner=owner,
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    )
+
+
+def _claimable(now):
+    return Q(status=Job.Status.QUEUED, run_at__lte=now) | Q(status=Job.Status.RUNNING, locked_until__lt=now)
+
+
+def claim(worker_id, limit):
+    """Lease up to `limit` due jobs to this worker and return them (highest priority first)."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(_claimable(now))
+            .order_by('-priority', 'run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(id__in=ids).update(
+            status=Job.Status.RUNNING,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+        return list(Job.objects.filter(id__in=ids).order_by('-priority', 'run_at', 'id'))
+
+
+def renew_leases(worker_id):
+    """Extend the leases of every job this worker is still running."""
+    return Job.objects.filter(status=Job.Status.RUNNING, locked_by=worker_id).update(
+        locked_until=timezone.now() + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    )
+
+
+def retry_delay(attempts):
+    """Seconds before retry number `attempts`: exponential, capped, with jitter so retries don't stampede."""
+    delay = min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOBS_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _finish(job, worker_id, **fields):
+    # Only the lease holder may finish a job; if ours expired another worker owns it now
+    updated = Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING, locked_by=worker_id).update(
+        locked_by='', locked_until=None, **fields
+    )
+    if not updated:
+        logger.warning('Lost the lease on job %s before it finished', job.pk)
+
+
+def run_job(job, worker_id):
+    """Run one claimed job and record the outcome. Meant to be called from a worker thread."""
+    close_old_connections()
+    try:
+        if job.attempts > job.max_attempts:
+            # Its worker died during the last attempt
+            _finish(job, worker_id, status=Job.Status.FAILED, finished_at=timezone.now(),
+                    last_error=job.last_error or 'Worker stopped during the final attempt.')
+            return
+        try:
+            fn, _ = get_task(job.task)
+            result = fn(**job.args)
+        except Exception as exc:
+            logger.exception('Job %s (%s) failed on attempt %s', job.pk, job.task, job.attempts)
+            error = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+            if job.attempts < job.max_attempts and not isinstance(exc, UnknownTask):
+                _finish(job, worker_id, status=Job.Status.QUEUED, last_error=error,
+                        run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)))
+            else:
+                _finish(job, worker_id, status=Job.Status.FAILED, last_error=error, finished_at=timezone.now())
+        else:
+            _finish(job, worker_id, status=Job.Status.SUCCEEDED, result=result, finished_at=timezone.now())
+    finally:
+        close_old_connections()
+
+
+def queue_scheduled(queued_at, now):
+    """
+    Queue the JOBS_SCHEDULE tasks that are due. `queued_at` maps task name to the
+    monotonic time this worker last queued it and is updated in place.
+    """
+    for name, interval in settings.JOBS_SCHEDULE.items():
+        last = queued_at.get(name)
+        if last is None or now - last >= interval:
+            enqueue(name, priority=-10, unique=True)
+            queued_at[name] = now
+
+
+def prune_finished(batch_size=None):
+    """Delete finished jobs older than JOBS_RETENTION_DAYS, in batches. Returns how many were removed."""
+    batch_size = batch_size or settings.PRUNE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=settings.JOBS_RETENTION_DAYS)
+    total = 0
+    while True:
+        ids = list(Job.objects.filter(finished_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        Job.objects.filter(id__in=ids).delete()
+        total += len(ids)
+
+
+def get_stats():
+    """Queue depth and recent latency, for the metrics endpoint (two indexed queries)."""
+    now = timezone.now()
+    pending = Job.objects.filter(status__in=[Job.Status.QUEUED, Job.Status.RUNNING]).aggregate(
+        ready=Count('id', filter=Q(status=Job.Status.QUEUED, run_at__lte=now)),
+        scheduled=Count('id', filter=Q(status=Job.Status.QUEUED, run_at__gt=now)),
+        running=Count('id', filter=Q(status=Job.Status.RUNNING)),
+        oldest_ready=Min('run_at', filter=Q(status=Job.Status.QUEUED, run_at__lte=now)),
+    )
+    window = timezone.now() - timedelta(seconds=settings.JOBS_METRICS_WINDOW)
+    recent = Job.objects.filter(finished_at__gte=window).aggregate(
+        succeeded=Count('id', filter=Q(status=Job.Status.SUCCEEDED)),
+        failed=Count('id', filter=Q(status=Job.Status.FAILED)),
+        wait=Avg(F('started_at') - F('run_at')),
+        runtime=Avg(F('finished_at') - F('started_at')),
+    )
+    oldest = pending.pop('oldest_ready')
+    pending['oldest_ready_age'] = (now - oldest).total_seconds() if oldest else 0.0
+    pending['recent_succeeded'] = recent['succeeded']
+    pending['recent_failed'] = recent['failed']
+    pending['recent_wait'] = recent['wait'].total_seconds() if recent['wait'] else 0.0
+    pending['recent_runtime'] = recent['runtime'].total_seconds() if recent['runtime'] else 0.0
+    return pending
@@ -0,0 +1,528 @@
+"""
+Live workout sessions: the workout a user is doing right now, kept in sync across
+their devices (phone, watch) with server-sent events instead of polling.
+
+The state lives in one LiveSession row per user, so any worker can change it.
+Each change bumps the session's revision and, once committed, publishes a small
+delta ({'type', 'revision', 'data'}) to the broker. The /api/session/stream/
+endpoint subscribes to the user's deltas and writes them as SSE events with the
+revision as the event id. A stream starts with a full 'session' snapshot, unless
+the client reconnects with a Last-Event-ID that is still current.
+
+Streams are async generators that wait on an asyncio.Queue. Under ASGI,
+fitness_project/asgi.py hands stream requests to serve_stream() before they
+reach Django, so an idle connection costs a queue, a timer and a task: no
+thread (Django keeps one per request for the request's whole lifetime) and no
+DB connection. Elsewhere (runserver, WSGI) the Django view serves the same
+stream through iter_stream(), holding a worker thread while it is open.
+
+Brokers (LIVE_BROKER):
+- 'local': delivers to the streams of this process only. Enough for a single
+  worker and for tests.
+- 'postgres': publishes with NOTIFY. Each process runs one LISTEN connection
+  that hands events to its own streams, so a set logged on the phone through
+  worker A reaches the watch's stream on worker B.
+"""
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Q
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils import timezone
+
+from . import catalog, throttling
+from .models import LiveSession, Workout, WorkoutExercise
+
+logger = logging.getLogger(__name__)
+
+STREAM_TOKEN_SALT = 'api.live.stream'
+CHANNEL = 'live_sessions'
+# Queued instead of an event when a stream may have missed some: it sends a fresh snapshot
+RESYNC = {'type': 'resync'}
+
+
+class NoActiveSession(Exception):
+    pass
+
+
+# --- Stream tokens ---
+
+def make_stream_token(user):
+    """
+    For clients that can't send a JWT on the stream request (the browser's EventSource).
+    It only opens a stream, so it lives minutes (LIVE_STREAM_TOKEN_MAX_AGE): a URL that
+    leaks from logs stops working soon, and a client that lost its JWT can't renew it.
+    """
+    return signing.dumps({'u': user.pk}, salt=STREAM_TOKEN_SALT, compress=True)
+
+
+def read_stream_token(token):
+    """User id from a stream token, or None if it isn't valid or is older than LIVE_STREAM_TOKEN_MAX_AGE."""
+    try:
+        return signing.loads(token, salt=STREAM_TOKEN_SALT, max_age=settings.LIVE_STREAM_TOKEN_MAX_AGE)['u']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def authenticate_stream(token=None, authorization=None):
+    """User id for a stream request (?token= or the Authorization header's JWT), or None."""
+    if token:
+        user_id = read_stream_token(token)
+        return user_id if user_id and User.objects.filter(pk=user_id, is_active=True).exists() else None
+    if not authorization:
+        return None
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    authentication = JWTAuthentication()
+    try:
+        raw_token = authentication.get_raw_token(authorization.encode('latin-1'))
+        if raw_token is None:
+            return None
+        return authentication.get_user(authentication.get_validated_token(raw_token)).pk
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+
+
+# --- Brokers ---
+
+class Subscription:
+    """One stream's inbox, bound to the event loop the stream runs on."""
+    __slots__ = ('user_id', 'loop', 'queue')
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def offer(self, event):
+        """Call on self.loop."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client isn't reading: drop its backlog, it gets a snapshot when it catches up
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+def _offer_all(subscriptions, event):
+    for subscription in subscriptions:
+        subscription.offer(event)
+
+
+def _hand_over(subscriptions, event):
+    """
+    Queue an event for streams from any thread. One wake-up per event loop, not per stream:
+    waking the loop thousands of times from another thread would hand the GIL back and forth
+    (and wait out the switch interval) each time.
+    """
+    by_loop = {}
+    for subscription in subscriptions:
+        by_loop.setdefault(subscription.loop, []).append(subscription)
+    for loop, loop_subscriptions in by_loop.items():
+        try:
+            loop.call_soon_threadsafe(_offer_all, loop_subscriptions, event)
+        except RuntimeError: # Loop closed, its streams are gone
+            pass
+
+
+class LocalBroker:
+    """Delivers events to the streams of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {} # user id -> set of Subscription
+        self.stats = {'published': 0, 'delivered': 0}
+
+    def subscribe(self, user_id):
+        """Call from the event loop the stream runs on."""
+        subscription = Subscription(user_id, settings.LIVE_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            self.stats['published'] += 1
+        self.deliver(user_id, event)
+
+    def deliver(self, user_id, event):
+        with self._lock:
+            subscriptions = tuple(self._subscribers.get(user_id, ()))
+            self.stats['delivered'] += len(subscriptions)
+        _hand_over(subscriptions, event)
+
+    def deliver_all(self, event):
+        with self._lock:
+            subscriptions = [s for subscriptions in self._subscribers.values() for s in subscriptions]
+        _hand_over(subscriptions, event)
+
+    def info(self):
+        with self._lock:
+            return {
+                **self.stats,
+                'users': len(self._subscribers),
+                'streams': sum(len(subscriptions) for subscriptions in self._subscribers.values()),
+            }
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Publishes with NOTIFY; one LISTEN connection per process (started with the first stream)
+    delivers to local streams. Deltas are small, well under NOTIFY's 8000 byte payload limit.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='live-listener', daemon=True)
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, event):
+        with self._lock:
+            self.stats['published'] += 1
+        payload = json.dumps({'u': user_id, 'e': event}, cls=DjangoJSONEncoder)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, payload])
+
+    def _listen(self):
+        import psycopg
+        delay = 1
+        while True:
+            try:
+                params = connections['default'].get_connection_params()
+                with psycopg.connect(**params, autocommit=True) as conn:
+                    conn.execute(f'LISTEN {CHANNEL}')
+                    delay = 1
+                    # Streams may have missed events sent before we were listening (again)
+                    self.deliver_all(RESYNC)
+                    for notify in conn.notifies():
+                        message = json.loads(notify.payload)
+                        self.deliver(message['u'], message['e'])
+            except Exception:
+                logger.exception('Live session listener lost its connection; retrying in %s s', delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = PostgresBroker() if settings.LIVE_BROKER == 'postgres' else LocalBroker()
+    return _broker
+
+
+# --- Session state ---
+
+def snapshot(session):
+    """Everything a device needs to render the session, without a WorkoutSerializer round-trip."""
+    exercises = []
+    if session.workout_id:
+        rows = (
+            WorkoutExercise.objects.filter(workout_id=session.workout_id).order_by('id')
+            .values_list('id', 'exercise_id', 'target_sets', 'target_reps')
+        )
+        for workout_exercise_id, exercise_id, target_sets, target_reps in rows:
+            record = catalog.get_exercise(exercise_id) # Names come from the in-memory catalog snapshot
+            exercises.append({
+                'id': workout_exercise_id,
+                'exercise': exercise_id,
+                'name': record.name if record else '',
+                'target_sets': target_sets,
+                'target_reps': target_reps,
+                'completed_sets': len(session.sets.get(str(workout_exercise_id), ())),
+            })
+    return {
+        'revision': session.revision,
+        'active': session.ended_at is None,
+        'workout': session.workout_id,
+        'started_at': session.started_at,
+        'ended_at': session.ended_at,
+        'current': session.current_id,
+        'rest_until': session.rest_until,
+        'exercises': exercises,
+        'sets': session.sets,
+    }
+
+
+def get_state(user_id):
+    """Snapshot of the user's session (active or the last ended one), or None."""
+    session = LiveSession.objects.filter(owner_id=user_id).first()
+    return snapshot(session) if session is not None else None
+
+
+def _publish_on_commit(user_id, event):
+    transaction.on_commit(partial(get_broker().publish, user_id, event))
+
+
+@transaction.atomic
+def start(user, workout_id):
+    """Start a session of one of the user's workouts (or a public one), replacing any active session."""
+    workout = Workout.objects.filter(Q(owner=user) | Q(is_public=True), pk=workout_id).first()
+    if workout is None:
+        raise ValueError('Workout not found.')
+    # INSERT ... ON CONFLICT DO NOTHING, then lock: two devices starting the user's
+    # first session at the same moment both end up with the same row
+    LiveSession.objects.bulk_create([LiveSession(owner=user)], ignore_conflicts=True)
+    session = LiveSession.objects.select_for_update().get(owner=user)
+    session.workout = workout
+    session.revision += 1 # Never reset, so event ids stay increasing across sessions
+    session.current = None
+    session.sets = {}
+    session.rest_until = None
+    session.started_at = timezone.now()
+    session.ended_at = None
+    session.save()
+    # Too big for a delta; streams load the snapshot themselves
+    _publish_on_commit(user.pk, {'type': 'started', 'revision': session.revision, 'data': {'workout': workout.pk}})
+    return snapshot(session)
+
+
+def _change(user, event_type, apply):
+    """Lock the active session, let apply(session) modify it and return the delta, then save and publish."""
+    with transaction.atomic():
+        session = LiveSession.objects.select_for_update().filter(owner=user, ended_at__isnull=True).first()
+        if session is None:
+            raise NoActiveSession
+        data = apply(session)
+        session.revision += 1
+        session.save()
+        event = {'type': event_type, 'revision': session.revision, 'data': data}
+        _publish_on_commit(user.pk, event)
+    return event
+
+
+def _check_exercise(session, workout_exercise_id):
+    if not WorkoutExercise.objects.filter(pk=workout_exercise_id, workout_id=session.workout_id).exists():
+        raise ValueError('That exercise is not part of this workout.')
+
+
+def _rest_until(seconds):
+    return timezone.now() + timedelta(seconds=seconds) if seconds else None
+
+
+def record_set(user, workout_exercise, reps=None, weight=None, rest=None):
+    """Log a completed set (which also makes its exercise the current one), optionally starting a rest timer."""
+    def apply(session):
+        _check_exercise(session, workout_exercise)
+        entry = {'reps': reps, 'weight': weight, 'at': timezone.now().isoformat()}
+        completed = session.sets.setdefault(str(workout_exercise), [])
+        completed.append(entry)
+        session.current_id = workout_exercise
+        if rest is not None:
+            session.rest_until = _rest_until(rest)
+        return {
+            'workout_exercise': workout_exercise, 'set': len(completed), **entry,
+            'rest_until': session.rest_until,
+        }
+    return _change(user, 'set', apply)
+
+
+def set_current(user, workout_exercise):
+    def apply(session):
+        _check_exercise(session, workout_exercise)
+        session.current_id = workout_exercise
+        return {'workout_exercise': workout_exercise}
+    return _change(user, 'current', apply)
+
+
+def set_rest(user, seconds):
+    """Start a rest timer of `seconds` (0 clears it)."""
+    def apply(session):
+        session.rest_until = _rest_until(seconds)
+        return {'rest_until': session.rest_until}
+    return _change(user, 'rest', apply)
+
+
+def end(user):
+    def apply(session):
+        session.ended_at = timezone.now()
+        session.rest_until = None
+        return {'ended_at': session.ended_at}
+    return _change(user, 'ended', apply)
+
+
+# --- Event stream ---
+
+def detached(fn):
+    """
+    fn as a coroutine that runs on the shared thread pool. Plain sync_to_async would run it on
+    the request's own thread, which ASGI then keeps around, idle, for as long as the stream is open.
+    """
+    def run(*args):
+        try:
+            return fn(*args)
+        finally:
+            close_old_connections() # Hand the connection back; the next call may run on another thread
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def format_event(event_type, data, revision):
+    return f'id: {revision}\nevent: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def stream(user_id, last_event_id=None):
+    """
+    SSE for one device: a snapshot (unless last_event_id is current), then deltas as they
+    happen, with a keep-alive comment every LIVE_HEARTBEAT seconds. Ends after
+    LIVE_STREAM_MAX_AGE seconds; EventSource reconnects on its own, sending Last-Event-ID.
+    """
+    broker = get_broker()
+    # Subscribe before reading the state, so nothing that happens in between is missed
+    subscription = broker.subscribe(user_id)
+    load_state = detached(get_state)
+    try:
+        yield f'retry: {settings.LIVE_RETRY_MS}\n\n'
+        state = await load_state(user_id)
+        revision = state['revision'] if state else 0
+        if state is not None and last_event_id != str(revision):
+            yield format_event('session', state, revision)
+
+        loop = asyncio.get_running_loop()
+        closes_at = loop.time() + settings.LIVE_STREAM_MAX_AGE
+        while (remaining := closes_at - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), min(settings.LIVE_HEARTBEAT, remaining))
+            except asyncio.TimeoutError: # Only an alias of TimeoutError from Python 3.11 on
+                yield ': ping\n\n'
+                continue
+            if event['type'] in ('resync', 'started'):
+                state = await load_state(user_id)
+                if state is not None and state['revision'] > revision:
+                    revision = state['revision']
+                    yield format_event('session', state, revision)
+            elif event['revision'] > revision: # Older ones are already part of the snapshot we sent
+                revision = event['revision']
+                yield format_event(event['type'], event['data'], revision)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def iter_stream(user_id, last_event_id=None):
+    """stream() as a plain iterator, driven by a private event loop, for the Django view (WSGI, runserver)."""
+    loop = asyncio.new_event_loop()
+    events = stream(user_id, last_event_id)
+    try:
+        while True:
+            try:
+                # Between chunks the loop isn't running; deliveries wait in its queue until the next one
+                yield loop.run_until_complete(events.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(events.aclose())
+        loop.close()
+
+
+def _json_response(status_code, data, headers):
+    return [
+        {'type': 'http.response.start', 'status': status_code, 'headers': [(b'content-type', b'application/json'), *headers]},
+        {'type': 'http.response.body', 'body': json.dumps(data).encode()},
+    ]
+
+
+def throttle_stream(user_id, forwarded_for, remote_addr):
+    """
+    Charge a stream request to the user's token bucket (or the client's, if it didn't
+    authenticate), like TokenBucketThrottle does for API views. Returns (allowed, wait).
+    """
+    if user_id is not None:
+        return throttling.consume('user', user_id)
+    # Client ident as DRF's BaseThrottle.get_ident() builds it without NUM_PROXIES
+    return throttling.consume('anon', ''.join(forwarded_for.split()) if forwarded_for else remote_addr)
+
+
+async def serve_stream(scope, receive, send):
+    """
+    ASGI app for the stream endpoint: the same response as the Django view. It bypasses the
+    middleware and DRF, so it applies the CORS headers and the token-bucket throttle itself.
+    """
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    query = QueryDict(scope.get('query_string', b'').decode('latin-1'))
+    extra_headers = [(b'vary', b'Origin')]
+    origin = headers.get('origin')
+    if origin and (settings.CORS_ALLOW_ALL_ORIGINS or origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', ())):
+        # Stands in for corsheaders, which this path bypasses
+        extra_headers.append((b'access-control-allow-origin', origin.encode('latin-1')))
+
+    user_id = await detached(authenticate_stream)(query.get('token'), headers.get('authorization'))
+    allowed, wait = throttle_stream(user_id, headers.get('x-forwarded-for'), (scope.get('client') or ('',))[0])
+    if not allowed:
+        retry_after = [(b'retry-after', str(math.ceil(wait)).encode())]
+        for message in _json_response(429, {'detail': 'Request was throttled.'}, extra_headers + retry_after):
+            await send(message)
+        return
+    if user_id is None:
+        for message in _json_response(401, {'detail': 'Authentication credentials were not provided or are invalid.'}, extra_headers):
+            await send(message)
+        return
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream; charset=utf-8'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'), # Stops nginx from buffering the events
+        *extra_headers,
+    ]})
+    events = stream(user_id, headers.get('last-event-id') or query.get('last_event_id'))
+
+    async def pump():
+        async for chunk in events:
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''}) # LIVE_STREAM_MAX_AGE reached
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await events.aclose() # Unsubscribes
+
+
+def with_stream(app):
+    """Wrap the Django ASGI app so stream requests go to serve_stream()."""
+    path = reverse('live_session_stream')
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == path and scope['method'] == 'GET':
+            return await serve_stream(scope, receive, send)
+        return await app(scope, receive, send)
+    return application
@@ -0,0 +1,113 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: load the server entry point, then send it one request
+# (and a second one, for comparison) without a real server in front
+CHILD = r'''
+import asyncio, io, json, sys, time
+server, path, host, spawned = sys.argv[1:5]
+started = time.perf_counter()
+if server == 'asgi':
+    from fitness_project.asgi import application
+else:
+    from fitness_project.wsgi import application
+booted = time.perf_counter()
+startup_ms = (time.time() - float(spawned)) * 1000 # Includes the interpreter's own start-up
+
+def call():
+    if server == 'asgi':
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', host.encode())], 'server': (host, 80), 'client': ('127.0.0.1', 0),
+        }
+        messages = []
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        async def send(message):
+            messages.append(message)
+        asyncio.run(application(scope, receive, send))
+        return messages[0]['status']
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': host, 'SERVER_PORT': '80',
+        'HTTP_HOST': host, 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    status = []
+    response = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    b''.join(response)
+    response.close()
+    return int(status[0].split()[0])
+
+status = call()
+first = time.perf_counter()
+call()
+second = time.perf_counter()
+print(json.dumps({
+    'status': status,
+    'startup_ms': startup_ms,
+    'boot_ms': (booted - started) * 1000,
+    'first_ms': (first - booted) * 1000,
+    'second_ms': (second - first) * 1000,
+    'ready_ms': startup_ms + (first - booted) * 1000,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        "Time to first request of a freshly started worker, with and without the start-up "
+        "warm-up (WARMUP_ON_START). Each run is a new interpreter that loads the WSGI/ASGI "
+        "application and calls it directly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10, help='Fresh processes per mode')
+        parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi')
+        parser.add_argument('--path', default='/api/exercises/')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS')
+
+    def handle(self, *args, **options):
+        modes = [('no warm-up', 'False'), ('warm-up', 'True')]
+        runs_by_mode = {label: [] for label, _ in modes}
+        for _ in range(options['runs']):
+            # Alternate the modes so drift in machine load hits both equally
+            for label, warmup in modes:
+                runs_by_mode[label].append(self._run(options, warmup))
+        results = {}
+        for label, runs in runs_by_mode.items():
+            statuses = {run['status'] for run in runs}
+            median = {key: statistics.median(run[key] for run in runs)
+                      for key in ('startup_ms', 'boot_ms', 'first_ms', 'second_ms', 'ready_ms')}
+            results[label] = median
+            self.stdout.write(
+                f"{label:<11} start-up={median['startup_ms']:.1f}ms (loading the app {median['boot_ms']:.1f}ms) "
+                f"first request={median['first_ms']:.1f}ms second={median['second_ms']:.2f}ms "
+                f"-> first response after {median['ready_ms']:.1f}ms (median of {len(runs)}, status {sorted(statuses)})"
+            )
+
+        cold, warm = (results[label] for label, _ in modes)
+        self.stdout.write(self.style.SUCCESS(
+            f"First request {cold['first_ms'] - warm['first_ms']:.1f}ms faster with the warm-up "
+            f"({cold['first_ms']:.1f}ms -> {warm['first_ms']:.1f}ms); the worker takes "
+            f"{warm['boot_ms'] - cold['boot_ms']:.1f}ms longer to boot, before it accepts traffic. "
+            f"Net change to the first response: {warm['ready_ms'] - cold['ready_ms']:+.1f}ms."
+        ))
+
+    def _run(self, options, warmup):
+        env = {**os.environ, 'WARMUP_ON_START': warmup}
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+        proc = subprocess.run(
+            [sys.executable, '-c', CHILD, options['server'], options['path'], options['host'], repr(time.time())],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if proc.returncode:
+            raise CommandError(f'Worker process failed:\n{proc.stderr}')
+        return json.loads(proc.stdout.strip().splitlines()[-1])
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from api.benchmarks import format_summary, run_concurrent, summarize
+from api.db import get_pool_stats
+from api.models import MuscleGroup
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request latency with fresh connections vs the psycopg pool "
+        "under concurrent load. Each iteration mimics one request: "
+        "request_started -> small query -> request_finished (which closes/returns the connection)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--iterations', type=int, default=200, help='Requests per thread')
+        parser.add_argument('--pool-max-size', type=int, default=8)
+
+    def handle(self, *args, **options):
+        settings_dict = connections.settings['default']
+        if settings_dict['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError('This benchmark needs the PostgreSQL backend.')
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            raise CommandError('psycopg_pool is not installed (pip install "psycopg[pool]").')
+
+        original_options = dict(settings_dict['OPTIONS'])
+        original_max_age = settings_dict.get('CONN_MAX_AGE', 0)
+        concurrency = options['concurrency']
+        modes = [
+            ('no pool (connect per request)', None),
+            ('pooled', {'min_size': options['pool_max_size'], 'max_size': options['pool_max_size']}),
+        ]
+        results = {}
+        try:
+            for label, pool_options in modes:
+                self._configure(settings_dict, pool_options)
+                latencies, wall = run_concurrent(
+                    self._one_request, concurrency, options['iterations'],
+                    teardown=connections.close_all,
+                )
+                results[label] = summarize(latencies, wall)
+                self.stdout.write(format_summary(f'{label:<32}', results[label]))
+                if pool_options:
+                    self.stdout.write(f'  pool stats: {get_pool_stats()}')
+        finally:
+            connections['default'].close_pool()
+            settings_dict['OPTIONS'] = original_options
+            settings_dict['CONN_MAX_AGE'] = original_max_age
+
+        direct, pooled = (results[label] for label, _ in modes)
+        self.stdout.write(self.style.SUCCESS(
+            f"p50 delta: {direct['p50_ms'] - pooled['p50_ms']:.2f}ms, "
+            f"p95 delta: {direct['p95_ms'] - pooled['p95_ms']:.2f}ms "
+            f"({direct['p50_ms'] / pooled['p50_ms']:.1f}x faster at p50)"
+        ))
+
+    def _configure(self, settings_dict, pool_options):
+        # Thread-local DatabaseWrappers are created from this shared dict, so new
+        # benchmark threads pick the mode up. Drop any pool left by the previous mode.
+        connections['default'].close_pool()
+        options = dict(settings_dict['OPTIONS'])
+        options.pop('pool', None)
+        if pool_options:
+            options['pool'] = pool_options
+        settings_dict['OPTIONS'] = options
+        settings_dict['CONN_MAX_AGE'] = 0
+        if pool_options:
+            connections['default'].pool.open(wait=True)
+
+    def _one_request(self):
+        request_started.send(sender=self.__class__)
+        try:
+            MuscleGroup.objects.filter(pk=1).exists()
+        finally:
+            request_finished.send(sender=self.__class__)
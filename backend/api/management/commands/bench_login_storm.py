@@ -0,0 +1,86 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.benchmarks import format_summary, run_concurrent, summarize
+from api.views import LoginView, MuscleGroupViewSet
+
+BENCH_USERNAME = 'bench-login-storm'
+BENCH_PASSWORD = 'bench-password-123'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure API read latency alone, during a login storm with inline hashing, "
+        "and during the same storm with the bounded hashing pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--reads', type=int, default=200, help='Reads per reader thread')
+        parser.add_argument('--login-threads', type=int, default=32)
+
+    def handle(self, *args, **options):
+        user, created = User.objects.get_or_create(username=BENCH_USERNAME)
+        if created or not user.check_password(BENCH_PASSWORD):
+            user.set_password(BENCH_PASSWORD)
+            user.save()
+
+        factory = APIRequestFactory()
+        # Without rate limiting, so only the hashing pool sheds logins
+        read_view = MuscleGroupViewSet.as_view({'get': 'list'}, throttle_classes=[])
+        login_view = LoginView.as_view(throttle_classes=[])
+
+        def read():
+            request = factory.get('/api/muscle-groups/')
+            force_authenticate(request, user=user)
+            read_view(request)
+
+        def login():
+            request = factory.post(
+                '/api/auth/login/', {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}, format='json',
+            )
+            return login_view(request).status_code
+
+        read() # Load the catalog snapshot before timing anything
+        self._report('reads, no logins', self._reads(read, options))
+        for label, pool in (('inline hashing', False), ('hashing pool', True)):
+            with override_settings(PASSWORD_HASHING_POOL=pool):
+                statuses = []
+                stop = threading.Event()
+                storm = [
+                    threading.Thread(target=self._login_loop, args=(login, stop, statuses))
+                    for _ in range(options['login_threads'])
+                ]
+                for thread in storm:
+                    thread.start()
+                try:
+                    summary = self._reads(read, options)
+                finally:
+                    stop.set()
+                    for thread in storm:
+                        thread.join()
+            ok = statuses.count(200)
+            shed = statuses.count(429)
+            self._report(f'reads during storm, {label}', summary)
+            self.stdout.write(f'  logins: {ok} ok, {shed} shed with 429, {len(statuses) - ok - shed} other')
+
+    def _reads(self, read, options):
+        latencies, wall = run_concurrent(
+            read, options['readers'], options['reads'], teardown=connections.close_all,
+        )
+        return summarize(latencies, wall)
+
+    def _login_loop(self, login, stop, statuses):
+        try:
+            while not stop.is_set():
+                statuses.append(login())
+        finally:
+            connections.close_all()
+
+    def _report(self, label, summary):
+        self.stdout.write(format_summary(f'{label:<36}', summary))
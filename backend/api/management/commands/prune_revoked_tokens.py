@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.revocation import prune_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired refresh tokens and their blacklist entries. run_jobs queues this daily (JOBS_SCHEDULE); run it by hand or from cron without a worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Defaults to PRUNE_BATCH_SIZE')
+
+    def handle(self, *args, **options):
+        deleted = prune_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired tokens.'))
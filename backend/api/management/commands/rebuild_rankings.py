@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api import rankings
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every user's planned volume, then recount the ranking histogram from it. "
+        "Needed after changing RANKINGS_STEP or RANKINGS_MAX_SETS, and to fill it in the first time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts-only', action='store_true', help='Only recount the histogram from the stored volumes')
+
+    def handle(self, *args, **options):
+        if not options['counts_only']:
+            changed = rankings.refresh_all()
+            self.stdout.write(f'Updated the volume of {changed} users.')
+        wrong = rankings.rebuild_counts()
+        self.stdout.write(self.style.SUCCESS(f'Recounted the histogram ({wrong} buckets were off).'))
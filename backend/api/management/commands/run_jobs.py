@@ -0,0 +1,78 @@
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import jobs
+
+logger = logging.getLogger('api.jobs')
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the api_job table on a thread pool. "
+        "Start several processes for CPU-heavy tasks; they share the queue safely. "
+        "Also queues the maintenance tasks in JOBS_SCHEDULE (pruning old jobs, tombstones and tokens)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=settings.JOBS_WORKERS)
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL)
+        parser.add_argument('--burst', action='store_true', help="Exit once no jobs are due (tests, cron).")
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        poll_interval = options['poll_interval']
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write('Stopping after the running jobs finish...')
+            stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f'Worker {worker_id} running jobs on {threads} threads.')
+        renew_every = settings.JOBS_LEASE_SECONDS / 3
+        renewed_at = time.monotonic()
+        scheduled_at = {}
+        running = set()
+        completed = 0
+
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job') as executor:
+            # After a stop signal, keep renewing leases until the running jobs are done
+            while running or not stopping.is_set():
+                close_old_connections()
+                now = time.monotonic()
+                if running and now - renewed_at > renew_every:
+                    jobs.renew_leases(worker_id)
+                    renewed_at = now
+                if not stopping.is_set():
+                    jobs.queue_scheduled(scheduled_at, now)
+
+                free = 0 if stopping.is_set() else threads - len(running)
+                claimed = jobs.claim(worker_id, free) if free else []
+                for job in claimed:
+                    running.add(executor.submit(jobs.run_job, job, worker_id))
+
+                if running and (not claimed or len(running) == threads):
+                    # Wake when a slot frees up, or to renew leases / poll again
+                    done, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    completed += len(done)
+                    for future in done:
+                        if future.exception() is not None:
+                            # e.g. the database went away while recording the outcome; the job runs again once its lease expires
+                            logger.error('Job worker thread failed', exc_info=future.exception())
+                elif not running:
+                    if options['burst']:
+                        break
+                    stopping.wait(poll_interval)
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker_id} stopped after {completed} jobs.'))
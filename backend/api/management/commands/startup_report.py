@@ -0,0 +1,94 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs under `python -X importtime`: the same start-up a WSGI worker goes through,
+# split into phases (the warm-up steps stand in for what the first request would import)
+CHILD = r'''
+import json, time
+timings = {}
+
+def phase(name, fn):
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception as exc: # e.g. the catalog step without a database
+        name = f'{name} (failed: {type(exc).__name__})'
+    timings[name] = (time.perf_counter() - started) * 1000
+
+import django
+phase('settings and apps', django.setup)
+from django.core.handlers.wsgi import WSGIHandler
+phase('middleware', WSGIHandler)
+from api import warmup
+for name, step in warmup.STEPS:
+    phase(f'warm-up: {name}', step)
+print(json.dumps(timings))
+'''
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from `python -X importtime` output."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit(): # The header line
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Show where worker start-up time goes: each start-up phase, then the slowest "
+        "imports (from python -X importtime) by module and by package."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Rows per table')
+        parser.add_argument('--prefix', default='', help="Only list modules starting with this (e.g. 'api.')")
+        parser.add_argument('--sort', choices=('self', 'cumulative'), default='cumulative')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        if proc.returncode:
+            raise CommandError(f'Start-up failed:\n{proc.stderr[-5000:]}')
+        phases = json.loads(proc.stdout.strip().splitlines()[-1])
+        modules = parse_importtime(proc.stderr)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Start-up phases'))
+        for name, ms in phases.items():
+            self.stdout.write(f'  {ms:8.1f} ms  {name}')
+        self.stdout.write(f'  {sum(phases.values()):8.1f} ms  total')
+
+        total_us = sum(self_us for _, self_us, _, _ in modules)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\nImports: {len(modules)} modules, {total_us / 1000:.1f} ms (excluding interpreter start-up)'
+        ))
+        packages = defaultdict(lambda: [0, 0])
+        for name, self_us, _, _ in modules:
+            package = packages[name.split('.')[0]]
+            package[0] += self_us
+            package[1] += 1
+        self.stdout.write('Slowest packages (sum of self time):')
+        for package, (self_us, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:options['limit']]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {package} ({count} modules)')
+
+        key = 1 if options['sort'] == 'self' else 2
+        listed = sorted((m for m in modules if m[0].startswith(options['prefix'])), key=lambda m: -m[key])
+        self.stdout.write(f"\nSlowest modules by {options['sort']} time:")
+        for name, self_us, cumulative_us, depth in listed[:options['limit']]:
+            self.stdout.write(f'  {cumulative_us / 1000:8.1f} ms cumulative  {self_us / 1000:6.1f} ms self  {name}')
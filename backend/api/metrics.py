@@ -0,0 +1,126 @@
+"""
+Tiny metrics registry rendered in the Prometheus text format at /api/metrics/.
+
+Other modules register a collector: a callable returning an iterable of
+(name, help_text, type, value, labels) tuples. Collectors are called on every
+scrape. Most read counters already in memory; the job queue and rankings
+collectors run a couple of cheap queries. A collector that fails (say the
+database is unreachable) is logged and its series are left out of that scrape,
+with fitness_metrics_collector_up{collector=...} 0, so the others still report.
+"""
+import logging
+
+from . import db, hashing, jobs, live, rankings
+from .revocation import revocation_filter
+
+logger = logging.getLogger(__name__)
+
+_collectors = []
+
+
+def register(collector):
+    """Add a collector (usable as a decorator)."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+    return collector
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return '{' + inner + '}'
+
+
+def _collect(collector):
+    """The collector's samples and whether it succeeded (no samples if it raised)."""
+    try:
+        return list(collector()), 1
+    except Exception:
+        logger.exception('Metrics collector %s failed', collector.__name__)
+        return [], 0
+
+
+def render():
+    """Run every collector and return the exposition text."""
+    lines = []
+    described = set()
+    samples, statuses = [], []
+    for collector in _collectors:
+        collected, up = _collect(collector)
+        samples.extend(collected)
+        statuses.append((
+            'fitness_metrics_collector_up', 'Whether the collector succeeded on this scrape.', 'gauge',
+            up, {'collector': collector.__name__},
+        ))
+    for name, help_text, metric_type, value, labels in samples + statuses:
+        if name not in described:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            described.add(name)
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+@register
+def db_pool_metrics():
+    stats = db.get_pool_stats()
+    if not stats:
+        return
+    labels = {'alias': 'default'}
+    yield ('fitness_db_pool_size', 'Connections currently held by the pool.', 'gauge', stats['size'], labels)
+    yield ('fitness_db_pool_max_size', 'Configured pool max_size.', 'gauge', stats['max_size'], labels)
+    yield ('fitness_db_pool_in_use', 'Connections checked out by requests.', 'gauge', stats['in_use'], labels)
+    yield ('fitness_db_pool_available', 'Idle connections ready to hand out.', 'gauge', stats['available'], labels)
+    yield ('fitness_db_pool_waiting', 'Requests currently waiting for a connection.', 'gauge', stats['requests_waiting'], labels)
+    yield ('fitness_db_pool_requests_total', 'Connection requests served by the pool.', 'counter', stats['requests_total'], labels)
+    yield ('fitness_db_pool_waits_total', 'Connection requests that had to wait.', 'counter', stats['requests_queued'], labels)
+    yield ('fitness_db_pool_wait_seconds_total', 'Total time spent waiting for a connection.', 'counter', stats['requests_wait_ms'] / 1000, labels)
+    yield ('fitness_db_pool_timeouts_total', 'Connection requests that timed out or errored.', 'counter', stats['requests_errors'], labels)
+    yield ('fitness_db_pool_connections_lost_total', 'Pooled connections dropped after failing a health check.', 'counter', stats['connections_lost'], labels)
+
+
+@register
+def password_hashing_metrics():
+    stats = hashing.get_stats()
+    yield ('fitness_password_hashing_in_flight', 'Password hashes running or queued.', 'gauge', stats['in_flight'], {})
+    yield ('fitness_password_hashing_total', 'Password hashes admitted to the pool.', 'counter', stats['submitted'], {})
+    yield ('fitness_password_hashing_rejected_total', 'Logins/registrations shed with 429.', 'counter', stats['rejected'], {})
+
+
+@register
+def revocation_metrics():
+    info = revocation_filter.info()
+    yield ('fitness_revocation_filter_entries', 'Revoked refresh tokens in the Bloom filter.', 'gauge', info['entries'], {})
+    yield ('fitness_revocation_checks_total', 'Refresh token revocation checks.', 'counter', info['checks'], {})
+    yield ('fitness_revocation_db_checks_total', 'Checks that had to query the blacklist (possible hits).', 'counter', info['db_checks'], {})
+    yield ('fitness_revocation_rebuilds_total', 'Full Bloom filter rebuilds.', 'counter', info['rebuilds'], {})
+
+
+@register
+def job_queue_metrics():
+    stats = jobs.get_stats()
+    yield ('fitness_jobs_ready', 'Background jobs due and waiting for a worker.', 'gauge', stats['ready'], {})
+    yield ('fitness_jobs_scheduled', 'Background jobs waiting for their run time (mostly retries).', 'gauge', stats['scheduled'], {})
+    yield ('fitness_jobs_running', 'Background jobs currently leased by a worker.', 'gauge', stats['running'], {})
+    yield ('fitness_jobs_oldest_ready_seconds', 'How long the oldest due job has been waiting.', 'gauge', stats['oldest_ready_age'], {})
+    yield ('fitness_jobs_recent_finished', 'Jobs finished in the last JOBS_METRICS_WINDOW seconds.', 'gauge', stats['recent_succeeded'], {'status': 'succeeded'})
+    yield ('fitness_jobs_recent_finished', 'Jobs finished in the last JOBS_METRICS_WINDOW seconds.', 'gauge', stats['recent_failed'], {'status': 'failed'})
+    yield ('fitness_jobs_recent_wait_seconds', 'Average queue wait of recently finished jobs.', 'gauge', stats['recent_wait'], {})
+    yield ('fitness_jobs_recent_runtime_seconds', 'Average run time of recently finished jobs.', 'gauge', stats['recent_runtime'], {})
+
+
+@register
+def live_session_metrics():
+    info = live.get_broker().info()
+    yield ('fitness_live_streams', 'Open live session event streams in this process.', 'gauge', info['streams'], {})
+    yield ('fitness_live_stream_users', 'Users with at least one open stream in this process.', 'gauge', info['users'], {})
+    yield ('fitness_live_events_published_total', 'Live session changes published by this process.', 'counter', info['published'], {})
+    yield ('fitness_live_events_delivered_total', 'Live session events handed to streams in this process.', 'counter', info['delivered'], {})
+
+
+@register
+def rankings_metrics():
+    distribution = rankings.get_distribution()
+    yield ('fitness_rankings_population', 'Users with an active plan in the volume rankings.', 'gauge', distribution.population, {})
+    yield ('fitness_rankings_version', 'Version of the ranking histogram this process serves.', 'gauge', distribution.version, {})
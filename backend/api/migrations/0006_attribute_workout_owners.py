@@ -0,0 +1,56 @@
+from django.db import migrations
+
+DAYS = range(1, 8)
+
+
+def attribute_workouts(apps, schema_editor):
+    """
+    Give every existing workout an owner, based on the plans that use it:
+      - used by one user's plans   -> that user owns it
+      - used by several users      -> the lowest user id keeps it, every other user
+                                      gets a private copy and their plans are repointed
+      - not used by any plan       -> kept as a public template (owner=None), since
+                                      until now every workout was visible to everyone
+    """
+    Workout = apps.get_model('api', 'Workout')
+    WorkoutExercise = apps.get_model('api', 'WorkoutExercise')
+    Plan = apps.get_model('api', 'Plan')
+
+    # workout id -> set of owner ids of plans referencing it
+    users_by_workout = {}
+    for plan in Plan.objects.values('owner_id', *[f'day{day}_workout_id' for day in DAYS]):
+        for day in DAYS:
+            workout_id = plan[f'day{day}_workout_id']
+            if workout_id is not None:
+                users_by_workout.setdefault(workout_id, set()).add(plan['owner_id'])
+
+    Workout.objects.exclude(id__in=users_by_workout.keys()).update(owner=None, is_public=True)
+
+    for workout in Workout.objects.filter(id__in=users_by_workout.keys()):
+        first_owner, *other_owners = sorted(users_by_workout[workout.id])
+        workout.owner_id = first_owner
+        workout.save(update_fields=['owner'])
+        items = list(WorkoutExercise.objects.filter(workout=workout))
+        for user_id in other_owners:
+            copy = Workout.objects.create(name=workout.name, description=workout.description, owner_id=user_id)
+            WorkoutExercise.objects.bulk_create([
+                WorkoutExercise(workout=copy, exercise_id=item.exercise_id,
+                                target_sets=item.target_sets, target_reps=item.target_reps)
+                for item in items
+            ])
+            for day in DAYS:
+                Plan.objects.filter(owner_id=user_id, **{f'day{day}_workout': workout}).update(
+                    **{f'day{day}_workout': copy}
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_workout_owner'),
+    ]
+
+    operations = [
+        # Ownership can't be "un-attributed" meaningfully; reversing just keeps the data
+        migrations.RunPython(attribute_workouts, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_attribute_workout_owners'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2 on 2026-10-19 10:31
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def fill_summaries(apps, schema_editor):
+    """Compute the new summary columns for existing workouts (same rules as api/summaries.py)."""
+    Workout = apps.get_model('api', 'Workout')
+    WorkoutExercise = apps.get_model('api', 'WorkoutExercise')
+    ExerciseMuscleActivation = apps.get_model('api', 'ExerciseMuscleActivation')
+
+    groups_by_exercise = {}
+    for exercise_id, group_id in ExerciseMuscleActivation.objects.values_list('exercise_id', 'muscle_group_id'):
+        groups_by_exercise.setdefault(exercise_id, set()).add(group_id)
+
+    workout_ids = list(Workout.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(workout_ids), BATCH_SIZE):
+        batch = workout_ids[start:start + BATCH_SIZE]
+        workouts = {workout_id: Workout(id=workout_id, muscle_group_ids=set()) for workout_id in batch}
+        for workout_id, exercise_id, target_sets in (
+            WorkoutExercise.objects.filter(workout_id__in=batch).values_list('workout_id', 'exercise_id', 'target_sets')
+        ):
+            workout = workouts[workout_id]
+            workout.exercise_count += 1
+            workout.total_sets += target_sets
+            workout.muscle_group_ids |= groups_by_exercise.get(exercise_id, set())
+        for workout in workouts.values():
+            workout.muscle_group_ids = sorted(workout.muscle_group_ids)
+        Workout.objects.bulk_update(workouts.values(), ['exercise_count', 'total_sets', 'muscle_group_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workout',
+            name='exercise_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='muscle_group_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='total_sets',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
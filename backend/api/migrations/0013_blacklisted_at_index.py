@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    api/revocation.py syncs each worker's filter from the blacklist rows of the last
+    minute or so; index blacklisted_at so that doesn't scan the table. The table belongs
+    to simplejwt's token_blacklist app, hence raw SQL.
+    """
+
+    dependencies = [
+        ('api', '0012_volume_rankings'),
+        ('token_blacklist', '0012_alter_outstandingtoken_user'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS api_blacklistedtoken_blacklisted_at ON token_blacklist_blacklistedtoken (blacklisted_at)',
+            'DROP INDEX IF EXISTS api_blacklistedtoken_blacklisted_at',
+        ),
+    ]
@@ -1,9 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 class MuscleGroup(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True) # For delta sync
 
     def __str__(self):
         return self.name
@@ -12,6 +14,7 @@ class Exercise(models.Model):
     name = models.CharField(max_length=200, unique=True)
     description = models.TextField(blank=True, null=True)
     muscle_groups = models.ManyToManyField(MuscleGroup, related_name='exercises')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -29,6 +32,7 @@ class ExerciseMuscleActivation(models.Model):
         choices=ActivationLevel.choices,
         default=ActivationLevel.MEDIUM,
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('exercise', 'muscle_group') # Prevent duplicates
@@ -45,18 +49,32 @@ class Workout(models.Model):
         through='WorkoutExercise',
         related_name='workouts'
     )
-    # Optional: Link workout to a user if workouts are user-specific creations
-    # owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_workouts', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Workouts belong to the user who created them. owner=None marks a shared template.
+    # db_index=False: the (owner, id) index below already serves owner lookups
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_workouts', null=True, blank=True, db_index=False)
+    # Public workouts (templates) are visible to everyone and usable in any plan, but only the owner edits them
+    is_public = models.BooleanField(default=False)
+    # Denormalized summary for list views, kept up to date by api/summaries.py
+    exercise_count = models.PositiveIntegerField(default=0)
+    total_sets = models.PositiveIntegerField(default=0)
+    muscle_group_ids = models.JSONField(default=list, blank=True) # Sorted ids of every muscle group hit
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'id']), # Scoped lists: WHERE owner_id = ? ORDER BY id
+            models.Index(fields=['is_public'], condition=models.Q(is_public=True), name='api_workout_public_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 class WorkoutExercise(models.Model):
-    workout = models.ForeignKey('Workout', on_delete=models.CASCADE)
+    workout = models.ForeignKey('Workout', on_delete=models.CASCADE, related_name='workout_exercises')
     exercise = models.ForeignKey('Exercise', on_delete=models.CASCADE)
     target_sets = models.PositiveIntegerField()
     target_reps = models.CharField(max_length=50) # e.g., "8-12", "15", "AMRAP"
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('workout', 'exercise') # Prevent adding the same exercise twice to one workout
@@ -69,6 +87,9 @@ class Plan(models.Model):
     description = models.TextField(blank=True, null=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='plans')
     is_active = models.BooleanField(default=False) # To mark the user's currently selected plan
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Date that counts as day 1 of the cycle; without it day 1 is every Monday
+    start_date = models.DateField(blank=True, null=True)
 
     # Option A: Simple Fixed Structure (e.g., 7 days)
     day1_workout = models.ForeignKey(Workout, on_delete=models.SET_NULL, related_name='+', blank=True, null=True)
@@ -98,4 +119,137 @@ class Plan(models.Model):
 
     # Add logic to ensure only one plan is active per user if needed (e.g., in save method)
 
-# ADD user here
\ No newline at end of file
+# ADD user here
+
+class DataVersion(models.Model):
+    """
+    Monotonic counters bumped whenever a group of rows changes (e.g. key 'catalog').
+    Lets caches check "has anything changed?" with one primary-key lookup.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row, so delta sync can tell clients what to remove.
+    Pruned after SYNC_TOMBSTONE_RETENTION (see the prune_tombstones command).
+    """
+    model = models.CharField(max_length=50) # Sync kind, e.g. 'plans', 'workouts'
+    object_id = models.BigIntegerField()
+    # Set for per-user rows (plans, private workouts). No DB constraint so deleting a user can't trip over its own tombstones
+    owner = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', blank=True, null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id} deleted {self.deleted_at}"
+
+class Job(models.Model):
+    """
+    A piece of background work, picked up by the run_jobs worker (see api/jobs.py).
+    Finished jobs are kept for JOBS_RETENTION_DAYS so clients can poll their status.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        SUCCEEDED = 'succeeded', 'Succeeded'
+        FAILED = 'failed', 'Failed'
+
+    task = models.CharField(max_length=100) # Name registered with @jobs.task
+    args = models.JSONField(default=dict, blank=True) # Keyword arguments for the task
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    priority = models.SmallIntegerField(default=0) # Higher runs first
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs', blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now) # Not before this (pushed back on retry)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    # Lease held by the worker running the job; an expired lease means the worker died
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Dequeue only scans unfinished jobs, however many finished ones are being kept
+            models.Index(
+                fields=['status', 'run_at'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='api_job_pending_idx',
+            ),
+            models.Index(fields=['finished_at']), # Pruning and latency metrics
+            models.Index(fields=['owner', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+class RequestProfile(models.Model):
+    """A CPU profile of one request, captured by api.profiling.ProfilingMiddleware."""
+    created_at = models.DateTimeField(auto_now_add=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='+', blank=True, null=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    mode = models.CharField(max_length=10) # 'cprofile' or 'sampling'
+    trigger = models.CharField(max_length=10) # 'flag' (staff header/query) or 'sampled' (PROFILING_SAMPLE_RATE)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    breakdown = models.JSONField(default=dict) # Milliseconds per subsystem (auth, orm, serializer, ...)
+    report = models.TextField() # pstats listing or sampled call tree
+    data = models.BinaryField() # Raw profile: pstats dump or collapsed stacks, for download
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+class LiveSession(models.Model):
+    """
+    The workout a user is doing right now (at most one per user), kept in sync across
+    their devices by the /api/session/stream/ event stream (see api/live.py).
+    """
+    owner = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='live_session')
+    workout = models.ForeignKey(Workout, on_delete=models.SET_NULL, related_name='+', blank=True, null=True)
+    revision = models.PositiveBigIntegerField(default=0) # Bumped on every change; the SSE event id
+    current = models.ForeignKey(WorkoutExercise, on_delete=models.SET_NULL, related_name='+', blank=True, null=True)
+    sets = models.JSONField(default=dict, blank=True) # WorkoutExercise id -> [{'reps', 'weight', 'at'}] of completed sets
+    rest_until = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    ended_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.owner} - {'ended' if self.ended_at else 'live'} (rev {self.revision})"
+
+class PlanVolume(models.Model):
+    """
+    Weekly sets per muscle group planned by a user's active plan, as histogram buckets
+    (see api/rankings.py). Only users with an active plan have a row.
+    """
+    # No DB constraint: the row outlives the user until the rankings job removes it (and its counts)
+    user = models.OneToOneField(User, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True, related_name='+')
+    buckets = models.JSONField(default=dict) # Muscle group id (str) -> bucket; groups the plan doesn't train are left out
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Volume of user #{self.user_id}"
+
+class VolumeBucket(models.Model):
+    """Number of users whose weekly sets for a muscle group fall in a bucket. Maintained by api/rankings.py."""
+    muscle_group = models.PositiveIntegerField() # 0 = every ranked user (bucket 0), the population size
+    bucket = models.PositiveIntegerField()
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('muscle_group', 'bucket')
+
+    def __str__(self):
+        return f"Group {self.muscle_group} bucket {self.bucket}: {self.count}"
@@ -0,0 +1,18 @@
+import hmac
+
+from django.conf import settings
+from rest_framework import permissions
+
+
+class HasMetricsToken(permissions.BasePermission):
+    """
+    Allows access when the request carries "Authorization: Bearer <METRICS_TOKEN>".
+    Used by scrapers, which don't have a user account / JWT.
+    """
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        if not token:
+            return False # Endpoint is closed until a token is configured
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        scheme, _, provided = header.partition(' ')
+        return scheme == 'Bearer' and hmac.compare_digest(provided.encode(), token.encode())
@@ -0,0 +1,297 @@
+"""
+On-demand CPU profiles of single requests, stored as RequestProfile rows for the admin.
+
+A staff user asks for one with the "X-Profile" header or the ?profile= query
+flag: "1"/"cprofile" runs the deterministic profiler (cProfile), "sample" a
+stack sampler. PROFILING_SAMPLE_RATE additionally samples that share of all
+API requests with the stack sampler, for finding slow requests nobody flagged.
+
+Each profile gets a breakdown by subsystem (auth, orm, serializer, renderer,
+throttle, other). Time is charged to the innermost frame that belongs to one
+of them, so ORM work done for a serializer counts as ORM.
+
+When profiling is disabled (PROFILING_ENABLED) the middleware removes itself.
+With it enabled, an unflagged request costs a header and query-string check
+(plus one random() call if PROFILING_SAMPLE_RATE is set), and under ASGI it
+stays async so unprofiled requests don't take a thread hop.
+"""
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.urls import reverse
+
+from .models import RequestProfile
+
+# (subsystem, path fragments of the source files that belong to it); first match wins
+SUBSYSTEMS = (
+    ('auth', ('rest_framework_simplejwt/', 'rest_framework/authentication.py', 'django/contrib/auth/',
+              '/jwt/', 'api/tokens.py', 'api/hashers.py', 'api/hashing.py', 'api/revocation.py')),
+    ('throttle', ('rest_framework/throttling.py', 'api/throttling.py')),
+    ('orm', ('django/db/', '/psycopg/', '/psycopg_pool/', '/sqlite3/')),
+    ('serializer', ('rest_framework/serializers.py', 'rest_framework/fields.py', 'rest_framework/relations.py',
+                    'api/serializers.py', 'api/catalog.py')),
+    ('renderer', ('rest_framework/renderers.py', 'rest_framework/utils/encoders.py', '/json/')),
+)
+OTHER = 'other'
+MODES = {'1': 'cprofile', 'cprofile': 'cprofile', 'sample': 'sampling'}
+
+
+def classify(filename):
+    filename = filename.replace('\\', '/')
+    for subsystem, fragments in SUBSYSTEMS:
+        if any(fragment in filename for fragment in fragments):
+            return subsystem
+    return None
+
+
+class StackSampler:
+    """
+    Records the stack of the calling thread every `interval` seconds from a background thread.
+    Frames from `root_code` outwards (the caller's own frames) are left out.
+    """
+    def __init__(self, interval, root_code=None):
+        self.interval = interval
+        self.root_code = root_code
+        self.samples = Counter() # tuple of (filename, function) from outermost to innermost -> count
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not self.root_code:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def breakdown(self, duration):
+        """
+        Seconds per subsystem: each sample is charged to its innermost classified frame and
+        the shares are scaled to the measured duration (the GIL makes real sample spacing uneven).
+        """
+        counts = Counter()
+        for stack, count in self.samples.items():
+            subsystem = next((s for s in (classify(f) for f, _ in reversed(stack)) if s), OTHER)
+            counts[subsystem] += count
+        total = sum(counts.values())
+        return {subsystem: duration * count / total for subsystem, count in counts.items()}
+
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope."""
+        lines = []
+        for stack, count in self.samples.most_common():
+            frames = ';'.join(f'{name} ({filename.rsplit("/", 1)[-1]})' for filename, name in stack)
+            lines.append(f'{frames} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def call_tree(self, min_share=0.01):
+        """Indented call tree with the share of samples spent under each node."""
+        total = sum(self.samples.values())
+        tree = {}
+        for stack, count in self.samples.items():
+            node = tree
+            for frame in stack:
+                entry = node.setdefault(frame, [0, {}])
+                entry[0] += count
+                node = entry[1]
+        lines = []
+
+        def walk(node, depth):
+            for (filename, name), (count, children) in sorted(node.items(), key=lambda item: -item[1][0]):
+                if total and count / total < min_share:
+                    continue
+                lines.append(f'{count / total:6.1%}  {"  " * depth}{name}  ({filename.rsplit("/", 1)[-1]})')
+                walk(children, depth + 1)
+
+        walk(tree, 0)
+        return '\n'.join(lines)
+
+
+def cprofile_breakdown(stats):
+    """
+    Seconds per subsystem from pstats data. Self time of functions that don't belong to a
+    subsystem (builtins, stdlib) is charged to the subsystem of their most expensive caller chain.
+    """
+    memo = {}
+
+    def subsystem_of(func, depth=0):
+        if func in memo:
+            return memo[func]
+        subsystem = classify(func[0])
+        if subsystem is None and depth < 30:
+            callers = stats[func][4] if func in stats else {}
+            if callers:
+                caller = max(callers, key=lambda c: callers[c][3]) # Highest cumulative time through this edge
+                memo[func] = OTHER # Breaks recursion cycles
+                subsystem = subsystem_of(caller, depth + 1)
+        memo[func] = subsystem or OTHER
+        return memo[func]
+
+    totals = Counter()
+    for func, (_, _, self_time, _, _) in stats.items():
+        totals[subsystem_of(func)] += self_time
+    return dict(totals)
+
+
+def wants_profile(request):
+    """Profiling mode requested by a header or query flag, or None."""
+    flag = request.META.get('HTTP_X_PROFILE')
+    if not flag and 'profile=' in request.META.get('QUERY_STRING', ''):
+        flag = request.GET.get('profile')
+    return MODES.get(flag) if flag else None
+
+
+def is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # API clients authenticate per view with a JWT, which hasn't happened yet
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except (InvalidToken, TokenError):
+        return False
+    return bool(result and result[0].is_staff)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def requested_mode(self, request):
+        """(mode, trigger) for this request, or (None, None). Does no I/O."""
+        mode = wants_profile(request)
+        if mode is not None:
+            return mode, 'flag'
+        if self.sample_rate and request.path.startswith('/api/') and random.random() < self.sample_rate:
+            return 'sampling', 'sampled'
+        return None, None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode, trigger = self.requested_mode(request)
+        if mode is None or (trigger == 'flag' and not is_staff(request)):
+            return self.get_response(request)
+        return self.profile(request, mode, trigger, self.get_response)
+
+    async def __acall__(self, request):
+        mode, trigger = self.requested_mode(request)
+        if mode is None:
+            return await self.get_response(request)
+        return await sync_to_async(self.profile_async_chain)(request, mode, trigger)
+
+    def profile_async_chain(self, request, mode, trigger):
+        # The sync views further down run in this thread (thread-sensitive sync_to_async
+        # reuses the thread that called async_to_sync), so the profilers see them
+        get_response = async_to_sync(self.get_response)
+        if trigger == 'flag' and not is_staff(request):
+            return get_response(request)
+        return self.profile(request, mode, trigger, get_response)
+
+    def profile(self, request, mode, trigger, get_response):
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            if mode == 'cprofile':
+                import cProfile # Rarely used, so not imported at start-up
+                profiler = cProfile.Profile()
+                # Covers the rest of the middleware, DRF auth, the view and rendering
+                response = profiler.runcall(get_response, request)
+            else:
+                profiler = StackSampler(settings.PROFILING_SAMPLE_INTERVAL, root_code=self.profile.__code__)
+                profiler.start()
+                try:
+                    response = get_response(request)
+                finally:
+                    profiler.stop()
+        duration = time.perf_counter() - started
+
+        profile = save_profile(request, response, mode, trigger, profiler, duration, queries[0])
+        if trigger == 'flag':
+            response['X-Profile-Id'] = str(profile.pk)
+            response['X-Profile-Url'] = request.build_absolute_uri(
+                reverse('admin:api_requestprofile_change', args=[profile.pk])
+            )
+        return response
+
+
+# Query parameters that are credentials (the calendar feed's and the live stream's ?token=)
+SECRET_PARAMETERS = ('token',)
+
+
+def stored_path(request):
+    """The request path and query string, without the credentials admins shouldn't be able to read."""
+    query = request.GET.copy()
+    for name in SECRET_PARAMETERS:
+        query.pop(name, None)
+    return f'{request.path}?{query.urlencode()}' if query else request.path
+
+
+def save_profile(request, response, mode, trigger, profiler, duration, query_count):
+    if mode == 'cprofile':
+        import io
+        import marshal
+        import pstats
+        stats = pstats.Stats(profiler)
+        breakdown = cprofile_breakdown(stats.stats)
+        report = io.StringIO()
+        stats.stream = report
+        stats.sort_stats('cumulative').print_stats(60)
+        report = report.getvalue()
+        data = marshal.dumps(stats.stats) # Same bytes as Stats.dump_stats(); opens in snakeviz / pstats
+    else:
+        breakdown = profiler.breakdown(duration)
+        report = profiler.call_tree()
+        data = profiler.collapsed().encode()
+
+    user = getattr(request, 'user', None)
+    profile = RequestProfile.objects.create(
+        user=user if user is not None and user.is_authenticated else None,
+        method=request.method,
+        path=stored_path(request)[:500],
+        status_code=response.status_code,
+        mode=mode,
+        trigger=trigger,
+        duration_ms=round(duration * 1000, 2),
+        query_count=query_count,
+        breakdown={subsystem: round(seconds * 1000, 2) for subsystem, seconds in breakdown.items()},
+        report=report,
+        data=data,
+    )
+    # Keep only the newest PROFILING_MAX_STORED profiles
+    RequestProfile.objects.filter(pk__lte=profile.pk - settings.PROFILING_MAX_STORED).delete()
+    return profile
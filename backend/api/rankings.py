@@ -0,0 +1,304 @@
+"""
+Where a user's planned training volume ranks among all users (GET /api/rankings/).
+
+Volume is weekly sets per muscle group in the active plan. Each day's workout
+counts once per 7-day cycle (rest days don't count), and a set counts fully
+for a muscle the exercise works hard, half for medium and a quarter for low
+activation. Volumes are rounded to RANKINGS_STEP and capped at
+RANKINGS_MAX_SETS, so every muscle group's distribution is an exact histogram
+of a few hundred buckets, however many users there are.
+
+The job worker keeps it current: PlanVolume holds each user's buckets and the
+VolumeBucket counts move by the difference whenever a plan, workout or
+activation changes (signals.py queues 'rankings.refresh'). Web workers keep
+cumulative counts in memory and reload them when the 'rankings' version
+changes, so a percentile is an array lookup instead of a count over users.
+"""
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import catalog, versioning
+from .models import ExerciseMuscleActivation, Plan, PlanVolume, VolumeBucket, WorkoutExercise
+from .schedule import CYCLE_LENGTH
+
+POPULATION = 0 # VolumeBucket.muscle_group of the row counting every ranked user
+ACTIVATION_WEIGHTS = {'H': 1.0, 'M': 0.5, 'L': 0.25} # Share of a set that counts towards the muscle
+DAY_FIELDS = tuple((f'day{day}_workout_id', f'day{day}_is_rest') for day in range(1, CYCLE_LENGTH + 1))
+UPSERT_BATCH_SIZE = 500
+
+
+def max_bucket():
+    return round(settings.RANKINGS_MAX_SETS / settings.RANKINGS_STEP)
+
+
+def to_buckets(volume):
+    """{group id (str): bucket} for a {group id: weekly sets} volume; untrained groups are left out."""
+    top = max_bucket()
+    buckets = {}
+    for group_id, sets in volume.items():
+        bucket = min(round(sets / settings.RANKINGS_STEP), top)
+        if bucket:
+            buckets[str(group_id)] = bucket
+    return buckets
+
+
+def _active_plans(user_ids):
+    """{user id: day fields} of each user's active plan (the newest, like schedule.get_active_plan)."""
+    fields = [name for pair in DAY_FIELDS for name in pair]
+    plans = {}
+    for row in (
+        Plan.objects.filter(owner_id__in=user_ids, is_active=True)
+        .order_by('owner_id', '-updated_at').values('owner_id', *fields)
+    ):
+        plans.setdefault(row['owner_id'], row)
+    return plans
+
+
+def compute_volumes(user_ids):
+    """{user id: {group id: weekly sets}} for those of the users that have an active plan."""
+    days = {
+        user_id: [plan[workout] for workout, rest in DAY_FIELDS if plan[workout] is not None and not plan[rest]]
+        for user_id, plan in _active_plans(user_ids).items()
+    }
+    rows = {}
+    for workout_id, exercise_id, target_sets in (
+        WorkoutExercise.objects.filter(workout_id__in={w for workout_ids in days.values() for w in workout_ids})
+        .values_list('workout_id', 'exercise_id', 'target_sets')
+    ):
+        rows.setdefault(workout_id, []).append((exercise_id, target_sets))
+    # Straight from the database rather than the catalog snapshot, which may be a few seconds behind
+    weights = {}
+    for exercise_id, group_id, level in (
+        ExerciseMuscleActivation.objects.filter(exercise_id__in={e for r in rows.values() for e, _ in r})
+        .values_list('exercise_id', 'muscle_group_id', 'activation_level')
+    ):
+        weights.setdefault(exercise_id, []).append((group_id, ACTIVATION_WEIGHTS.get(level, 0)))
+
+    per_workout = {}
+    for workout_id, workout_rows in rows.items():
+        volume = Counter()
+        for exercise_id, target_sets in workout_rows:
+            for group_id, weight in weights.get(exercise_id, ()):
+                volume[group_id] += target_sets * weight
+        per_workout[workout_id] = volume
+    volumes = {}
+    for user_id, workout_ids in days.items():
+        volume = Counter()
+        for workout_id in workout_ids:
+            volume.update(per_workout.get(workout_id, {}))
+        volumes[user_id] = dict(volume)
+    return volumes
+
+
+def users_planning(workout_ids):
+    """Owners of active plans that schedule any of the given workouts."""
+    workout_ids = set(workout_ids)
+    if not workout_ids:
+        return set()
+    uses = Q()
+    for workout, _ in DAY_FIELDS:
+        uses |= Q(**{f'{workout}__in': workout_ids})
+    return set(Plan.objects.filter(uses, is_active=True).values_list('owner_id', flat=True).distinct())
+
+
+def _add_counts(deltas):
+    """Add {(group, bucket): delta} to the VolumeBucket counts, creating missing rows."""
+    rows = sorted((key, delta) for key, delta in deltas.items() if delta)
+    table = connection.ops.quote_name(VolumeBucket._meta.db_table)
+    count = connection.ops.quote_name('count')
+    # An increment can't be written as a bulk_create(update_conflicts=True), so upsert by hand.
+    # Rows go in key order, so refreshes running side by side lock them in the same order.
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[start:start + UPSERT_BATCH_SIZE]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (muscle_group, bucket, {count}) VALUES {", ".join(["(%s, %s, %s)"] * len(batch))} '
+                f'ON CONFLICT (muscle_group, bucket) DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}',
+                [value for (group, bucket), delta in batch for value in (group, bucket, delta)],
+            )
+
+
+def _refresh_batch(user_ids):
+    with transaction.atomic():
+        # Lock first, so two refreshes of the same user can't both apply their difference. A user
+        # ranked for the first time has no PlanVolume row to lock yet, so lock the user row too
+        # (deleted users have only the former).
+        list(User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk'))
+        stored = {
+            row.user_id: row
+            for row in PlanVolume.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id')
+        }
+        volumes = compute_volumes(user_ids)
+        deltas = Counter()
+        created, updated, deleted = [], [], []
+        now = timezone.now()
+        for user_id in user_ids:
+            row = stored.get(user_id)
+            buckets = to_buckets(volumes[user_id]) if user_id in volumes else None
+            if buckets == (row.buckets if row is not None else None):
+                continue
+            if row is not None:
+                deltas[(POPULATION, 0)] -= 1
+                for group_id, bucket in row.buckets.items():
+                    deltas[(int(group_id), bucket)] -= 1
+            if buckets is not None:
+                deltas[(POPULATION, 0)] += 1
+                for group_id, bucket in buckets.items():
+                    deltas[(int(group_id), bucket)] += 1
+            if buckets is None:
+                deleted.append(user_id)
+            elif row is None:
+                created.append(PlanVolume(user_id=user_id, buckets=buckets))
+            else:
+                row.buckets, row.updated_at = buckets, now
+                updated.append(row)
+        if deleted:
+            PlanVolume.objects.filter(user_id__in=deleted).delete()
+        PlanVolume.objects.bulk_create(created)
+        PlanVolume.objects.bulk_update(updated, ['buckets', 'updated_at'])
+        if deltas:
+            _add_counts(deltas)
+            versioning.bump_version(versioning.RANKINGS)
+    return len(created) + len(updated) + len(deleted)
+
+
+def refresh_users(user_ids):
+    """Recompute the stored volume of these users and move the histogram counts by the difference."""
+    user_ids = sorted(set(user_ids))
+    changed = 0
+    for start in range(0, len(user_ids), settings.RANKINGS_BATCH_SIZE):
+        changed += _refresh_batch(user_ids[start:start + settings.RANKINGS_BATCH_SIZE])
+    return changed
+
+
+def refresh_all():
+    """Refresh everyone with an active plan or a stored volume (e.g. after changing RANKINGS_STEP)."""
+    user_ids = set(Plan.objects.filter(is_active=True).values_list('owner_id', flat=True).distinct())
+    user_ids |= set(PlanVolume.objects.values_list('user_id', flat=True))
+    return refresh_users(user_ids)
+
+
+def rebuild_counts():
+    """Recount every bucket from the PlanVolume rows. A repair: refresh_users keeps the counts right."""
+    with transaction.atomic():
+        # Refreshes that start meanwhile wait for these rows, then apply their difference on top
+        existing = {
+            (row.muscle_group, row.bucket): row
+            for row in VolumeBucket.objects.select_for_update()
+        }
+        counts = Counter()
+        for buckets in PlanVolume.objects.values_list('buckets', flat=True).iterator(chunk_size=2000):
+            counts[(POPULATION, 0)] += 1
+            for group_id, bucket in buckets.items():
+                counts[(int(group_id), bucket)] += 1
+        wrong = sum(1 for key in counts.keys() | existing.keys()
+                    if counts.get(key, 0) != (existing[key].count if key in existing else 0))
+        VolumeBucket.objects.bulk_create(
+            [VolumeBucket(muscle_group=group, bucket=bucket, count=count) for (group, bucket), count in counts.items()],
+            update_conflicts=True, unique_fields=['muscle_group', 'bucket'], update_fields=['count'],
+            batch_size=UPSERT_BATCH_SIZE,
+        )
+        VolumeBucket.objects.filter(pk__in=[row.pk for key, row in existing.items() if key not in counts]).delete()
+        if wrong:
+            versioning.bump_version(versioning.RANKINGS)
+    return wrong
+
+
+# --- Percentiles (per worker) ---
+
+class Distribution:
+    """
+    Cumulative counts per muscle group: below[group][b] is the number of ranked users
+    whose bucket for the group is under b (users who don't train it are in bucket 0).
+    """
+    __slots__ = ('version', 'population', 'below')
+
+    def __init__(self, version, population, counts):
+        self.version = version
+        self.population = population
+        size = max_bucket() + 2
+        self.below = {}
+        for group_id, buckets in counts.items():
+            below = array('q', bytes(8 * size))
+            running = max(population - sum(buckets.values()), 0) # Bucket 0
+            for bucket in range(1, size):
+                below[bucket] = running
+                running += buckets.get(bucket, 0)
+            self.below[group_id] = below
+
+    def percentile(self, group_id, bucket):
+        """Share of users below plus half of those level with `bucket`, in percent (None if nobody is ranked)."""
+        if not self.population:
+            return None
+        below = self.below.get(group_id)
+        if below is None: # Nobody trains the group (as of this distribution)
+            under, level = (self.population, 0) if bucket else (0, self.population)
+        else:
+            bucket = min(bucket, len(below) - 2)
+            under, level = below[bucket], below[bucket + 1] - below[bucket]
+        # A user's own row can be newer than the distribution for a moment, hence the clamp
+        return round(min(max(100 * (under + level / 2) / self.population, 0), 100), 1)
+
+
+_lock = threading.Lock()
+_distribution = None
+_checked_at = 0.0
+
+
+def _load(version):
+    population, counts = 0, {}
+    for group_id, bucket, count in VolumeBucket.objects.filter(count__gt=0).values_list('muscle_group', 'bucket', 'count'):
+        if group_id == POPULATION:
+            population = count
+        else:
+            counts.setdefault(group_id, {})[bucket] = count
+    return Distribution(version, population, counts)
+
+
+def get_distribution():
+    """The current Distribution, reloaded if the rankings version changed."""
+    global _distribution, _checked_at
+    distribution = _distribution
+    interval = settings.RANKINGS_VERSION_CHECK_INTERVAL
+    if distribution is not None and time.monotonic() - _checked_at < interval:
+        return distribution
+    with _lock:
+        if _distribution is not None and time.monotonic() - _checked_at < interval:
+            return _distribution # Another thread just refreshed it
+        version = versioning.get_version(versioning.RANKINGS)
+        if _distribution is None or _distribution.version != version:
+            _distribution = _load(version)
+        _checked_at = time.monotonic()
+        return _distribution
+
+
+def rankings_for(user):
+    """Percentile of the user's weekly sets for every muscle group, or None without an active plan."""
+    row = PlanVolume.objects.filter(user=user).first()
+    if row is not None:
+        buckets, updated_at = row.buckets, row.updated_at
+    else:
+        # The job hasn't picked up a new plan yet: rank it against the others all the same
+        volume = compute_volumes([user.pk]).get(user.pk)
+        if volume is None:
+            return None
+        buckets, updated_at = to_buckets(volume), None
+    distribution = get_distribution()
+    groups = []
+    for group_id, record in catalog.get_snapshot().muscle_groups.items():
+        bucket = buckets.get(str(group_id), 0)
+        groups.append({
+            'id': group_id,
+            'name': record.name,
+            'weekly_sets': bucket * settings.RANKINGS_STEP,
+            'percentile': distribution.percentile(group_id, bucket),
+        })
+    return {'population': distribution.population, 'updated_at': updated_at, 'muscle_groups': groups}
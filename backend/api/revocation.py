@@ -0,0 +1,170 @@
+"""
+In-memory Bloom filter over the refresh-token blacklist.
+
+With ROTATE_REFRESH_TOKENS + BLACKLIST_AFTER_ROTATION every refresh would
+first look its jti up in BlacklistedToken. Instead each worker keeps a Bloom
+filter of revoked jtis: a miss means "definitely not revoked" and skips the
+query; only a possible hit (revoked, or a ~REVOCATION_BLOOM_FP_RATE false
+positive) goes to the database.
+
+The filter picks up new blacklist rows incrementally (rows blacklisted since
+the last sync, with REVOCATION_SYNC_OVERLAP seconds of overlap) at most every
+REVOCATION_SYNC_INTERVAL seconds and is rebuilt from scratch every
+REVOCATION_REBUILD_INTERVAL seconds, which drops expired tokens and resizes
+it. Both query without holding the lock, so a rebuild doesn't stall the
+worker's other refreshes. Tokens revoked by this worker are added immediately. Reusing a
+rotated token is still caught exactly: blacklisting it a second time finds the
+existing row (see RevocationCheckedRefreshToken.blacklist).
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+class BloomFilter:
+    __slots__ = ('capacity', 'size', 'hashes', 'bits', 'count')
+
+    def __init__(self, capacity, fp_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)) # bits
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationFilter:
+    def __init__(self):
+        self._lock = threading.Lock() # Guards the filter's bits; never held across a query
+        self._bloom = None
+        self._refreshing = False
+        self._revoked_meanwhile = None # Revocations made here while a rebuild runs
+        self._synced_since = None # blacklisted_at from which the next sync reads (minus the overlap)
+        self._built_at = 0.0
+        self._synced_at = 0.0
+        self.stats = {'checks': 0, 'db_checks': 0, 'revoked': 0, 'rebuilds': 0}
+
+    def _rebuild(self, now):
+        started = timezone.now()
+        jtis = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=started).values_list('token__jti', flat=True)
+        )
+        # Leave room for the tokens revoked until the next rebuild
+        bloom = BloomFilter(
+            max(2 * len(jtis), settings.REVOCATION_BLOOM_MIN_CAPACITY), settings.REVOCATION_BLOOM_FP_RATE,
+        )
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            for jti in self._revoked_meanwhile:
+                bloom.add(jti)
+            self._bloom = bloom
+            self._synced_since = started
+            self._built_at = self._synced_at = now
+            self.stats['rebuilds'] += 1
+
+    def _sync(self, now):
+        # Read a window rather than the rows after the highest id seen: ids are handed out
+        # at insert but rows show up at commit, so a lower id can appear after a higher one.
+        # The overlap covers transactions that commit late and clock skew between hosts.
+        started = timezone.now()
+        since = self._synced_since - timedelta(seconds=settings.REVOCATION_SYNC_OVERLAP)
+        jtis = list(BlacklistedToken.objects.filter(blacklisted_at__gte=since).values_list('token__jti', flat=True))
+        with self._lock:
+            for jti in jtis:
+                if jti not in self._bloom: # The overlap reads rows again; don't count them twice
+                    self._bloom.add(jti)
+            self._synced_since = started
+            self._synced_at = now
+
+    def _refresh(self):
+        """Rebuild or sync the filter if it is due. The queries run without the lock; checks meanwhile use the old filter."""
+        now = time.monotonic()
+        with self._lock:
+            if self._refreshing:
+                return # Another thread is on it
+            if (self._bloom is None
+                    or now - self._built_at >= settings.REVOCATION_REBUILD_INTERVAL
+                    or self._bloom.count > self._bloom.capacity):
+                step = self._rebuild
+                self._revoked_meanwhile = []
+            elif now - self._synced_at >= settings.REVOCATION_SYNC_INTERVAL:
+                step = self._sync
+            else:
+                return
+            self._refreshing = True
+        try:
+            step(now)
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._revoked_meanwhile = None
+
+    def might_be_revoked(self, jti):
+        self._refresh()
+        with self._lock:
+            self.stats['checks'] += 1
+            # No filter until the first build finishes: ask the database
+            hit = self._bloom is None or jti in self._bloom
+            if hit:
+                self.stats['db_checks'] += 1
+            return hit
+
+    def add(self, jti):
+        """Record a revocation made by this process right away."""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+            if self._revoked_meanwhile is not None:
+                self._revoked_meanwhile.append(jti)
+            self.stats['revoked'] += 1
+
+    def info(self):
+        with self._lock:
+            bloom = self._bloom
+            return {
+                **self.stats,
+                'entries': bloom.count if bloom else 0,
+                'size_bits': bloom.size if bloom else 0,
+            }
+
+
+revocation_filter = RevocationFilter()
+
+
+def prune_expired(batch_size=None):
+    """
+    Delete expired outstanding tokens (and their blacklist rows) in batches,
+    so a large backlog doesn't hold one long transaction. Returns rows deleted.
+    """
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    batch_size = batch_size or settings.PRUNE_BATCH_SIZE
+    total = 0
+    now = timezone.now()
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        total += len(ids)
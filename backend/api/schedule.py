@@ -0,0 +1,151 @@
+"""
+Expands the active plan's 7-day cycle over a date range (calendar views and iCal feed).
+
+The day of the cycle for a date is pure arithmetic on the plan's start_date
+(or the weekday when it isn't set), so no per-day rows exist or are created.
+Referenced workouts are loaded once per request and events are produced by
+generators, so even a multi-year feed streams in constant memory.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core import signing
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import versioning
+from .models import Plan, Workout
+
+CYCLE_LENGTH = 7
+FEED_TOKEN_SALT = 'api.schedule.feed'
+
+
+def get_active_plan(user):
+    return Plan.objects.filter(owner=user, is_active=True).order_by('-updated_at').first()
+
+
+def cycle_day(plan, date):
+    """1-based day of the plan's cycle that `date` falls on."""
+    if plan.start_date is None:
+        return date.isoweekday() # Monday = day 1
+    return (date - plan.start_date).days % CYCLE_LENGTH + 1
+
+
+def load_workouts(plan):
+    """Every workout the plan references, each loaded once: {id: Workout}."""
+    ids = {getattr(plan, f'day{day}_workout_id') for day in range(1, CYCLE_LENGTH + 1)} - {None}
+    return {w.id: w for w in Workout.objects.filter(id__in=ids).only('id', 'name', 'description')}
+
+
+def iter_days(plan, workouts, start, end):
+    """
+    Yield (date, day, workout or None, is_rest) for start..end inclusive,
+    skipping days that have neither a workout nor a rest flag.
+    """
+    slots = {
+        day: (workouts.get(getattr(plan, f'day{day}_workout_id')), getattr(plan, f'day{day}_is_rest'))
+        for day in range(1, CYCLE_LENGTH + 1)
+    }
+    date = start
+    one_day = timedelta(days=1)
+    while date <= end:
+        day = cycle_day(plan, date)
+        workout, is_rest = slots[day]
+        if workout is not None or is_rest:
+            yield date, day, workout, is_rest
+        date += one_day
+
+
+# --- iCalendar (RFC 5545) ---
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Content lines are limited to 75 octets; continuation lines start with a space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80: # Don't split a UTF-8 character
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def iter_ics(plan, workouts, start, end, chunk_events=200):
+    """Yield the feed in chunks of roughly `chunk_events` events."""
+    stamp = plan.updated_at.strftime('%Y%m%dT%H%M%SZ')
+    yield ''.join(_fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Fitness Tracker//Plan Calendar//EN',
+        'CALSCALE:GREGORIAN', f'X-WR-CALNAME:{_escape(plan.name)}',
+    ))
+    buffer = []
+    for date, day, workout, is_rest in iter_days(plan, workouts, start, end):
+        summary = 'Rest day' if workout is None else workout.name
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:plan-{plan.id}-{date:%Y%m%d}@fitness-tracker',
+            f'DTSTAMP:{stamp}',
+            f'DTSTART;VALUE=DATE:{date:%Y%m%d}',
+            f'DTEND;VALUE=DATE:{date + timedelta(days=1):%Y%m%d}',
+            f'SUMMARY:{_escape(summary)} (day {day})',
+        ]
+        if workout is not None and workout.description:
+            lines.append(f'DESCRIPTION:{_escape(workout.description)}')
+        lines.append('END:VEVENT')
+        buffer.extend(_fold(line) for line in lines)
+        if len(buffer) >= chunk_events * 7:
+            yield ''.join(buffer)
+            buffer = []
+    buffer.append(_fold('END:VCALENDAR'))
+    yield ''.join(buffer)
+
+
+# Feed URLs are subscribed to once and polled for years, so tokens don't expire.
+# Instead each carries the user's feed generation (versioning.feed_key) and
+# rotate_feed_token() revokes every URL issued so far, e.g. after one leaked.
+
+def make_feed_token(user):
+    """Opaque token for calendar apps, which can't send a JWT."""
+    generation = versioning.get_version(versioning.feed_key(user.pk))
+    return signing.dumps({'u': user.pk, 'g': generation}, salt=FEED_TOKEN_SALT, compress=True)
+
+
+def read_feed_token(token):
+    """The active user a feed token belongs to, or None if it isn't valid (or was rotated away)."""
+    try:
+        data = signing.loads(token, salt=FEED_TOKEN_SALT)
+        user_id, generation = data['u'], data['g']
+    except (signing.BadSignature, KeyError, TypeError, AttributeError):
+        return None
+    if generation != versioning.get_version(versioning.feed_key(user_id)):
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+def rotate_feed_token(user):
+    """Revoke the user's feed URLs and return a new token."""
+    versioning.bump_version(versioning.feed_key(user.pk))
+    return make_feed_token(user)
+
+
+class FeedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates calendar apps by the ?token= of their feed URL, so they are
+    throttled per user rather than sharing the anonymous bucket of their IP.
+    """
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+        user = read_feed_token(token)
+        if user is None:
+            raise AuthenticationFailed('Invalid feed token.')
+        return user, None
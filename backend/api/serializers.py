@@ -2,9 +2,14 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
     MuscleGroup, Exercise, Workout, WorkoutExercise, Plan,
-    ExerciseMuscleActivation # Import the new model
+    ExerciseMuscleActivation, # Import the new model
+    Job,
 )
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
+from django.db.models import Q
+from . import catalog, signals, summaries, versioning
 
 class MuscleGroupSerializer(serializers.ModelSerializer):
     class Meta:
@@ -67,9 +72,20 @@ class ExerciseSerializer(serializers.ModelSerializer):
                 ExerciseMuscleActivation.objects.create(exercise=instance, **activation_data)
         return instance
 
+class CatalogExerciseSerializer(ExerciseSerializer):
+    """
+    Read-only exercise representation looked up in the in-memory catalog snapshot
+    by the parent's exercise_id, so rendering workouts doesn't query the catalog tables.
+    """
+    def get_attribute(self, instance):
+        record = catalog.get_exercise(instance.exercise_id)
+        if record is None: # Created in another worker since our last version check
+            return instance.exercise
+        return record
+
 class WorkoutExerciseSerializer(serializers.ModelSerializer):
     # Include details about the exercise itself (now includes muscle activations)
-    exercise = ExerciseSerializer(read_only=True)
+    exercise = CatalogExerciseSerializer(read_only=True)
     # Allow setting exercise by ID when creating/updating through Workout
     exercise_id = serializers.PrimaryKeyRelatedField(
         queryset=Exercise.objects.all(),
@@ -87,32 +103,61 @@ class WorkoutSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Workout
-        fields = ['id', 'name', 'description', 'workout_exercises']
+        fields = ['id', 'name', 'description', 'owner', 'is_public', 'workout_exercises']
+        read_only_fields = ['owner'] # Set from the request in the view
+
+    @staticmethod
+    def summarize(workout_exercises_data):
+        return summaries.summarize((item['exercise'].id, item['target_sets']) for item in workout_exercises_data)
 
-    # create/update methods handle nested WorkoutExercise writes
+    # create/update methods handle nested WorkoutExercise writes.
+    # Every row sends signals; bump_once() and enqueue_once() turn their version bumps and
+    # refresh jobs into one per counter and job.
     def create(self, validated_data):
         workout_exercises_data = validated_data.pop('workout_exercises')
-        workout = Workout.objects.create(**validated_data)
-        for item_data in workout_exercises_data:
-            exercise = item_data.pop('exercise') # Handled by PrimaryKeyRelatedField source
-            WorkoutExercise.objects.create(workout=workout, exercise=exercise, **item_data)
+        with transaction.atomic(), versioning.bump_once(), signals.enqueue_once():
+            workout = Workout.objects.create(**validated_data, **self.summarize(workout_exercises_data))
+            for item_data in workout_exercises_data:
+                exercise = item_data.pop('exercise') # Handled by PrimaryKeyRelatedField source
+                WorkoutExercise.objects.create(workout=workout, exercise=exercise, **item_data)
         return workout
 
     def update(self, instance, validated_data):
         workout_exercises_data = validated_data.pop('workout_exercises', None)
+        # Read by the save signal: a workout made private must still invalidate the public lists
+        instance._was_public = instance.is_public
         # Update workout fields
         instance.name = validated_data.get('name', instance.name)
         instance.description = validated_data.get('description', instance.description)
-        instance.save()
-
+        instance.is_public = validated_data.get('is_public', instance.is_public)
         if workout_exercises_data is not None:
-            # Simple approach: Clear existing and add new ones
-            instance.workout_exercises.all().delete() # Use related_name
-            for item_data in workout_exercises_data:
-                exercise = item_data.pop('exercise')
-                WorkoutExercise.objects.create(workout=instance, exercise=exercise, **item_data)
+            for field, value in self.summarize(workout_exercises_data).items():
+                setattr(instance, field, value)
+        with transaction.atomic(), versioning.bump_once(), signals.enqueue_once():
+            instance.save()
+
+            if workout_exercises_data is not None:
+                # Simple approach: Clear existing and add new ones
+                instance.workout_exercises.all().delete() # Use related_name
+                for item_data in workout_exercises_data:
+                    exercise = item_data.pop('exercise')
+                    WorkoutExercise.objects.create(workout=instance, exercise=exercise, **item_data)
         return instance
 
+class WorkoutSummarySerializer(serializers.ModelSerializer):
+    """Flat list representation built from the denormalized summary columns (no nested rows)."""
+    muscle_groups = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Workout
+        fields = ['id', 'name', 'description', 'owner', 'is_public', 'exercise_count', 'total_sets', 'muscle_groups']
+        read_only_fields = fields
+
+    def get_muscle_groups(self, obj):
+        # Names come from the in-memory catalog snapshot
+        groups = catalog.get_snapshot().muscle_groups
+        return [{'id': group_id, 'name': groups[group_id].name} for group_id in obj.muscle_group_ids if group_id in groups]
+
 class PlanSerializer(serializers.ModelSerializer):
     owner_username = serializers.CharField(source='owner.username', read_only=True)
     owner = serializers.PrimaryKeyRelatedField(read_only=True) # Handled in view
@@ -129,7 +174,7 @@ class PlanSerializer(serializers.ModelSerializer):
     class Meta:
         model = Plan
         fields = [
-            'id', 'name', 'description', 'owner', 'owner_username', 'is_active',
+            'id', 'name', 'description', 'owner', 'owner_username', 'is_active', 'start_date',
             'day1_workout', 'day1_is_rest', 'day1_workout_details',
             'day2_workout', 'day2_is_rest', 'day2_workout_details',
             'day3_workout', 'day3_is_rest', 'day3_workout_details',
@@ -140,6 +185,44 @@ class PlanSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['owner']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None:
+            # Days may only point at the user's own workouts or public templates
+            visible = Workout.objects.filter(Q(owner=request.user) | Q(is_public=True))
+            for day in range(1, 8):
+                fields[f'day{day}_workout'].queryset = visible
+        return fields
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'task', 'status', 'attempts', 'max_attempts', 'created_at', 'run_at',
+            'started_at', 'finished_at', 'result', 'last_error',
+        ]
+        read_only_fields = fields
+
+class CloneSerializer(serializers.Serializer):
+    """Body of the workout and plan clone actions."""
+    name = serializers.CharField(max_length=200, required=False, allow_blank=False)
+
+class LiveSessionStartSerializer(serializers.Serializer):
+    workout = serializers.IntegerField()
+
+class LiveSetSerializer(serializers.Serializer):
+    workout_exercise = serializers.IntegerField()
+    reps = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    weight = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    rest = serializers.IntegerField(min_value=0, max_value=settings.LIVE_MAX_REST, required=False, allow_null=True) # Seconds
+
+class LiveCurrentSerializer(serializers.Serializer):
+    workout_exercise = serializers.IntegerField()
+
+class LiveRestSerializer(serializers.Serializer):
+    seconds = serializers.IntegerField(min_value=0, max_value=settings.LIVE_MAX_REST) # 0 stops the timer
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -180,6 +263,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         Create and return a new user instance, given the validated data.
         Handles password hashing automatically via create_user.
         """
+        # Atomic so a 429 from the hashing pool doesn't leave a user without a password
+        with transaction.atomic():
+            return self._create_user(validated_data)
+
+    def _create_user(self, validated_data):
         user = User.objects.create_user(
             username=validated_data['username'],
             email=validated_data['email'],
@@ -0,0 +1,135 @@
+import json
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import catalog, jobs, rankings, summaries, sync, versioning
+from .models import Exercise, ExerciseMuscleActivation, MuscleGroup, Plan, Workout, WorkoutExercise
+
+CATALOG_MODELS = (MuscleGroup, Exercise, ExerciseMuscleActivation)
+WORKOUT_MODELS = (Workout, WorkoutExercise)
+
+
+def catalog_changed():
+    versioning.bump_version(versioning.CATALOG)
+    # Other workers notice the new version on their next check; this one reloads right away
+    transaction.on_commit(catalog.invalidate)
+    if settings.CATALOG_SNAPSHOT_PATH:
+        # Build the shared snapshot file once in the job worker rather than in whichever web worker asks first
+        transaction.on_commit(lambda: jobs.enqueue('catalog.rebuild_snapshot', priority=10, unique=True))
+
+
+def workout_changed(workout, was_public=False):
+    if workout.owner_id is not None:
+        versioning.bump_version(versioning.user_key(workout.owner_id))
+    # Public workouts may be embedded in anyone's plans (including one that was just made private)
+    if workout.is_public or was_public:
+        versioning.bump_version(versioning.PUBLIC_WORKOUTS)
+
+
+_collecting = threading.local()
+
+
+@contextmanager
+def enqueue_once():
+    """
+    Queue each distinct refresh job once for all the writes in the block instead of once
+    per row (a nested workout save writes every exercise row), like versioning.bump_once().
+    Keep it inside the transaction of the writes.
+    """
+    if getattr(_collecting, 'jobs', None) is not None:
+        yield # An outer block queues them
+        return
+    _collecting.jobs = {}
+    try:
+        yield
+        pending = _collecting.jobs
+    finally:
+        _collecting.jobs = None
+    for task, args in pending.values():
+        _enqueue_on_commit(task, args)
+
+
+def _enqueue_on_commit(task, args):
+    transaction.on_commit(lambda: jobs.enqueue(task, args, unique=True))
+
+
+def _enqueue_later(task, args):
+    pending = getattr(_collecting, 'jobs', None)
+    if pending is None:
+        _enqueue_on_commit(task, args)
+    else:
+        pending.setdefault((task, json.dumps(args, sort_keys=True)), (task, args))
+
+
+def refresh_summaries_later(**args):
+    # Any number of workouts may use an exercise, so recompute their summaries in the job worker
+    _enqueue_later('workouts.refresh_summaries', args)
+
+
+def refresh_rankings_later(**args):
+    _enqueue_later('rankings.refresh', args)
+
+
+@receiver(post_save, sender=ExerciseMuscleActivation)
+@receiver(post_delete, sender=ExerciseMuscleActivation)
+def on_activation_change(sender, instance, **kwargs):
+    refresh_summaries_later(exercise_ids=[instance.exercise_id])
+    refresh_rankings_later(exercise_ids=[instance.exercise_id])
+
+
+@receiver(pre_delete, sender=Exercise)
+def on_exercise_delete(sender, instance, **kwargs):
+    # Its WorkoutExercise rows are about to be cascaded away, so find the workouts now
+    workout_ids = summaries.workouts_using([instance.pk])
+    if workout_ids:
+        refresh_summaries_later(workout_ids=sorted(workout_ids))
+
+
+@receiver(pre_delete, sender=Workout)
+def on_workout_delete(sender, instance, **kwargs):
+    # Plans let go of it without sending signals, so find whose volume changes now
+    user_ids = rankings.users_planning([instance.pk])
+    if user_ids:
+        refresh_rankings_later(user_ids=sorted(user_ids))
+
+
+def on_model_delete(sender, instance, **kwargs):
+    sync.record_deletion(instance)
+
+
+def on_model_write(sender, instance, **kwargs):
+    if sender in CATALOG_MODELS:
+        catalog_changed()
+    elif sender is Workout:
+        was_public = False
+        if kwargs.get('created') is False:
+            # WorkoutSerializer.update and the admin note the old flag; other updates may have flipped it
+            was_public = getattr(instance, '_was_public', True)
+            sync.record_visibility_change(instance, was_public)
+        workout_changed(instance, was_public)
+    elif sender is WorkoutExercise:
+        workout_changed(instance.workout)
+        refresh_rankings_later(workout_ids=[instance.workout_id])
+    elif sender is Plan:
+        versioning.bump_version(versioning.user_key(instance.owner_id))
+        refresh_rankings_later(user_ids=[instance.owner_id])
+
+
+# Connected per model, not for every sender: any post_delete receiver on a model turns off
+# Django's fast (single-query) delete for it, including cascades and the prune jobs
+for model in sync.KIND_BY_MODEL:
+    post_delete.connect(on_model_delete, sender=model)
+for model in CATALOG_MODELS + WORKOUT_MODELS + (Plan,):
+    post_save.connect(on_model_write, sender=model)
+    post_delete.connect(on_model_write, sender=model)
+
+
+@receiver(m2m_changed, sender=Exercise.muscle_groups.through)
+def on_exercise_muscle_groups_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        catalog_changed()
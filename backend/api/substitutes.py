@@ -0,0 +1,124 @@
+"""
+Exercise substitutions: the most similar exercises by muscle activation.
+
+Every exercise is a vector over muscle groups (activation level H/M/L mapped to
+LEVEL_WEIGHTS), normalized to unit length, so cosine similarity is a dot product.
+When the catalog snapshot changes version, each worker builds a top-k neighbor
+table from those vectors once; a request then only slices that table (O(k)).
+Exercises are compared through an inverted index by muscle group, so pairs
+without a shared muscle group are never scored.
+"""
+import heapq
+import math
+import threading
+from array import array
+
+from django.conf import settings
+
+from . import catalog
+
+LEVEL_WEIGHTS = {'H': 1.0, 'M': 0.6, 'L': 0.3}
+
+_lock = threading.Lock()
+_index = None
+
+
+class NeighborIndex:
+    """
+    Normalized activation matrix (CSR: row_offsets / col_group_ids / values, one row
+    per exercise) plus up to `k` neighbors per exercise, stored the same way.
+    """
+    __slots__ = (
+        'version', 'k', 'rows', 'row_offsets', 'col_group_ids', 'values',
+        'neighbor_offsets', 'neighbor_ids', 'similarities',
+    )
+
+    def __init__(self, version, k, rows, row_offsets, col_group_ids, values,
+                 neighbor_offsets, neighbor_ids, similarities):
+        self.version = version
+        self.k = k
+        self.rows = rows # exercise id -> row number
+        self.row_offsets = row_offsets
+        self.col_group_ids = col_group_ids
+        self.values = values
+        self.neighbor_offsets = neighbor_offsets
+        self.neighbor_ids = neighbor_ids
+        self.similarities = similarities
+
+    def neighbors(self, exercise_id, k=None, exclude=()):
+        """[(exercise id, similarity)] most similar first, at most k (and at most self.k)."""
+        row = self.rows.get(exercise_id)
+        if row is None:
+            return []
+        k = self.k if k is None else min(k, self.k)
+        result = []
+        for i in range(self.neighbor_offsets[row], self.neighbor_offsets[row + 1]):
+            neighbor_id = self.neighbor_ids[i]
+            if neighbor_id in exclude:
+                continue
+            result.append((neighbor_id, self.similarities[i]))
+            if len(result) == k:
+                break
+        return result
+
+
+def build_index(snapshot, k):
+    """Build the normalized matrix and top-k neighbor table from a catalog snapshot."""
+    vectors = {exercise_id: {} for exercise_id in snapshot.exercise_ids}
+    for exercise_id, group_id, level in zip(snapshot.act_exercise_ids, snapshot.act_group_ids, snapshot.act_levels):
+        vectors[exercise_id][group_id] = LEVEL_WEIGHTS.get(chr(level), 0.0)
+
+    rows = {}
+    row_offsets, col_group_ids, values = array('I', [0]), array('q'), array('d')
+    by_group = {} # group id -> [(exercise id, normalized weight)]
+    for row, exercise_id in enumerate(snapshot.exercise_ids):
+        rows[exercise_id] = row
+        vector = vectors[exercise_id]
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        for group_id in sorted(vector):
+            if norm:
+                weight = vector[group_id] / norm
+                col_group_ids.append(group_id)
+                values.append(weight)
+                by_group.setdefault(group_id, []).append((exercise_id, weight))
+        row_offsets.append(len(col_group_ids))
+
+    neighbor_offsets, neighbor_ids, similarities = array('I', [0]), array('q'), array('d')
+    for row, exercise_id in enumerate(snapshot.exercise_ids):
+        scores = {}
+        for i in range(row_offsets[row], row_offsets[row + 1]):
+            weight = values[i]
+            for other_id, other_weight in by_group[col_group_ids[i]]:
+                if other_id != exercise_id:
+                    scores[other_id] = scores.get(other_id, 0.0) + weight * other_weight
+        # Highest similarity first, ties broken by the lower id so results are stable
+        for other_id, score in heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0])):
+            neighbor_ids.append(other_id)
+            similarities.append(round(score, 6))
+        neighbor_offsets.append(len(neighbor_ids))
+
+    return NeighborIndex(snapshot.version, k, rows, row_offsets, col_group_ids, values,
+                         neighbor_offsets, neighbor_ids, similarities)
+
+
+def parse_k(value):
+    """?k= from a request: default SUBSTITUTES_DEFAULT_K, capped at SUBSTITUTES_MAX_K. Raises ValueError."""
+    if value in (None, ''):
+        return settings.SUBSTITUTES_DEFAULT_K
+    k = int(value)
+    if k < 1:
+        raise ValueError
+    return min(k, settings.SUBSTITUTES_MAX_K)
+
+
+def get_index():
+    """The neighbor table for the current catalog snapshot, rebuilt when its version changes."""
+    global _index
+    snapshot = catalog.get_snapshot()
+    index = _index
+    if index is not None and index.version == snapshot.version:
+        return index
+    with _lock:
+        if _index is None or _index.version != snapshot.version:
+            _index = build_index(snapshot, settings.SUBSTITUTES_MAX_K)
+        return _index
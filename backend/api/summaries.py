@@ -0,0 +1,71 @@
+"""
+Denormalized per-workout summary columns (exercise_count, total_sets, muscle_group_ids).
+
+They let workout lists render without touching WorkoutExercise or the catalog
+tables. WorkoutSerializer writes the summary together with the exercise rows.
+Catalog activation changes can affect any number of workouts, so signals.py
+queues a 'workouts.refresh_summaries' job for them instead of doing it inline.
+"""
+from . import versioning
+from .models import ExerciseMuscleActivation, Workout, WorkoutExercise
+
+BATCH_SIZE = 500
+
+
+def _muscle_groups_by_exercise(exercise_ids):
+    groups = {}
+    activations = ExerciseMuscleActivation.objects.filter(exercise_id__in=set(exercise_ids))
+    for exercise_id, group_id in activations.values_list('exercise_id', 'muscle_group_id'):
+        groups.setdefault(exercise_id, set()).add(group_id)
+    return groups
+
+
+def summarize(rows, groups_by_exercise=None):
+    """Summary field values for a workout's (exercise_id, target_sets) rows."""
+    rows = list(rows)
+    if groups_by_exercise is None:
+        groups_by_exercise = _muscle_groups_by_exercise(exercise_id for exercise_id, _ in rows)
+    muscle_group_ids = set()
+    for exercise_id, _ in rows:
+        muscle_group_ids |= groups_by_exercise.get(exercise_id, set())
+    return {
+        'exercise_count': len(rows),
+        'total_sets': sum(target_sets for _, target_sets in rows),
+        'muscle_group_ids': sorted(muscle_group_ids),
+    }
+
+
+def refresh(workout_ids):
+    """Recompute the summary columns of the given workouts from the database (batched)."""
+    workout_ids = sorted(set(workout_ids))
+    owner_ids, any_public = set(), False
+    for start in range(0, len(workout_ids), BATCH_SIZE):
+        batch = workout_ids[start:start + BATCH_SIZE]
+        rows = {workout_id: [] for workout_id in batch}
+        for workout_id, exercise_id, target_sets in (
+            WorkoutExercise.objects.filter(workout_id__in=batch)
+            .values_list('workout_id', 'exercise_id', 'target_sets')
+        ):
+            rows[workout_id].append((exercise_id, target_sets))
+        groups = _muscle_groups_by_exercise(
+            exercise_id for workout_rows in rows.values() for exercise_id, _ in workout_rows
+        )
+        workouts = [Workout(id=workout_id, **summarize(workout_rows, groups)) for workout_id, workout_rows in rows.items()]
+        # bulk_update leaves updated_at alone: summaries are derived, so delta sync needn't resend the rows
+        Workout.objects.bulk_update(workouts, ['exercise_count', 'total_sets', 'muscle_group_ids'])
+        for owner_id, is_public in Workout.objects.filter(id__in=batch).values_list('owner_id', 'is_public'):
+            owner_ids.add(owner_id)
+            any_public = any_public or is_public
+    # bulk_update sends no signals, so invalidate cached lists (ETags) by hand
+    for owner_id in owner_ids - {None}:
+        versioning.bump_version(versioning.user_key(owner_id))
+    if any_public:
+        versioning.bump_version(versioning.PUBLIC_WORKOUTS)
+    return len(workout_ids)
+
+
+def workouts_using(exercise_ids):
+    return set(
+        WorkoutExercise.objects.filter(exercise_id__in=set(exercise_ids))
+        .values_list('workout_id', flat=True).distinct()
+    )
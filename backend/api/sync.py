@@ -0,0 +1,219 @@
+"""
+Delta sync: everything a client needs to catch up since its last sync token.
+
+A sync "cycle" covers (since, until]. Rows are streamed kind by kind, first
+changed rows (by updated_at) and then deletions (Tombstone), using keyset
+pagination on (timestamp, id) so every page is a bounded index range scan.
+The opaque token carries the cycle bounds and the position inside it.
+
+The next cycle starts SYNC_OVERLAP seconds before the previous `until`, so
+rows committed by slower concurrent transactions are not missed. Clients may
+therefore see a row twice and must apply changes as idempotent upserts.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    Exercise, ExerciseMuscleActivation, MuscleGroup, Plan, Tombstone, Workout, WorkoutExercise,
+)
+
+TOKEN_SALT = 'api.sync'
+
+PLAN_FIELDS = (
+    'id', 'name', 'description', 'is_active', 'start_date',
+    'day1_workout_id', 'day1_is_rest', 'day2_workout_id', 'day2_is_rest',
+    'day3_workout_id', 'day3_is_rest', 'day4_workout_id', 'day4_is_rest',
+    'day5_workout_id', 'day5_is_rest', 'day6_workout_id', 'day6_is_rest',
+    'day7_workout_id', 'day7_is_rest',
+)
+
+# Which rows of a kind a user syncs: None = everyone's (catalog),
+# otherwise a function (user) -> Q on the kind's model.
+def _own(user):
+    return Q(owner=user)
+
+
+def _own_or_public_workout(user):
+    return Q(owner=user) | Q(is_public=True)
+
+
+def _in_own_or_public_workout(user):
+    return Q(workout__owner=user) | Q(workout__is_public=True)
+
+
+# (kind, model, flat fields sent to the client, row scope)
+# Order matters: referenced rows come before the rows that point at them.
+KINDS = (
+    ('muscle_groups', MuscleGroup, ('id', 'name'), None),
+    ('exercises', Exercise, ('id', 'name', 'description'), None),
+    ('activations', ExerciseMuscleActivation, ('id', 'exercise_id', 'muscle_group_id', 'activation_level'), None),
+    ('workouts', Workout, ('id', 'name', 'description', 'owner_id', 'is_public'), _own_or_public_workout),
+    ('workout_exercises', WorkoutExercise, ('id', 'workout_id', 'exercise_id', 'target_sets', 'target_reps'), _in_own_or_public_workout),
+    ('plans', Plan, PLAN_FIELDS, _own),
+)
+KIND_BY_MODEL = {model: kind for kind, model, _, _ in KINDS}
+
+# Each kind is streamed twice: its updated rows, then its deletions
+STAGES = [(kind, deleted) for kind, _, _, _ in KINDS for deleted in (False, True)]
+
+
+class SyncTokenError(Exception):
+    pass
+
+
+class SyncTokenExpired(SyncTokenError):
+    """The token is older than the tombstone retention; the client must resync from scratch."""
+
+
+def make_token(state):
+    return signing.dumps(state, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        raise SyncTokenError('Invalid sync token.')
+
+
+def _ts(dt):
+    return dt.isoformat() if dt else None
+
+
+def _dt(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _stage_queryset(user, kind, deleted, since, until):
+    _, model, fields, scope = next(k for k in KINDS if k[0] == kind)
+    if deleted:
+        qs = Tombstone.objects.filter(model=kind)
+        if scope is not None:
+            # Tombstones without an owner belong to public rows everyone may hold. Skip the ones
+            # for rows the user can still see: a workout made private stays with its owner.
+            qs = qs.filter(Q(owner=user) | Q(owner__isnull=True))
+            qs = qs.exclude(object_id__in=model.objects.filter(scope(user)).values('id'))
+        ts_field, id_field, values = 'deleted_at', 'id', ('id', 'object_id', 'deleted_at')
+    else:
+        qs = model.objects.all()
+        if scope is not None:
+            qs = qs.filter(scope(user))
+        ts_field, id_field, values = 'updated_at', 'id', (*fields, 'updated_at')
+    if since is not None:
+        qs = qs.filter(**{f'{ts_field}__gt': since})
+    qs = qs.filter(**{f'{ts_field}__lte': until})
+    if deleted and since is None:
+        qs = qs.none() # A first sync has nothing to delete
+    return qs.order_by(ts_field, id_field).values(*values), ts_field
+
+
+def get_changes(user, token=None, limit=None):
+    """
+    Return one page of changes: {'changes': {...}, 'next_token': str, 'has_more': bool}.
+    `limit` bounds the total number of rows (upserts + deletions) in the page.
+    """
+    limit = min(limit or settings.SYNC_PAGE_SIZE, settings.SYNC_MAX_PAGE_SIZE)
+    now = timezone.now()
+    if token:
+        state = read_token(token)
+        if state['user'] != user.id:
+            raise SyncTokenError('Sync token belongs to another user.')
+    else:
+        state = {'user': user.id, 'since': None, 'until': None, 'stage': 0, 'after': None}
+    if state['until'] is None: # First page of a new cycle
+        state['until'] = _ts(now)
+
+    since, until = _dt(state['since']), _dt(state['until'])
+    if since is not None and since < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+        raise SyncTokenExpired('Sync token expired, start a full sync.')
+
+    changes = {kind: {'updated': [], 'deleted': []} for kind, _, _, _ in KINDS}
+    remaining = limit
+    stage, after = state['stage'], state['after']
+    while stage < len(STAGES) and remaining > 0:
+        kind, deleted = STAGES[stage]
+        qs, ts_field = _stage_queryset(user, kind, deleted, since, until)
+        if after is not None:
+            after_ts, after_id = _dt(after[0]), after[1]
+            qs = qs.filter(Q(**{f'{ts_field}__gt': after_ts}) | Q(**{ts_field: after_ts, 'id__gt': after_id}))
+        rows = list(qs[:remaining])
+        for row in rows:
+            if deleted:
+                changes[kind]['deleted'].append(row['object_id'])
+            else:
+                row = dict(row)
+                row['updated_at'] = _ts(row['updated_at'])
+                changes[kind]['updated'].append(row)
+        remaining -= len(rows)
+        if len(rows) and remaining == 0:
+            # Page is full: resume inside this stage next time
+            last = rows[-1]
+            after = [_ts(last[ts_field]), last['id']]
+            break
+        stage, after = stage + 1, None
+
+    has_more = stage < len(STAGES)
+    if has_more:
+        next_state = {**state, 'stage': stage, 'after': after}
+    else:
+        # Cycle finished; the next one starts a little before this one ended
+        overlap = timedelta(seconds=settings.SYNC_OVERLAP)
+        next_state = {
+            'user': user.id, 'since': _ts(until - overlap), 'until': None, 'stage': 0, 'after': None,
+        }
+    return {
+        'changes': {kind: c for kind, c in changes.items() if c['updated'] or c['deleted']},
+        'next_token': make_token(next_state),
+        'has_more': has_more,
+    }
+
+
+def record_deletion(instance):
+    """Called from post_delete: remember the id so clients can drop it."""
+    kind = KIND_BY_MODEL.get(type(instance))
+    if kind is None:
+        return
+    if isinstance(instance, WorkoutExercise):
+        owner_source = instance.workout
+    else:
+        owner_source = instance
+    owner_id = getattr(owner_source, 'owner_id', None)
+    if getattr(owner_source, 'is_public', False):
+        owner_id = None # Every user may have synced it
+    Tombstone.objects.create(model=kind, object_id=instance.pk, owner_id=owner_id)
+
+
+def record_visibility_change(workout, was_public):
+    """
+    Called when a workout is saved. Made private: other users drop it and its rows on their
+    next sync (ownerless tombstones; the owner still sees both). Made public: touch its rows,
+    so they sync to everyone along with the workout.
+    """
+    if was_public and not workout.is_public:
+        row_ids = WorkoutExercise.objects.filter(workout=workout).values_list('id', flat=True)
+        Tombstone.objects.bulk_create([
+            Tombstone(model=KIND_BY_MODEL[Workout], object_id=workout.pk),
+            *(Tombstone(model=KIND_BY_MODEL[WorkoutExercise], object_id=row_id) for row_id in row_ids),
+        ])
+    elif workout.is_public and not was_public:
+        WorkoutExercise.objects.filter(workout=workout).update(updated_at=timezone.now())
+
+
+def prune_tombstones(batch_size=None):
+    """
+    Delete tombstones older than the retention window, in batches so a large
+    backlog doesn't hold one long transaction. Returns how many were removed.
+    """
+    batch_size = batch_size or settings.PRUNE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    total = 0
+    while True:
+        ids = list(Tombstone.objects.filter(deleted_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return total
+        Tombstone.objects.filter(id__in=ids).delete()
+        total += len(ids)
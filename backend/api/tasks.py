@@ -0,0 +1,49 @@
+"""
+Background job tasks (see api/jobs.py). Imported from ApiConfig.ready so the
+web process and the run_jobs worker agree on the registry.
+"""
+from django.conf import settings
+
+from . import catalog, jobs, rankings, summaries, sync, versioning
+from .revocation import prune_expired
+
+
+@jobs.task('catalog.rebuild_snapshot')
+def rebuild_catalog_snapshot():
+    """Build the catalog snapshot once and write it to CATALOG_SNAPSHOT_PATH for the web workers to map."""
+    if not settings.CATALOG_SNAPSHOT_PATH:
+        return None
+    version = versioning.get_version(versioning.CATALOG)
+    snapshot = catalog.build_from_db(version)
+    catalog.write_snapshot_file(settings.CATALOG_SNAPSHOT_PATH, snapshot)
+    return {'version': version, 'exercises': len(snapshot.exercises)}
+
+
+@jobs.task('workouts.refresh_summaries')
+def refresh_workout_summaries(workout_ids=(), exercise_ids=()):
+    """Recompute summary columns of the given workouts and of every workout using the given exercises."""
+    workout_ids = set(workout_ids) | summaries.workouts_using(exercise_ids)
+    return {'workouts': summaries.refresh(workout_ids)}
+
+
+@jobs.task('rankings.refresh')
+def refresh_rankings(user_ids=(), workout_ids=(), exercise_ids=()):
+    """Recompute the planned volume of the given users and of everyone planning the given workouts or exercises."""
+    workout_ids = set(workout_ids) | summaries.workouts_using(exercise_ids)
+    user_ids = set(user_ids) | rankings.users_planning(workout_ids)
+    return {'users': len(user_ids), 'changed': rankings.refresh_users(user_ids)}
+
+
+@jobs.task('sync.prune_tombstones')
+def prune_tombstones():
+    return {'deleted': sync.prune_tombstones()}
+
+
+@jobs.task('tokens.prune_revoked')
+def prune_revoked_tokens():
+    return {'deleted': prune_expired()}
+
+
+@jobs.task('jobs.prune_finished')
+def prune_finished_jobs():
+    return {'deleted': jobs.prune_finished()}
@@ -1,3 +1,1529 @@
-from django.test import TestCase
+import asyncio
+import marshal
+import os
+import tempfile
+import threading
+from io import StringIO
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.contrib.messages import get_messages
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import admin as api_admin, catalog, cloning, db, hashing, jobs, live, metrics, profiling, rankings, revocation, schedule, substitutes, summaries, sync, tasks, throttling, versioning, warmup
+from .conditional import etag_matches
+from .models import Exercise, ExerciseMuscleActivation, Job, LiveSession, MuscleGroup, Plan, PlanVolume, RequestProfile, Tombstone, VolumeBucket, Workout, WorkoutExercise
+
+
+def reset_caches():
+    """Forget what this process cached, since every test starts from a rolled back database."""
+    throttling._store = throttling.MemoryBucketStore()
+    catalog._snapshot = None
+    revocation.revocation_filter._bloom = None
+    substitutes._index = None
+    live._broker = None
+    rankings._distribution = None
+
+
+def make_catalog():
+    """Chest, back and legs, and an exercise or two working each, instead of the seeded catalog."""
+    Exercise.objects.all().delete()
+    MuscleGroup.objects.all().delete()
+    Tombstone.objects.all().delete()
+    chest, back, legs = (MuscleGroup.objects.create(name=name) for name in ('Chest', 'Back', 'Legs'))
+    exercises = {}
+    for name, activations in (
+        ('Bench press', {chest: 'H'}),
+        ('Push-up', {chest: 'H', back: 'L'}),
+        ('Row', {back: 'H'}),
+        ('Squat', {legs: 'H', back: 'M'}),
+    ):
+        exercise = exercises[name] = Exercise.objects.create(name=name, description=f'{name}.')
+        for group, level in activations.items():
+            ExerciseMuscleActivation.objects.create(exercise=exercise, muscle_group=group, activation_level=level)
+    return (chest, back, legs), exercises
+
+
+def bearer(user):
+    return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+
+def make_workout(owner, name, sets, is_public=False):
+    """A workout with {exercise: target sets} rows, and its summary columns filled in like WorkoutSerializer does."""
+    summary = summaries.summarize((exercise.pk, target_sets) for exercise, target_sets in sets.items())
+    workout = Workout.objects.create(name=name, owner=owner, is_public=is_public, **summary)
+    for exercise, target_sets in sets.items():
+        WorkoutExercise.objects.create(workout=workout, exercise=exercise, target_sets=target_sets, target_reps='8-12')
+    return workout
+
+
+class ApiTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice')
+        cls.other = User.objects.create_user('bob')
+
+    def setUp(self):
+        reset_caches()
+        self.client.force_authenticate(self.user)
+
+
+# --- Connection pool (user-026) ---
+
+class DatabasePoolTests(SimpleTestCase):
+    def test_stats_empty_without_pool(self):
+        self.assertIsNone(db.get_pool(), 'the test database is not pooled')
+        self.assertEqual(db.get_pool_stats(), {})
+
+    def test_pool_metrics_skipped_without_pool(self):
+        self.assertEqual(list(metrics.db_pool_metrics()), [])
+
+
+class MetricsViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+
+    def test_closed_without_token(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE fitness_jobs_ready gauge', response.content.decode())
+
+    def test_failing_collector_skips_only_its_series(self):
+        @metrics.register
+        def broken_metrics():
+            yield ('fitness_broken', 'Never finished.', 'gauge', 1, {})
+            raise RuntimeError('database went away')
+        self.addCleanup(metrics._collectors.remove, broken_metrics)
+        with self.assertLogs('api.metrics', 'ERROR'):
+            text = metrics.render()
+        self.assertNotIn('fitness_broken', text)
+        self.assertIn('fitness_metrics_collector_up{collector="broken_metrics"} 0', text)
+        self.assertIn('fitness_metrics_collector_up{collector="job_queue_metrics"} 1', text)
+        self.assertIn('fitness_jobs_ready 0', text)
+
+
+# --- Catalog snapshot (user-027) ---
+
+class CatalogSnapshotTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.groups, cls.exercises = make_catalog()
+
+    def test_snapshot_matches_database(self):
+        snapshot = catalog.get_snapshot()
+        self.assertEqual([g.name for g in snapshot.muscle_group_list()], ['Chest', 'Back', 'Legs'])
+        squat = snapshot.exercises[self.exercises['Squat'].pk]
+        self.assertEqual(squat.description, 'Squat.')
+        self.assertEqual(
+            {(a.muscle_group.name, a.activation_level) for a in squat.muscle_activations},
+            {('Legs', 'H'), ('Back', 'M')},
+        )
+
+    def test_snapshot_file_round_trip(self):
+        Exercise.objects.filter(name='Row').update(description=None)
+        snapshot = catalog.build_from_db(7)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.bin')
+            catalog.write_snapshot_file(path, snapshot)
+            self.assertIsNone(catalog.read_snapshot_file(path, 8), 'a file for another version is ignored')
+            loaded = catalog.read_snapshot_file(path, 7)
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - 3)
+            self.assertIsNone(catalog.read_snapshot_file(path, 7))
+        self.assertEqual(list(loaded.exercise_ids), list(snapshot.exercise_ids))
+        self.assertEqual(loaded.exercise_descriptions, snapshot.exercise_descriptions)
+        self.assertIsNone(loaded.exercises[self.exercises['Row'].pk].description)
+        self.assertEqual(bytes(loaded.act_levels), bytes(snapshot.act_levels))
+
+    def test_write_bumps_version_and_reloads(self):
+        before = catalog.get_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            MuscleGroup.objects.create(name='Core')
+        self.assertEqual(versioning.get_version(versioning.CATALOG), before.version + 1)
+        self.assertIn('Core', [g.name for g in catalog.get_snapshot().muscle_group_list()])
+
+    def test_list_and_retrieve_from_snapshot(self):
+        catalog.get_snapshot()
+        with self.assertNumQueries(0): # Records and ETag both come from the snapshot
+            response = self.client.get('/api/exercises/')
+        self.assertEqual([e['name'] for e in response.data], ['Bench press', 'Push-up', 'Row', 'Squat'])
+        response = self.client.get(f'/api/exercises/{self.exercises["Push-up"].pk}/')
+        self.assertEqual(len(response.data['muscle_activations']), 2)
+        self.assertEqual(self.client.get('/api/exercises/999999/').status_code, 404)
+
+
+# --- Conditional GET (user-028) ---
+
+class ConditionalGetTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.exercises = make_catalog()
+        cls.workout = make_workout(cls.user, 'Push', {cls.exercises['Bench press']: 3})
+        cls.plan = Plan.objects.create(name='Week', owner=cls.user, day1_workout=cls.workout)
+
+    def test_unchanged_refetch_is_not_modified(self):
+        first = self.client.get('/api/exercises/')
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        second = self.client.get('/api/exercises/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertFalse(second.content)
+        weak = self.client.get('/api/exercises/', HTTP_IF_NONE_MATCH=f'"other", W/{first["ETag"]}')
+        self.assertEqual(weak.status_code, 304)
+
+    def test_catalog_write_changes_tag(self):
+        etag = self.client.get('/api/muscle-groups/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            MuscleGroup.objects.create(name='Core')
+        response = self.client.get('/api/muscle-groups/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_plan_tags_are_per_user(self):
+        etag = self.client.get('/api/plans/')['ETag']
+        self.client.force_authenticate(self.other)
+        response = self.client.get('/api/plans/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_workout_edit_changes_plan_tag(self):
+        etag = self.client.get(f'/api/plans/{self.plan.pk}/')['ETag']
+        self.assertEqual(self.client.get(f'/api/plans/{self.plan.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        WorkoutExercise.objects.filter(workout=self.workout).update(target_sets=5) # No signals: tag unchanged
+        self.assertEqual(self.client.get(f'/api/plans/{self.plan.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.workout.save()
+        response = self.client.get(f'/api/plans/{self.plan.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['day1_workout_details']['workout_exercises'][0]['target_sets'], 5)
+
+    def test_missing_object_has_no_tag(self):
+        response = self.client.get('/api/plans/999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_etag_matches(self):
+        request = RequestFactory().get('/')
+        self.assertFalse(etag_matches(request, '"a"'))
+        request.META['HTTP_IF_NONE_MATCH'] = '*'
+        self.assertTrue(etag_matches(request, '"a"'))
+
+
+# --- Delta sync (user-029) ---
+
+@override_settings(SYNC_OVERLAP=0) # Everything here was written a moment ago; don't re-read it
+class SyncTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.exercises = make_catalog()
+        cls.own = make_workout(cls.user, 'Own', {cls.exercises['Row']: 3})
+        cls.public = make_workout(cls.other, 'Template', {cls.exercises['Squat']: 5}, is_public=True)
+        cls.private = make_workout(cls.other, 'Private', {cls.exercises['Squat']: 4})
+        cls.plan = Plan.objects.create(name='Week', owner=cls.user, day1_workout=cls.own)
+
+    def sync_all(self, token=None, limit=None):
+        """Follow next_token to the end of a cycle; returns ({kind: updated ids}, {kind: deleted ids}, token, pages)."""
+        updated, deleted, pages = {}, {}, 0
+        while True:
+            params = {'token': token} if token else {}
+            if limit:
+                params['limit'] = limit
+            response = self.client.get('/api/sync/', params)
+            self.assertEqual(response.status_code, 200)
+            pages += 1
+            for kind, change in response.data['changes'].items():
+                if change['updated']:
+                    updated.setdefault(kind, []).extend(row['id'] for row in change['updated'])
+                if change['deleted']:
+                    deleted.setdefault(kind, []).extend(change['deleted'])
+            token = response.data['next_token']
+            if not response.data['has_more']:
+                return updated, deleted, token, pages
+
+    def test_full_sync_in_pages(self):
+        updated, deleted, _, pages = self.sync_all(limit=2)
+        self.assertEqual(deleted, {})
+        self.assertEqual(sorted(updated['workouts']), sorted([self.own.pk, self.public.pk]))
+        self.assertEqual(len(updated['workout_exercises']), 2)
+        self.assertEqual(updated['plans'], [self.plan.pk])
+        self.assertEqual(len(updated['exercises']), 4)
+        rows = sum(len(ids) for ids in updated.values())
+        self.assertEqual(pages, rows // 2 + 1, 'full pages, then one to finish the last stages')
+
+    def test_next_cycle_has_only_changes(self):
+        _, _, token, _ = self.sync_all()
+        self.plan.name = 'Renamed'
+        self.plan.save()
+        workout_id = self.own.pk
+        self.own.delete()
+        updated, deleted, _, _ = self.sync_all(token)
+        self.assertEqual(updated, {'plans': [self.plan.pk]})
+        self.assertEqual(deleted['workouts'], [workout_id])
+        self.assertEqual(len(deleted['workout_exercises']), 1)
+
+    def test_other_users_deletions_stay_private(self):
+        _, _, token, _ = self.sync_all()
+        self.private.delete()
+        _, deleted, _, _ = self.sync_all(token)
+        self.assertEqual(deleted, {})
+
+    def test_workout_made_private_leaves_other_users(self):
+        row = WorkoutExercise.objects.get(workout=self.public)
+        _, _, token, _ = self.sync_all()
+        self.client.force_authenticate(self.other)
+        _, _, owner_token, _ = self.sync_all()
+        self.assertEqual(self.client.patch(f'/api/workouts/{self.public.pk}/', {'is_public': False}, format='json').status_code, 200)
+
+        updated, deleted, owner_token, _ = self.sync_all(owner_token)
+        self.assertEqual((updated, deleted), ({'workouts': [self.public.pk]}, {}))
+        self.client.force_authenticate(self.user)
+        updated, deleted, token, _ = self.sync_all(token)
+        self.assertEqual((updated, deleted), ({}, {'workouts': [self.public.pk], 'workout_exercises': [row.pk]}))
+
+        # Public again: the rows come back with the workout
+        self.public.is_public = True
+        self.public._was_public = False
+        self.public.save()
+        updated, deleted, _, _ = self.sync_all(token)
+        self.assertEqual((updated, deleted), ({'workouts': [self.public.pk], 'workout_exercises': [row.pk]}, {}))
+
+    def test_bad_tokens(self):
+        self.assertEqual(self.client.get('/api/sync/', {'token': 'garbage'}).status_code, 400)
+        token = sync.make_token({'user': self.other.pk, 'since': None, 'until': None, 'stage': 0, 'after': None})
+        self.assertEqual(self.client.get('/api/sync/', {'token': token}).status_code, 400)
+        since = timezone.now() - timedelta(days=31)
+        token = sync.make_token({'user': self.user.pk, 'since': since.isoformat(), 'until': None, 'stage': 0, 'after': None})
+        self.assertEqual(self.client.get('/api/sync/', {'token': token}).status_code, 410)
+
+    def test_limit_must_be_positive(self):
+        for limit in ('0', '-3', 'many'):
+            self.assertEqual(self.client.get('/api/sync/', {'limit': limit}).status_code, 400, limit)
+        self.assertEqual(self.client.get('/api/sync/', {'limit': ''}).status_code, 200)
+
+    def test_prune_tombstones_in_batches(self):
+        for object_id in range(5):
+            Tombstone.objects.create(model='plans', object_id=object_id, owner=self.user)
+        Tombstone.objects.filter(object_id__lt=3).update(deleted_at=timezone.now() - timedelta(days=40))
+        self.assertEqual(sync.prune_tombstones(batch_size=2), 3)
+        self.assertEqual(sorted(Tombstone.objects.values_list('object_id', flat=True)), [3, 4])
+
+
+# --- Batch (user-030) ---
+
+class BatchTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.exercises = make_catalog()
+
+    def workout_body(self, name):
+        return {'name': name, 'workout_exercises': [
+            {'exercise_id': self.exercises['Row'].pk, 'target_sets': 3, 'target_reps': '10'},
+        ]}
+
+    def test_references_to_earlier_results(self):
+        response = self.client.post('/api/batch/', {'operations': [
+            {'method': 'POST', 'path': 'workouts/', 'body': self.workout_body('Pull')},
+            {'method': 'POST', 'path': '/api/plans/', 'body': {'name': 'Week', 'day2_workout': {'$ref': '0.id'}}},
+            {'method': 'PATCH', 'path': 'plans/{1.id}/', 'body': {'is_active': True}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 201, 200])
+        plan = Plan.objects.get(owner=self.user)
+        self.assertTrue(plan.is_active)
+        self.assertEqual(plan.day2_workout.name, 'Pull')
+
+    def test_failure_rolls_everything_back(self):
+        response = self.client.post('/api/batch/', {'operations': [
+            {'method': 'POST', 'path': 'workouts/', 'body': self.workout_body('Pull')},
+            {'method': 'POST', 'path': 'plans/', 'body': {'day2_workout': {'$ref': '0.id'}}}, # No name
+            {'method': 'DELETE', 'path': 'workouts/{0.id}/'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, None])
+        self.assertIn('name', results[1]['body'])
+        self.assertFalse(Workout.objects.filter(owner=self.user).exists())
+
+    def test_malformed_operations(self):
+        for operations, message in (
+            ([{'method': 'GET', 'path': 'sync/'}], 'cannot be used in a batch'),
+            ([{'method': 'GET', 'path': 'nowhere/'}], 'No endpoint'),
+            ([{'method': 'TRACE', 'path': 'plans/'}], 'Unsupported method'),
+            ([{'method': 'GET', 'path': 'plans/{0.id}/'}], 'only reference earlier operations'),
+            ([{'method': 'GET', 'path': 'plans/'}, {'method': 'GET', 'path': 'plans/{0.id}/'}], 'has no "id"'),
+        ):
+            response = self.client.post('/api/batch/', {'operations': operations}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(message, response.data['results'][-1]['body']['detail'])
+
+    @override_settings(BATCH_MAX_OPERATIONS=2)
+    def test_operation_count(self):
+        self.assertEqual(self.client.post('/api/batch/', {'operations': []}, format='json').status_code, 400)
+        operations = [{'method': 'GET', 'path': 'plans/'}] * 3
+        self.assertEqual(self.client.post('/api/batch/', {'operations': operations}, format='json').status_code, 400)
+
+
+# --- Password hashing (user-031) ---
+
+class PasswordHashingTests(ApiTestCase):
+    password = 'correct horse battery'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+
+    def login(self, username):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': self.password}, format='json')
+
+    def test_register_and_login_with_argon2(self):
+        response = self.client.post('/api/auth/register/', {
+            'username': 'carol', 'email': 'carol@example.com', 'password': self.password, 'password2': self.password,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.get(username='carol').password.startswith('argon2$'))
+        self.assertEqual(self.login('carol').status_code, 200)
+
+    def test_old_pbkdf2_hash_upgraded_on_login(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password(self.password, hasher='pbkdf2_sha256'))
+        self.assertEqual(self.login('alice').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+
+    def hold_only_slot(self):
+        """Leave the pool one slot, taken by another login; release it with hashing._slots.release()."""
+        self.user.set_password(self.password)
+        self.user.save()
+        hashing._get_executor()
+        slots, hashing._slots = hashing._slots, threading.BoundedSemaphore(1)
+        self.addCleanup(setattr, hashing, '_slots', slots)
+        hashing._slots.acquire()
+
+    def test_busy_pool_answers_429(self):
+        self.hold_only_slot()
+        rejected = hashing.get_stats()['rejected']
+        response = self.login('alice')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.data['detail'].code, 'hashing_busy')
+        self.assertEqual(hashing.get_stats()['rejected'], rejected + 1)
+        hashing._slots.release()
+        self.assertEqual(self.login('alice').status_code, 200)
+
+    def test_other_callers_wait_for_a_slot(self):
+        self.hold_only_slot()
+        # e.g. the admin login or a management command, which couldn't answer 429
+        results = []
+        waiting = threading.Thread(target=lambda: results.append(self.user.check_password(self.password)))
+        waiting.start()
+        waiting.join(0.2)
+        self.assertTrue(waiting.is_alive())
+        hashing._slots.release()
+        waiting.join(10)
+        self.assertEqual(results, [True])
+
+    @override_settings(PASSWORD_HASHING_POOL=False)
+    def test_pool_can_be_turned_off(self):
+        self.assertEqual(hashing.run(lambda: threading.current_thread()), threading.current_thread())
+
+
+# --- Token-bucket throttling (user-032) ---
+
+SLOW_BUCKETS = {'user': {'rate': 0.01, 'burst': 6}, 'anon': {'rate': 0.01, 'burst': 2}}
+
+
+class BucketStoreTests(SimpleTestCase):
+    def check_store(self, store):
+        # burst 3, one token per second
+        self.assertEqual(store.consume('k', 2, 1.0, 3.0, now=100.0), (True, 0.0))
+        allowed, wait = store.consume('k', 2, 1.0, 3.0, now=100.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 1.0)
+        self.assertTrue(store.consume('k', 2, 1.0, 3.0, now=101.0)[0])
+        self.assertTrue(store.consume('other', 3, 1.0, 3.0, now=101.0)[0], 'buckets are per key')
+        self.assertEqual(store.consume('k', 3, 1.0, 3.0, now=1000.0), (True, 0.0), 'refills up to burst')
+
+    def test_memory_store(self):
+        self.check_store(throttling.MemoryBucketStore())
+
+    def test_shared_store_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'buckets')
+            self.check_store(throttling.SharedBucketStore(path, 64))
+            # Another process mapping the same file sees the same buckets
+            self.assertFalse(throttling.SharedBucketStore(path, 64).consume('other', 1, 1.0, 3.0, now=101.0)[0])
+
+    def test_shared_store_recycles_oldest_slot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = throttling.SharedBucketStore(os.path.join(directory, 'buckets'), 8) # One probe range
+            for i in range(8):
+                store.consume(f'k{i}', 1, 1.0, 1.0, now=100.0 + i)
+            self.assertFalse(store.consume('k7', 1, 1.0, 1.0, now=107.0)[0])
+            store.consume('new', 1, 1.0, 1.0, now=108.0) # Takes k0's slot
+            self.assertTrue(store.consume('k0', 1, 1.0, 1.0, now=108.0)[0], 'k0 starts over with a full bucket')
+            self.assertFalse(store.consume('k7', 1, 1.0, 1.0, now=107.5)[0])
+
+    @override_settings(THROTTLE_STORE='shared', THROTTLE_STORE_PATH=None)
+    def test_falls_back_to_memory(self):
+        throttling._store = None
+        try:
+            with self.assertLogs('api.throttling', 'WARNING'):
+                self.assertIsInstance(throttling.get_store(), throttling.MemoryBucketStore)
+        finally:
+            throttling._store = None
+
+
+@override_settings(THROTTLE_BUCKETS=SLOW_BUCKETS)
+class ThrottleTests(ApiTestCase):
+    def test_user_bucket(self):
+        for _ in range(6):
+            self.assertEqual(self.client.get('/api/muscle-groups/').status_code, 200)
+        response = self.client.get('/api/muscle-groups/')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 50)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get('/api/muscle-groups/').status_code, 200)
+
+    def test_weighted_actions(self):
+        self.assertEqual(self.client.get('/api/plans/').status_code, 200) # Costs 5
+        self.assertEqual(self.client.get('/api/workouts/').status_code, 429) # Costs 3
+        self.assertEqual(self.client.get('/api/muscle-groups/').status_code, 200)
+        self.assertEqual(self.client.get('/api/muscle-groups/').status_code, 429)
+
+    def test_anonymous_clients_by_address(self):
+        self.client.force_authenticate(None)
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/muscle-groups/').status_code, 200)
+        self.assertEqual(self.client.get('/api/muscle-groups/').status_code, 429)
+        self.assertEqual(self.client.get('/api/muscle-groups/', REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+
+# --- Refresh token revocation (user-033) ---
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = revocation.BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+        self.assertTrue(all(f'revoked-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'valid-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300) # 1% expected
+
+
+class RevocationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/login/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_rotated_token_cannot_be_reused(self):
+        token = RefreshToken.for_user(self.user)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], str(token))
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+
+    @override_settings(REVOCATION_SYNC_INTERVAL=3600)
+    def test_token_revoked_by_another_worker(self):
+        self.assertEqual(self.refresh(RefreshToken.for_user(self.user)).status_code, 200) # Builds the filter
+        token = RefreshToken.for_user(self.user)
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        # The filter hasn't seen the row yet, but rotating finds it already blacklisted
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_filter_picks_up_new_rows(self):
+        worker = revocation.RevocationFilter()
+        token = RefreshToken.for_user(self.user)
+        with override_settings(REVOCATION_SYNC_INTERVAL=3600):
+            self.assertFalse(worker.might_be_revoked(token['jti']))
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+            self.assertFalse(worker.might_be_revoked(token['jti']), 'not synced yet')
+        with override_settings(REVOCATION_SYNC_INTERVAL=0):
+            self.assertTrue(worker.might_be_revoked(token['jti']))
+        self.assertEqual(worker.info()['entries'], 1)
+
+    @override_settings(REVOCATION_SYNC_INTERVAL=0)
+    def test_sync_reads_rows_that_committed_late(self):
+        worker = revocation.RevocationFilter()
+        early, late = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        worker.might_be_revoked('anything') # Builds the filter
+        BlacklistedToken.objects.create(id=1000, token=OutstandingToken.objects.get(jti=late['jti']))
+        self.assertTrue(worker.might_be_revoked(late['jti']))
+        # A lower id, from a transaction that started earlier but committed only now
+        row = BlacklistedToken.objects.create(id=5, token=OutstandingToken.objects.get(jti=early['jti']))
+        BlacklistedToken.objects.filter(pk=row.pk).update(blacklisted_at=timezone.now() - timedelta(seconds=5))
+        worker.might_be_revoked('anything')
+        self.assertTrue(worker.might_be_revoked(early['jti']))
+        self.assertEqual(worker.info()['entries'], 2) # Rows read again aren't added twice
+
+    def test_rebuild_keeps_revocations_made_meanwhile(self):
+        worker = revocation.RevocationFilter()
+        token = RefreshToken.for_user(self.user)
+        build = worker._rebuild
+        def rebuild_while_revoking(now):
+            worker.add(token['jti']) # Another thread revokes it while the query runs
+            build(now)
+        worker._rebuild = rebuild_while_revoking
+        self.assertTrue(worker.might_be_revoked(token['jti']))
+        self.assertEqual(worker.info()['rebuilds'], 1)
+
+    def test_prune_expired_in_batches(self):
+        for _ in range(5):
+            RefreshToken.for_user(self.user)
+        expired = OutstandingToken.objects.order_by('id')[:3]
+        BlacklistedToken.objects.create(token=expired[0])
+        OutstandingToken.objects.filter(id__in=[t.id for t in expired]).update(expires_at=timezone.now())
+        self.assertEqual(revocation.prune_expired(batch_size=2), 3)
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+# --- Workout ownership (user-034) ---
+
+class WorkoutOwnershipTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.exercises = make_catalog()
+        cls.own = make_workout(cls.user, 'Own', {cls.exercises['Row']: 3})
+        cls.public = make_workout(cls.other, 'Template', {cls.exercises['Squat']: 5}, is_public=True)
+        cls.private = make_workout(cls.other, 'Private', {cls.exercises['Squat']: 4})
+
+    def workout_body(self, **fields):
+        return {'name': 'Edited', 'workout_exercises': [
+            {'exercise_id': self.exercises['Row'].pk, 'target_sets': 4, 'target_reps': '8'},
+            {'exercise_id': self.exercises['Push-up'].pk, 'target_sets': 2, 'target_reps': '15'},
+        ], **fields}
+
+    def test_lists_are_scoped(self):
+        self.assertEqual([w['id'] for w in self.client.get('/api/workouts/').data], [self.own.pk])
+        self.assertEqual([w['id'] for w in self.client.get('/api/workouts/', {'scope': 'public'}).data], [self.public.pk])
+
+    def test_others_workouts(self):
+        self.assertEqual(self.client.get(f'/api/workouts/{self.public.pk}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/workouts/{self.private.pk}/').status_code, 404)
+        response = self.client.put(f'/api/workouts/{self.public.pk}/', self.workout_body(), format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/workouts/{self.public.pk}/').status_code, 404)
+
+    def test_created_workout_belongs_to_caller(self):
+        response = self.client.post('/api/workouts/', self.workout_body(owner=self.other.pk), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Workout.objects.get(pk=response.data['id']).owner, self.user)
+
+    def test_plans_only_use_visible_workouts(self):
+        response = self.client.post('/api/plans/', {'name': 'Week', 'day1_workout': self.private.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/plans/', {'name': 'Week', 'day1_workout': self.public.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_nested_save_bumps_each_version_once(self):
+        self.own.is_public = True
+        self.own.save()
+        versions = versioning.get_versions(versioning.user_key(self.user.pk), versioning.PUBLIC_WORKOUTS)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f'/api/workouts/{self.own.pk}/', self.workout_body(is_public=False), format='json')
+        self.assertEqual(response.status_code, 200)
+        bumps = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "api_dataversion"')]
+        self.assertEqual(len(bumps), 2)
+        # Made private: public lists must change too
+        self.assertEqual(
+            versioning.get_versions(versioning.user_key(self.user.pk), versioning.PUBLIC_WORKOUTS),
+            (versions[0] + 1, versions[1] + 1),
+        )
+        # A private workout staying private leaves the public lists alone
+        self.client.put(f'/api/workouts/{self.own.pk}/', self.workout_body(), format='json')
+        self.assertEqual(versioning.get_version(versioning.PUBLIC_WORKOUTS), versions[1] + 1)
+
+
+# --- Cloning (user-035) ---
+
+class CloningTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.exercises = make_catalog()
+        cls.push = make_workout(cls.user, 'Push', {cls.exercises['Bench press']: 3, cls.exercises['Push-up']: 2})
+        cls.legs = make_workout(cls.user, 'Legs', {cls.exercises['Squat']: 5})
+        cls.public = make_workout(cls.other, 'Template', {cls.exercises['Row']: 4}, is_public=True)
+        cls.private = make_workout(cls.other, 'Private', {cls.exercises['Row']: 4})
+
+    def rows(self, workout_id):
+        return sorted(WorkoutExercise.objects.filter(workout_id=workout_id).values_list('exercise_id', 'target_sets', 'target_reps'))
+
+    def test_clone_workout(self):
+        response = self.client.post(f'/api/workouts/{self.push.pk}/clone/', {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['name'], 'Push (copy)')
+        self.assertEqual(self.rows(response.data['id']), self.rows(self.push.pk))
+        copy = Workout.objects.get(pk=response.data['id'])
+        self.assertEqual((copy.exercise_count, copy.total_sets), (2, 5))
+
+    def test_clone_public_template_as_private_copy(self):
+        response = self.client.post(f'/api/workouts/{self.public.pk}/clone/', {'name': 'Mine'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        copy = Workout.objects.get(pk=response.data['id'])
+        self.assertEqual((copy.name, copy.owner, copy.is_public), ('Mine', self.user, False))
+        self.assertEqual(self.client.post(f'/api/workouts/{self.private.pk}/clone/').status_code, 404)
+
+    def test_clone_plan_shares_repeated_workouts(self):
+        plan = Plan.objects.create(
+            name='Week', owner=self.user, is_active=True,
+            day1_workout=self.push, day3_workout=self.legs, day5_workout=self.push, day7_is_rest=True,
+        )
+        response = self.client.post(f'/api/plans/{plan.pk}/clone/', {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        copy = Plan.objects.get(pk=response.data['id'])
+        self.assertFalse(copy.is_active)
+        self.assertTrue(copy.day7_is_rest)
+        self.assertEqual(copy.day1_workout_id, copy.day5_workout_id)
+        self.assertNotIn(copy.day1_workout_id, (self.push.pk, self.legs.pk))
+        self.assertEqual(self.rows(copy.day3_workout_id), self.rows(self.legs.pk))
+        self.assertEqual(Workout.objects.filter(owner=self.user).count(), 4)
+
+    def test_bad_names(self):
+        plan = Plan.objects.create(name='Week', owner=self.user, day1_workout=self.push)
+        for url in (f'/api/workouts/{self.push.pk}/clone/', f'/api/plans/{plan.pk}/clone/'):
+            for name in ('', 'x' * 201, ['Mine'], {'first': 'Mine'}):
+                self.assertEqual(self.client.post(url, {'name': name}, format='json').status_code, 400, (url, name))
+        self.assertEqual(Workout.objects.filter(owner=self.user).count(), 2)
+
+    def test_long_names_are_shortened(self):
+        self.push.name = 'x' * 200
+        self.push.save()
+        response = self.client.post(f'/api/workouts/{self.push.pk}/clone/', {}, format='json')
+        self.assertEqual(response.data['name'], 'x' * 193 + ' (copy)')
+
+    def test_query_count_does_not_grow(self):
+        small = Plan.objects.create(name='Small', owner=self.user, day1_workout=self.legs)
+        big = Plan.objects.create(name='Big', owner=self.user, day1_workout=self.push, day2_workout=self.legs, day3_workout=self.public)
+        with CaptureQueriesContext(connection) as small_queries:
+            cloning.clone_plan(small, self.user)
+        with CaptureQueriesContext(connection) as big_queries:
+            cloning.clone_plan(big, self.user)
+        self.assertEqual(len(big_queries), len(small_queries))
+
+
+# --- Calendar and iCal feed (user-036) ---
+
+class ScheduleTests(SimpleTestCase):
+    def test_cycle_day(self):
+        plan = Plan(start_date=date(2026, 10, 1))
+        self.assertEqual(schedule.cycle_day(plan, date(2026, 10, 1)), 1)
+        self.assertEqual(schedule.cycle_day(plan, date(2026, 10, 9)), 2)
+        self.assertEqual(schedule.cycle_day(plan, date(2026, 9, 30)), 7)
+        plan.start_date = None
+        self.assertEqual(schedule.cycle_day(plan, date(2026, 10, 19)), 1) # A Monday
+
+    def test_fold_keeps_characters_whole(self):
+        folded = schedule._fold('SUMMARY:' + 'é' * 60)
+        lines = folded.removesuffix('\r\n').split('\r\n')
+        self.assertTrue(all(len(line.encode()) <= 75 for line in lines))
+        self.assertEqual(''.join(line.removeprefix(' ') for line in lines), 'SUMMARY:' + 'é' * 60)
+
+    def test_escape(self):
+        self.assertEqual(schedule._escape('a,b;c\\d\ne'), 'a\\,b\\;c\\\\d\\ne')
+
+
+class CalendarTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, cls.exercises = make_catalog()
+        cls.workout = make_workout(cls.user, 'Push, heavy', {cls.exercises['Bench press']: 3})
+        cls.workout.description = 'Warm up first; then press.'
+        cls.workout.save()
+        cls.plan = Plan.objects.create(
+            name='Week', owner=cls.user, is_active=True, start_date=date(2026, 10, 1),
+            day1_workout=cls.workout, day2_is_rest=True,
+        )
+
+    def feed_path(self):
+        response = self.client.get('/api/calendar/', {'start': '2026-10-01', 'end': '2026-10-02'})
+        return response.data['ics_url'].removeprefix('http://testserver')
+
+    def test_days_in_range(self):
+        response = self.client.get('/api/calendar/', {'start': '2026-10-01', 'end': '2026-10-14'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(str(d['date']), d['day'], d['workout'], d['is_rest']) for d in response.data['days']],
+            [('2026-10-01', 1, self.workout.pk, False), ('2026-10-02', 2, None, True),
+             ('2026-10-08', 1, self.workout.pk, False), ('2026-10-09', 2, None, True)],
+        )
+        self.assertEqual(self.client.get('/api/calendar/', HTTP_IF_NONE_MATCH='*').status_code, 304)
+
+    def test_bad_ranges(self):
+        for params in ({'start': 'soon'}, {'start': '2026-10-02', 'end': '2026-10-01'},
+                       {'start': '2026-01-01', 'end': '2027-12-31'}):
+            self.assertEqual(self.client.get('/api/calendar/', params).status_code, 400, params)
+
+    def test_feed(self):
+        path = self.feed_path()
+        self.client.force_authenticate(None)
+        response = self.client.get(path + '&start=2026-10-01&end=2026-10-31')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 10)
+        self.assertIn('SUMMARY:Push\\, heavy (day 1)', body)
+        self.assertIn('DESCRIPTION:Warm up first\\; then press.', body)
+        again = self.client.get(path + '&start=2026-10-01&end=2026-10-31', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_feed_without_active_plan(self):
+        path = self.feed_path()
+        Plan.objects.filter(pk=self.plan.pk).update(is_active=False)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(path).status_code, 404)
+
+    def test_feed_token_checks(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/calendar/feed.ics').status_code, 403)
+        self.assertEqual(self.client.get('/api/calendar/feed.ics', {'token': 'forged'}).status_code, 403)
+        # Signed, but without the feed generation
+        token = signing.dumps({'u': self.user.pk}, salt=schedule.FEED_TOKEN_SALT, compress=True)
+        self.assertEqual(self.client.get('/api/calendar/feed.ics', {'token': token}).status_code, 403)
+        self.user.is_active = False
+        self.user.save()
+        token = schedule.make_feed_token(self.user)
+        self.assertEqual(self.client.get('/api/calendar/feed.ics', {'token': token}).status_code, 403)
+
+    def test_rotate_revokes_old_urls(self):
+        old_path = self.feed_path()
+        response = self.client.post('/api/calendar/feed/rotate/')
+        self.assertEqual(response.status_code, 200)
+        new_path = response.data['ics_url'].removeprefix('http://testserver')
+        self.assertEqual(self.feed_path(), new_path)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(old_path).status_code, 403)
+        self.assertEqual(self.client.get(new_path).status_code, 200)
+
+    def test_feed_throttled_per_owner(self):
+        path = self.feed_path()
+        self.client.force_authenticate(None)
+        with override_settings(THROTTLE_BUCKETS={'user': {'rate': 0.01, 'burst': 1}, 'anon': {'rate': 0.01, 'burst': 100}}):
+            self.assertEqual(self.client.get(path).status_code, 200)
+            self.assertEqual(self.client.get(path).status_code, 429)
+
+
+# --- Background jobs (user-037) ---
+
+@jobs.task('tests.echo', max_attempts=2)
+def echo_task(value=None, fail=False):
+    if fail:
+        raise ValueError('boom')
+    return {'value': value}
+
+
+class JobQueueTests(ApiTestCase):
+    def test_enqueue_unique(self):
+        job = jobs.enqueue('tests.echo', {'value': 1}, unique=True)
+        self.assertEqual(jobs.enqueue('tests.echo', {'value': 1}, unique=True), job)
+        self.assertNotEqual(jobs.enqueue('tests.echo', {'value': 2}, unique=True), job)
+        self.assertNotEqual(jobs.enqueue('tests.echo', {'value': 1}), job)
+        self.assertEqual(job.max_attempts, 2)
+        with self.assertRaises(jobs.UnknownTask):
+            jobs.enqueue('tests.missing')
+
+    def test_claim_by_priority_once(self):
+        low = jobs.enqueue('tests.echo')
+        high = jobs.enqueue('tests.echo', priority=5)
+        later = jobs.enqueue('tests.echo', priority=9, delay=60)
+        claimed = jobs.claim('w1', 5)
+        self.assertEqual([job.pk for job in claimed], [high.pk, low.pk])
+        self.assertEqual({(job.status, job.attempts, job.locked_by) for job in claimed}, {('running', 1, 'w1')})
+        self.assertEqual(jobs.claim('w2', 5), [])
+        # A lease that ran out means its worker died: the job is handed out again
+        Job.objects.filter(pk=low.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([job.pk for job in jobs.claim('w2', 5)], [low.pk])
+        Job.objects.filter(pk=later.pk).update(run_at=timezone.now())
+        self.assertEqual([job.pk for job in jobs.claim('w2', 5)], [later.pk])
+
+    def test_retry_delay(self):
+        with override_settings(JOBS_RETRY_BACKOFF=10, JOBS_RETRY_BACKOFF_MAX=60):
+            self.assertTrue(5 <= jobs.retry_delay(1) <= 10)
+            self.assertTrue(20 <= jobs.retry_delay(3) <= 40)
+            self.assertTrue(30 <= jobs.retry_delay(10) <= 60)
+
+    @override_settings(JOBS_SCHEDULE={'tests.echo': 60})
+    def test_queue_scheduled(self):
+        queued_at = {}
+        jobs.queue_scheduled(queued_at, 1000.0)
+        jobs.queue_scheduled(queued_at, 1030.0)
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(Job.objects.get().priority, -10)
+        jobs.queue_scheduled({}, 1030.0) # Another worker: the queued copy is enough
+        self.assertEqual(Job.objects.count(), 1)
+        Job.objects.update(status=Job.Status.SUCCEEDED)
+        jobs.queue_scheduled(queued_at, 1060.0)
+        self.assertEqual(Job.objects.filter(status=Job.Status.QUEUED).count(), 1)
+
+    def test_prune_finished_in_batches(self):
+        old = timezone.now() - timedelta(days=8)
+        for status in ('succeeded', 'failed', 'succeeded', 'queued'):
+            jobs.enqueue('tests.echo')
+            Job.objects.filter(pk=Job.objects.latest('id').pk).update(
+                status=status, finished_at=old if status != 'queued' else None,
+            )
+        Job.objects.create(task='tests.echo', status='succeeded', finished_at=timezone.now())
+        self.assertEqual(jobs.prune_finished(batch_size=2), 3)
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_job_status_endpoint(self):
+        own = jobs.enqueue('tests.echo', owner=self.user)
+        jobs.enqueue('tests.echo', owner=self.other)
+        Job.objects.create(task='tests.echo', owner=self.user, status='failed')
+        self.assertEqual([job['id'] for job in self.client.get('/api/jobs/', {'status': 'queued'}).data], [own.pk])
+        self.assertEqual(len(self.client.get('/api/jobs/').data), 2)
+        self.user.is_staff = True
+        self.assertEqual(len(self.client.get('/api/jobs/').data), 3)
+
+
+class JobWorkerTests(TransactionTestCase):
+    """Jobs run with their own connection handling, so these need real commits."""
+
+    def run_claimed(self, job):
+        claimed, = jobs.claim('w1', 1)
+        self.assertEqual(claimed.pk, job.pk)
+        jobs.run_job(claimed, 'w1')
+        job.refresh_from_db()
+        return job
+
+    def test_success(self):
+        job = self.run_claimed(jobs.enqueue('tests.echo', {'value': 3}))
+        self.assertEqual((job.status, job.result, job.locked_by), ('succeeded', {'value': 3}, ''))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_retry_then_fail(self):
+        with self.assertLogs('api.jobs', 'ERROR'):
+            job = self.run_claimed(jobs.enqueue('tests.echo', {'fail': True}))
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.last_error, 'ValueError: boom')
+        self.assertGreater(job.run_at, timezone.now())
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('api.jobs', 'ERROR'):
+            job = self.run_claimed(job)
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_lost_lease_keeps_new_owner(self):
+        job = jobs.enqueue('tests.echo')
+        claimed, = jobs.claim('w1', 1)
+        Job.objects.filter(pk=job.pk).update(locked_by='w2') # w1's lease expired and w2 took it
+        with self.assertLogs('api.jobs', 'WARNING'):
+            jobs.run_job(claimed, 'w1')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), ('running', 'w2'))
+
+    @override_settings(JOBS_SCHEDULE={})
+    def test_run_jobs_command(self):
+        job = jobs.enqueue('tests.echo', {'value': 'x'})
+        out = StringIO()
+        # One thread: the loop then waits for the job instead of polling beside it (SQLite's
+        # shared-cache test database raises "table is locked" rather than waiting)
+        call_command('run_jobs', burst=True, threads=1, poll_interval=0.05, stdout=out)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertIn('stopped after 1 jobs', out.getvalue())
+
+
+# --- Workout summaries (user-038) ---
+
+class WorkoutSummaryTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        (cls.chest, cls.back, cls.legs), cls.exercises = make_catalog()
+        cls.workout = make_workout(cls.user, 'Full body', {cls.exercises['Push-up']: 3, cls.exercises['Squat']: 4})
+
+    def test_list_uses_summary_columns(self):
+        make_workout(self.user, 'Legs', {self.exercises['Squat']: 5})
+        catalog.get_snapshot()
+        with self.assertNumQueries(2): # Versions for the ETag, then the workouts; no exercise rows
+            response = self.client.get('/api/workouts/')
+        summary = response.data[0]
+        self.assertEqual((summary['exercise_count'], summary['total_sets']), (2, 7))
+        self.assertEqual([group['name'] for group in summary['muscle_groups']], ['Chest', 'Back', 'Legs'])
+        self.assertNotIn('workout_exercises', summary)
+        full = self.client.get('/api/workouts/', {'full': '1'})
+        self.assertEqual(len(full.data[0]['workout_exercises']), 2)
+        self.assertNotEqual(full['ETag'], response['ETag'])
+
+    def test_serializer_writes_summary(self):
+        response = self.client.put(f'/api/workouts/{self.workout.pk}/', {'name': 'Rows', 'workout_exercises': [
+            {'exercise_id': self.exercises['Row'].pk, 'target_sets': 6, 'target_reps': '10'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.workout.refresh_from_db()
+        self.assertEqual((self.workout.exercise_count, self.workout.total_sets, self.workout.muscle_group_ids), (1, 6, [self.back.pk]))
+
+    def test_activation_change_queues_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ExerciseMuscleActivation.objects.filter(exercise=self.exercises['Squat'], muscle_group=self.legs).delete()
+        job = Job.objects.get(task='workouts.refresh_summaries')
+        self.assertEqual(job.args, {'exercise_ids': [self.exercises['Squat'].pk]})
+        self.assertEqual(tasks.refresh_workout_summaries(**job.args), {'workouts': 1})
+        self.workout.refresh_from_db()
+        self.assertEqual(self.workout.muscle_group_ids, [self.chest.pk, self.back.pk])
+
+    def test_exercise_delete_queues_refresh(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercises['Push-up'].delete()
+        job = Job.objects.get(task='workouts.refresh_summaries', args__has_key='workout_ids')
+        tasks.refresh_workout_summaries(**job.args)
+        self.workout.refresh_from_db()
+        self.assertEqual((self.workout.exercise_count, self.workout.total_sets), (1, 4))
+
+
+# --- Exercise substitutes (user-039) ---
+
+class SubstituteTests(ApiTestCase):
+    """Against the seeded catalog, which has plenty of overlapping exercises."""
+
+    def brute_force(self, exercise_id):
+        def vector(exercise):
+            weights = {a.muscle_group.id: substitutes.LEVEL_WEIGHTS[a.activation_level] for a in exercise.muscle_activations}
+            norm = sum(w * w for w in weights.values()) ** 0.5
+            return {group: w / norm for group, w in weights.items()} if norm else {}
+
+        records = catalog.get_snapshot().exercises
+        target = vector(records[exercise_id])
+        scores = {}
+        for other_id, record in records.items():
+            score = sum(w * target.get(group, 0.0) for group, w in vector(record).items())
+            if other_id != exercise_id and score > 0:
+                scores[other_id] = score
+        return scores
+
+    def test_matches_brute_force(self):
+        index = substitutes.get_index()
+        self.assertGreater(len(index.rows), 30)
+        for exercise_id in index.rows:
+            scores = self.brute_force(exercise_id)
+            neighbors = index.neighbors(exercise_id)
+            expected = sorted(scores.values(), reverse=True)[:index.k]
+            self.assertEqual([round(s, 6) for _, s in neighbors], [round(s, 6) for s in expected])
+            for other_id, similarity in neighbors:
+                self.assertAlmostEqual(scores[other_id], similarity, places=6)
+
+    def test_exercise_endpoint(self):
+        exercise = Exercise.objects.get(name='Squat')
+        response = self.client.get(f'/api/exercises/{exercise.pk}/substitutes/', {'k': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(
+            [(e['id'], e['similarity']) for e in response.data],
+            substitutes.get_index().neighbors(exercise.pk, 2),
+        )
+        self.assertIn('muscle_activations', response.data[0])
+        self.assertEqual(self.client.get(f'/api/exercises/{exercise.pk}/substitutes/', {'k': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/exercises/999999/substitutes/').status_code, 404)
+
+    def test_workout_endpoint_skips_exercises_already_in_it(self):
+        squat, deadlift = Exercise.objects.get(name='Squat'), Exercise.objects.get(name='Deadlift')
+        workout = make_workout(self.user, 'Legs', {squat: 3, deadlift: 3})
+        response = self.client.get(f'/api/workouts/{workout.pk}/substitutes/', {'k': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['exercise_id'] for item in response.data], [squat.pk, deadlift.pk])
+        for item in response.data:
+            suggested = {e['id'] for e in item['substitutes']}
+            self.assertTrue(suggested)
+            self.assertFalse(suggested & {squat.pk, deadlift.pk})
+
+    def test_rebuilt_when_catalog_changes(self):
+        index = substitutes.get_index()
+        self.assertIs(substitutes.get_index(), index)
+        with self.captureOnCommitCallbacks(execute=True):
+            MuscleGroup.objects.create(name='Neck')
+        self.assertIsNot(substitutes.get_index(), index)
+
+
+# --- Admin (user-040) ---
+
+class AdminTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        (cls.chest, cls.back, cls.legs), cls.exercises = make_catalog()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', None)
+        cls.workout = make_workout(cls.user, 'Legs', {cls.exercises['Squat']: 3})
+        Plan.objects.create(name='Week', owner=cls.user, day1_workout=cls.workout)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+        self.matrix_url = reverse('admin:api_exercise_activation_matrix')
+
+    def levels(self, exercise):
+        return dict(ExerciseMuscleActivation.objects.filter(exercise=exercise).values_list('muscle_group__name', 'activation_level'))
+
+    def test_changelists(self):
+        for model in ('muscle group', 'exercise', 'workout', 'plan', 'request profile'):
+            url = reverse(f'admin:api_{model.replace(" ", "")}_changelist')
+            self.assertEqual(self.client.get(url).status_code, 200, model)
+        self.assertEqual(self.client.get(reverse('admin:api_exercise_changelist'), {'q': 'squ'}).status_code, 200)
+
+    def test_matrix_page(self):
+        response = self.client.get(self.matrix_url, {'q': 'pu'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([exercise.name for exercise, _ in response.context['rows']], ['Push-up'])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.matrix_url).status_code, 302)
+
+    def test_matrix_save(self):
+        squat, row = self.exercises['Squat'], self.exercises['Row']
+        version = versioning.get_version(versioning.CATALOG)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.matrix_url, {
+                'exercise': [squat.pk, row.pk],
+                f'act-{squat.pk}-{self.legs.pk}': 'M', # Changed
+                f'act-{squat.pk}-{self.back.pk}': '', # Removed
+                f'act-{squat.pk}-{self.chest.pk}': 'L', # Added
+                f'act-{row.pk}-{self.back.pk}': 'H', # Unchanged
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual([str(m) for m in get_messages(response.wsgi_request)], ['Saved 3 activation changes.'])
+        self.assertEqual(self.levels(squat), {'Legs': 'M', 'Chest': 'L'})
+        self.assertEqual(self.levels(row), {'Back': 'H'})
+        self.assertGreater(versioning.get_version(versioning.CATALOG), version)
+        self.assertEqual(set(Job.objects.values_list('task', flat=True)), {'workouts.refresh_summaries', 'rankings.refresh'})
+
+    def test_matrix_ignores_bad_and_deleted_exercises(self):
+        response = self.client.post(self.matrix_url, {'exercise': ['x'], f'act-x-{self.legs.pk}': 'H'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('nothing was saved', str(list(get_messages(response.wsgi_request))[0]))
+        response = self.client.post(self.matrix_url, {'exercise': [999999], f'act-999999-{self.legs.pk}': 'H'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ExerciseMuscleActivation.objects.filter(exercise_id=999999).exists())
+
+    def test_workout_inlines_refresh_summary(self):
+        url = reverse('admin:api_workout_change', args=[self.workout.pk])
+        row = WorkoutExercise.objects.get(workout=self.workout)
+        response = self.client.post(url, {
+            'name': 'Legs', 'description': '', 'owner': self.user.pk, 'is_public': '',
+            'workout_exercises-TOTAL_FORMS': 2, 'workout_exercises-INITIAL_FORMS': 1,
+            'workout_exercises-MIN_NUM_FORMS': 0, 'workout_exercises-MAX_NUM_FORMS': 1000,
+            'workout_exercises-0-id': row.pk, 'workout_exercises-0-workout': self.workout.pk,
+            'workout_exercises-0-exercise': self.exercises['Squat'].pk,
+            'workout_exercises-0-target_sets': 3, 'workout_exercises-0-target_reps': '5',
+            'workout_exercises-1-workout': self.workout.pk, 'workout_exercises-1-exercise': self.exercises['Row'].pk,
+            'workout_exercises-1-target_sets': 4, 'workout_exercises-1-target_reps': '10',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.workout.refresh_from_db()
+        self.assertEqual((self.workout.exercise_count, self.workout.total_sets), (2, 7))
+
+    def test_save_activation_matrix_counts_changes(self):
+        squat = self.exercises['Squat']
+        levels = {(squat.pk, self.legs.pk): 'H', (squat.pk, self.back.pk): 'M'}
+        self.assertEqual(api_admin.save_activation_matrix([squat.pk], levels), 0)
+        levels[(squat.pk, self.back.pk)] = 'bogus' # Anything but H/M/L clears the cell
+        self.assertEqual(api_admin.save_activation_matrix([squat.pk], levels), 1)
+        self.assertEqual(self.levels(squat), {'Legs': 'H'})
+
+
+# --- Request profiling (user-041) ---
+
+class ProfilingSettingTests(SimpleTestCase):
+    def test_off_unless_enabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(lambda request: None)
+
+    def test_classify(self):
+        self.assertEqual(profiling.classify('/site-packages/django/db/models/query.py'), 'orm')
+        self.assertEqual(profiling.classify('/app/api/throttling.py'), 'throttle')
+        self.assertEqual(profiling.classify('C:\\venv\\rest_framework\\serializers.py'), 'serializer')
+        self.assertIsNone(profiling.classify('/app/api/views.py'))
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None) # The middleware checks the JWT itself
+
+    def test_staff_cprofile(self):
+        response = self.client.get('/api/muscle-groups/', HTTP_AUTHORIZATION=bearer(self.staff), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.mode, profile.trigger, profile.user, profile.status_code), ('cprofile', 'flag', self.staff, 200))
+        self.assertIn('auth', profile.breakdown)
+        self.assertIsInstance(marshal.loads(bytes(profile.data)), dict)
+        self.assertTrue(response['X-Profile-Url'].endswith(f'/requestprofile/{profile.pk}/change/'))
+
+    def test_staff_sampling(self):
+        response = self.client.get('/api/plans/?profile=sample', HTTP_AUTHORIZATION=bearer(self.staff))
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.mode, 'sampling')
+        self.assertEqual(profile.path, '/api/plans/?profile=sample')
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_tokens_are_not_stored(self):
+        token = schedule.make_feed_token(self.user)
+        self.client.get(f'/api/calendar/feed.ics?token={token}&days=7') # A 404 without an active plan; it's profiled all the same
+        self.client.get('/api/session/stream/?token=expired')
+        self.assertEqual(
+            sorted(RequestProfile.objects.values_list('path', flat=True)),
+            ['/api/calendar/feed.ics?days=7', '/api/session/stream/'],
+        )
+
+    def test_others_are_not_profiled(self):
+        for headers in ({'HTTP_AUTHORIZATION': bearer(self.user)}, {'HTTP_AUTHORIZATION': 'Bearer forged'}, {}):
+            response = self.client.get('/api/muscle-groups/', HTTP_X_PROFILE='1', **headers)
+            self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_STORED=2)
+    def test_sampled_requests_and_retention(self):
+        for _ in range(3):
+            response = self.client.get('/api/muscle-groups/')
+            self.assertFalse(response.has_header('X-Profile-Id'), 'sampled profiles are silent')
+        self.assertEqual(RequestProfile.objects.count(), 2)
+        self.assertEqual(set(RequestProfile.objects.values_list('trigger', flat=True)), {'sampled'})
+
+    def test_admin_download(self):
+        response = self.client.get('/api/muscle-groups/', HTTP_AUTHORIZATION=bearer(self.staff), HTTP_X_PROFILE='sample')
+        self.client.force_login(User.objects.create_superuser('root', None, None))
+        download = self.client.get(reverse('admin:api_requestprofile_download', args=[response['X-Profile-Id']]))
+        self.assertEqual(download['Content-Type'], 'text/plain')
+        self.assertEqual(download.content, bytes(RequestProfile.objects.get().data))
+        self.assertEqual(self.client.get(reverse('admin:api_requestprofile_change', args=[response['X-Profile-Id']])).status_code, 200)
+
+
+# --- Start-up warm-up (user-042) ---
+
+class WarmUpTests(TransactionTestCase):
+    # warm_up() closes the connections it used, which a TestCase's transaction wouldn't survive
+    def setUp(self):
+        reset_caches()
+
+    def test_off_by_default(self):
+        with self.assertNoLogs('api.warmup'), self.assertNumQueries(0):
+            self.assertEqual(warmup.warm_up(), {})
+        self.assertIsNone(catalog._snapshot)
+
+    @override_settings(WARMUP_ON_START=True)
+    def test_runs_every_step(self):
+        Exercise.objects.create(name='Plank')
+        with self.assertLogs('api.warmup', 'INFO') as logs:
+            timings = warmup.warm_up()
+        self.assertEqual(list(timings), [name for name, _ in warmup.STEPS])
+        self.assertNotIn('ERROR', ' '.join(logs.output))
+        self.assertEqual([exercise.name for exercise in catalog._snapshot.exercises.values()], ['Plank'])
+        self.assertEqual(substitutes._index.version, catalog._snapshot.version)
+
+    @override_settings(WARMUP_ON_START=True)
+    def test_a_failing_step_is_skipped(self):
+        def broken():
+            raise RuntimeError('nope')
+        steps = warmup.STEPS
+        warmup.STEPS = (('broken', broken),) + steps
+        try:
+            with self.assertLogs('api.warmup') as logs:
+                timings = warmup.warm_up()
+        finally:
+            warmup.STEPS = steps
+        self.assertEqual(list(timings), ['broken'] + [name for name, _ in steps])
+        self.assertIn("Warm-up step 'broken' failed", logs.output[0])
+
+
+# --- Live workout sessions (user-043) ---
+
+def call_asgi(app, path='/api/session/stream/', query=b'', headers=(), disconnect_after=0):
+    """The messages `app` sends for one GET; the client disconnects once it got `disconnect_after` body chunks."""
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query,
+        'headers': [(name.encode(), value.encode()) for name, value in headers], 'client': ('127.0.0.1', 5000),
+    }
+    messages = []
+
+    async def run():
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if sum(message['type'] == 'http.response.body' for message in messages) >= disconnect_after:
+                disconnected.set()
+
+        await app(scope, receive, send)
+    asyncio.run(run())
+    return messages
+
+
+@override_settings(LIVE_BROKER='local')
+class LiveSessionTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        _, exercises = make_catalog()
+        cls.workout = make_workout(cls.user, 'Push', {exercises['Bench press']: 3, exercises['Row']: 3})
+        cls.bench, cls.row = WorkoutExercise.objects.filter(workout=cls.workout).order_by('id')
+        cls.private = make_workout(cls.other, 'Bob only', {exercises['Squat']: 5})
+
+    def test_session_updates(self):
+        response = self.client.post('/api/session/', {'workout': self.workout.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        token = response.data['stream_url'].split('?token=')[1]
+        self.assertEqual(live.read_stream_token(token), self.user.pk)
+        self.assertEqual([exercise['id'] for exercise in response.data['exercises']], [self.bench.pk, self.row.pk])
+
+        delta = self.client.post('/api/session/sets/', {'workout_exercise': self.bench.pk, 'reps': 8, 'weight': 60, 'rest': 90}, format='json').data
+        self.assertEqual((delta['type'], delta['revision'], delta['data']['set']), ('set', 2, 1))
+        self.assertIsNotNone(delta['data']['rest_until'])
+        self.assertEqual(self.client.post('/api/session/current/', {'workout_exercise': self.row.pk}, format='json').data['revision'], 3)
+        self.assertIsNone(self.client.post('/api/session/rest/', {'seconds': 0}, format='json').data['data']['rest_until'])
+
+        state = self.client.get('/api/session/').data
+        self.assertEqual((state['revision'], state['current'], state['rest_until']), (4, self.row.pk, None))
+        self.assertEqual([exercise['completed_sets'] for exercise in state['exercises']], [1, 0])
+        self.assertEqual(state['sets'][str(self.bench.pk)][0]['reps'], 8)
+
+    def test_restarting_keeps_one_row(self):
+        self.client.post('/api/session/', {'workout': self.workout.pk}, format='json')
+        self.client.post('/api/session/sets/', {'workout_exercise': self.bench.pk}, format='json')
+        state = self.client.post('/api/session/', {'workout': self.workout.pk}, format='json').data
+        self.assertEqual((state['revision'], state['sets']), (3, {})) # Revisions keep counting
+        self.assertEqual(LiveSession.objects.filter(owner=self.user).count(), 1)
+
+    def test_rejected_changes(self):
+        self.assertEqual(self.client.get('/api/session/').status_code, 404)
+        self.assertEqual(self.client.post('/api/session/rest/', {'seconds': 30}, format='json').status_code, 404)
+        self.assertEqual(self.client.post('/api/session/', {'workout': self.private.pk}, format='json').status_code, 400)
+        self.client.post('/api/session/', {'workout': self.workout.pk}, format='json')
+        other_row = WorkoutExercise.objects.get(workout=self.private)
+        self.assertEqual(self.client.post('/api/session/current/', {'workout_exercise': other_row.pk}, format='json').status_code, 400)
+        self.assertEqual(self.client.delete('/api/session/').data['type'], 'ended')
+        self.assertEqual(self.client.post('/api/session/sets/', {'workout_exercise': self.bench.pk}, format='json').status_code, 404)
+        self.assertEqual(self.client.delete('/api/session/').status_code, 404)
+        self.assertFalse(self.client.get('/api/session/').data['active'])
+
+    def test_stream_token_expires(self):
+        token = live.make_stream_token(self.user)
+        self.assertEqual(live.read_stream_token(token), self.user.pk)
+        self.assertIsNone(live.read_stream_token(token + 'x'))
+        with override_settings(LIVE_STREAM_TOKEN_MAX_AGE=-1):
+            self.assertIsNone(live.read_stream_token(token))
+
+    @override_settings(THROTTLE_BUCKETS=SLOW_BUCKETS)
+    def test_stream_view_rejects(self):
+        self.client.force_authenticate(None)
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/session/stream/?token=forged').status_code, 401)
+        response = self.client.get('/api/session/stream/?token=forged')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(THROTTLE_BUCKETS=SLOW_BUCKETS)
+    def test_asgi_stream_rejects(self):
+        headers = [('origin', 'https://app.example')]
+        start, body = call_asgi(live.serve_stream, query=b'token=forged', headers=headers)
+        self.assertEqual(start['status'], 401)
+        self.assertIn((b'vary', b'Origin'), start['headers'])
+        self.assertIn((b'access-control-allow-origin', b'https://app.example'), start['headers'])
+        call_asgi(live.serve_stream, headers=[('authorization', 'Bearer forged')])
+        start, body = call_asgi(live.serve_stream)
+        self.assertEqual(start['status'], 429)
+        self.assertIn((b'retry-after', b'100'), start['headers'])
+
+    def test_other_requests_pass_through(self):
+        async def django_app(scope, receive, send):
+            await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        self.assertEqual(call_asgi(live.with_stream(django_app), path='/api/session/')[0]['status'], 204)
+
+    def test_slow_streams_resync(self):
+        async def overflow():
+            subscription = live.Subscription(self.user.pk, 2)
+            for revision in range(3):
+                subscription.offer({'type': 'rest', 'revision': revision, 'data': {}})
+            return [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+        self.assertEqual(asyncio.run(overflow()), [live.RESYNC])
+
+
+@override_settings(LIVE_BROKER='local', LIVE_HEARTBEAT=0.05)
+class LiveStreamTests(TransactionTestCase):
+    """
+    Streams read the session on the shared thread pool, from another connection: here the
+    rows have to be committed. Everything runs one step at a time, as SQLite wants it.
+    """
+    def setUp(self):
+        reset_caches()
+        self.user = User.objects.create_user('alice')
+        _, exercises = make_catalog()
+        self.workout = make_workout(self.user, 'Push', {exercises['Bench press']: 3})
+        self.bench = WorkoutExercise.objects.get(workout=self.workout)
+        live.start(self.user, self.workout.pk)
+
+    def test_snapshot_then_deltas(self):
+        events = live.iter_stream(self.user.pk)
+        self.assertEqual(next(events), 'retry: 3000\n\n')
+        self.assertTrue(next(events).startswith('id: 1\nevent: session\n'))
+        live.record_set(self.user, self.bench.pk, reps=8) # Published on commit, picked up by the next chunk
+        chunk = next(events)
+        self.assertTrue(chunk.startswith('id: 2\nevent: set\n'))
+        self.assertIn('"reps": 8', chunk)
+        live.start(self.user, self.workout.pk) # A new session: a new snapshot
+        self.assertTrue(next(events).startswith('id: 3\nevent: session\n'))
+        self.assertEqual(next(events), ': ping\n\n')
+        events.close()
+        self.assertEqual(live.get_broker().info()['streams'], 0)
+
+    def test_reconnect_skips_current_snapshot(self):
+        events = live.iter_stream(self.user.pk, last_event_id='1')
+        self.assertEqual(next(events), 'retry: 3000\n\n')
+        self.assertEqual(next(events), ': ping\n\n')
+        events.close()
+
+    @override_settings(LIVE_STREAM_MAX_AGE=0)
+    def test_stream_view(self):
+        response = self.client.get('/api/session/stream/', HTTP_AUTHORIZATION=bearer(self.user))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 2)
+        self.assertIn('"workout": %d' % self.workout.pk, chunks[1])
+
+    def test_asgi_stream(self):
+        token = live.make_stream_token(self.user).encode()
+        start, *body = call_asgi(live.serve_stream, query=b'token=' + token, disconnect_after=2)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream; charset=utf-8'), start['headers'])
+        self.assertTrue(body[1]['body'].startswith(b'id: 1\nevent: session\n'))
+        self.assertEqual(live.get_broker().info()['streams'], 0) # Unsubscribed on disconnect
+
+
+# --- Volume rankings (user-044) ---
+
+@override_settings(RANKINGS_VERSION_CHECK_INTERVAL=0)
+class RankingsTests(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        (cls.chest, cls.back, cls.legs), cls.exercises = make_catalog()
+        exercises = cls.exercises
+        cls.carol = User.objects.create_user('carol')
+        cls.dave = User.objects.create_user('dave')
+        cls.push = make_workout(cls.user, 'Push', {exercises['Bench press']: 4})
+        cls.legday = make_workout(cls.user, 'Legs', {exercises['Squat']: 4})
+        cls.light = make_workout(cls.other, 'Light', {exercises['Push-up']: 2})
+        Plan.objects.create(name='Week', owner=cls.user, is_active=True, day1_workout=cls.push, day2_workout=cls.legday)
+        # A rest day's workout doesn't count
+        Plan.objects.create(name='Easy', owner=cls.other, is_active=True, day1_workout=cls.light, day2_workout=cls.push, day2_is_rest=True)
+        Plan.objects.create(name='Twice', owner=cls.carol, is_active=True, day1_workout=cls.push, day2_workout=cls.push)
+        Plan.objects.create(name='Someday', owner=cls.dave, day1_workout=cls.legday)
+        cls.everyone = [cls.user.pk, cls.other.pk, cls.carol.pk, cls.dave.pk]
+
+    def brute_force(self, user):
+        """{group id: percentile} counted over the stored volumes."""
+        volumes = dict(PlanVolume.objects.values_list('user_id', 'buckets'))
+        mine = volumes[user.pk]
+        percentiles = {}
+        for group in (self.chest, self.back, self.legs):
+            bucket = mine.get(str(group.pk), 0)
+            others = [buckets.get(str(group.pk), 0) for buckets in volumes.values()]
+            below = sum(other < bucket for other in others) + sum(other == bucket for other in others) / 2
+            percentiles[group.pk] = round(100 * below / len(others), 1)
+        return percentiles
+
+    def test_compute_volumes(self):
+        self.assertEqual(rankings.compute_volumes(self.everyone), {
+            self.user.pk: {self.chest.pk: 4, self.legs.pk: 4, self.back.pk: 2},
+            self.other.pk: {self.chest.pk: 2, self.back.pk: 0.5},
+            self.carol.pk: {self.chest.pk: 8},
+        })
+        self.assertEqual(rankings.users_planning([self.legday.pk]), {self.user.pk})
+        self.assertEqual(rankings.users_planning([]), set())
+
+    def test_percentiles(self):
+        self.assertEqual(rankings.refresh_users(self.everyone), 3)
+        self.assertEqual(rankings.refresh_users(self.everyone), 0)
+        self.assertEqual(rankings.rebuild_counts(), 0)
+        for user in (self.user, self.other, self.carol):
+            result = rankings.rankings_for(user)
+            self.assertEqual(result['population'], 3)
+            self.assertEqual({group['id']: group['percentile'] for group in result['muscle_groups']}, self.brute_force(user))
+        weekly = {group['name']: group['weekly_sets'] for group in rankings.rankings_for(self.user)['muscle_groups']}
+        self.assertEqual(weekly, {'Chest': 4, 'Back': 2, 'Legs': 4})
+
+    def test_changes_move_the_counts(self):
+        rankings.refresh_users(self.everyone)
+        Plan.objects.filter(owner=self.other).update(is_active=False)
+        WorkoutExercise.objects.filter(workout=self.push).update(target_sets=1)
+        self.assertEqual(rankings.refresh_users(self.everyone), 3) # Two changed, one left
+        self.assertFalse(PlanVolume.objects.filter(user=self.other).exists())
+        self.assertEqual(rankings.rebuild_counts(), 0)
+        self.assertEqual(rankings.rankings_for(self.carol)['population'], 2)
+        self.assertEqual([self.brute_force(user)[self.chest.pk] for user in (self.user, self.carol)], [25.0, 75.0])
+
+    def test_rebuild_repairs_counts(self):
+        rankings.refresh_users(self.everyone)
+        VolumeBucket.objects.filter(muscle_group=self.chest.pk).update(count=7)
+        VolumeBucket.objects.create(muscle_group=self.legs.pk, bucket=1, count=1)
+        self.assertEqual(rankings.rebuild_counts(), 4)
+        self.assertEqual(rankings.rebuild_counts(), 0)
+
+    def test_endpoint(self):
+        rankings.refresh_users([self.other.pk, self.carol.pk])
+        # Not ranked yet: compared with the others from the live plan
+        response = self.client.get('/api/rankings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['population'], response.data['updated_at']), (2, None))
+        self.client.force_authenticate(self.dave)
+        self.assertEqual(self.client.get('/api/rankings/').status_code, 404)
+
+    def test_nested_save_queues_one_refresh(self):
+        for names in (['Row'], ['Bench press', 'Push-up', 'Row', 'Squat']):
+            body = {'name': 'Push', 'workout_exercises': [
+                {'exercise_id': self.exercises[name].pk, 'target_sets': 3, 'target_reps': '8'} for name in names
+            ]}
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.assertEqual(self.client.put(f'/api/workouts/{self.push.pk}/', body, format='json').status_code, 200)
+            Job.objects.all().delete()
+            with self.assertNumQueries(2): # Looks for a queued duplicate, then inserts; however many rows
+                for callback in callbacks:
+                    callback()
+            self.assertEqual(list(Job.objects.values_list('task', 'args')), [('rankings.refresh', {'workout_ids': [self.push.pk]})])
+
+    def test_writes_queue_one_refresh(self):
+        rankings.refresh_users(self.everyone)
+        with self.captureOnCommitCallbacks(execute=True):
+            Plan.objects.create(name='Now', owner=self.dave, is_active=True, day1_workout=self.legday)
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('Row', 'Squat'): # Like a nested workout save: one refresh for all its rows
+                WorkoutExercise.objects.create(workout=self.push, exercise=self.exercises[name], target_sets=3)
+        self.assertEqual(
+            sorted(Job.objects.filter(task='rankings.refresh').values_list('args', flat=True), key=str),
+            [{'user_ids': [self.dave.pk]}, {'workout_ids': [self.push.pk]}],
+        )
+        # Bob's plan has it on a rest day: looked at, but his volume stays the same
+        self.assertEqual(tasks.refresh_rankings(workout_ids=[self.push.pk]), {'users': 3, 'changed': 2})
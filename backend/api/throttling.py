@@ -0,0 +1,161 @@
+"""
+Token-bucket throttling shared by every worker process on a host.
+
+Each user (or client IP when anonymous) has a bucket that refills at `rate`
+tokens per second up to `burst`. A request costs `throttle_costs[action]`
+tokens from its view (default 1), so expensive nested lists drain the bucket
+faster than cheap reads. When the bucket is short, DRF answers 429 with a
+Retry-After header.
+
+Buckets live in a memory-mapped file (THROTTLE_STORE = 'shared'): a fixed-size
+open-addressed table guarded by per-region fcntl locks, so a check is a
+couple of syscalls and never touches the database. THROTTLE_STORE = 'memory'
+keeps buckets per process, which is enough for tests and runserver, and is
+what 'shared' falls back to where fcntl or /dev/shm don't exist (Windows).
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+
+def _take(tokens, stamp, now, cost, rate, burst):
+    """Refill a bucket and try to take `cost` tokens. Returns (allowed, tokens_left, wait)."""
+    tokens = min(burst, tokens + max(0.0, now - stamp) * rate)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryBucketStore:
+    """Per-process buckets."""
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, cost, rate, burst, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, stamp = self._buckets.get(key, (burst, now))
+            allowed, tokens, wait = _take(tokens, stamp, now, cost, rate, burst)
+            self._buckets[key] = (tokens, now)
+        return allowed, wait
+
+
+class SharedBucketStore:
+    """
+    Buckets in a shared memory-mapped file. Slots are (key hash, tokens, last update);
+    a key may live in any of PROBE consecutive slots starting at hash % n, and
+    that slot range is locked (fcntl) while it is read and updated. When all
+    PROBE slots are taken, the least recently used one is recycled.
+    """
+    SLOT = struct.Struct('<Qdd')
+    PROBE = 8
+
+    def __init__(self, path, slots):
+        import fcntl # POSIX only, so not imported with the module (raises ImportError on Windows)
+        self._fcntl = fcntl
+        self._slots = max(slots, self.PROBE)
+        size = self._slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size) # MAP_SHARED: visible to every process
+        # fcntl locks are per process, so threads of one process also need a lock
+        self._thread_lock = threading.Lock()
+
+    @staticmethod
+    def _hash(key):
+        # Stable across processes (unlike hash()); 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+    def consume(self, key, cost, rate, burst, now=None):
+        now = time.time() if now is None else now
+        key_hash = self._hash(key)
+        first = key_hash % (self._slots - self.PROBE + 1)
+        offset, length = first * self.SLOT.size, self.PROBE * self.SLOT.size
+        with self._thread_lock:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, length, offset)
+            try:
+                slot, tokens, stamp = self._find(key_hash, first, burst, now)
+                allowed, tokens, wait = _take(tokens, stamp, now, cost, rate, burst)
+                self.SLOT.pack_into(self._map, slot * self.SLOT.size, key_hash, tokens, now)
+            finally:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, length, offset)
+        return allowed, wait
+
+    def _find(self, key_hash, first, burst, now):
+        free = oldest = None
+        oldest_stamp = float('inf')
+        for slot in range(first, first + self.PROBE):
+            slot_hash, tokens, stamp = self.SLOT.unpack_from(self._map, slot * self.SLOT.size)
+            if slot_hash == key_hash:
+                return slot, tokens, stamp
+            if slot_hash == 0:
+                if free is None:
+                    free = slot
+            elif stamp < oldest_stamp:
+                oldest, oldest_stamp = slot, stamp
+        # New bucket starts full
+        return (free if free is not None else oldest), burst, now
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.THROTTLE_STORE == 'shared' and settings.THROTTLE_STORE_PATH:
+                    try:
+                        _store = SharedBucketStore(settings.THROTTLE_STORE_PATH, settings.THROTTLE_STORE_SLOTS)
+                    except ImportError:
+                        pass
+                if _store is None:
+                    if settings.THROTTLE_STORE == 'shared':
+                        logger.warning('Shared throttle store unavailable here; throttling per process instead')
+                    _store = MemoryBucketStore()
+    return _store
+
+
+def consume(scope, ident, cost=1):
+    """
+    Take `cost` tokens from the bucket of a user ('user', pk) or client ('anon', ip).
+    Returns (allowed, seconds to wait). Also used outside DRF (the live session stream).
+    """
+    config = settings.THROTTLE_BUCKETS[scope]
+    cost = min(cost, config['burst']) # A cost above burst could never pass
+    return get_store().consume(f'{scope}:{ident}', cost, config['rate'], config['burst'])
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Views set `throttle_costs = {'list': 5}` to weight actions; anything else costs 1.
+    Rates come from settings.THROTTLE_BUCKETS ('user' / 'anon').
+    """
+    def get_cost(self, view):
+        costs = getattr(view, 'throttle_costs', None) or {}
+        action = getattr(view, 'action', None) or view.request.method.lower()
+        return costs.get(action, 1)
+
+    def allow_request(self, request, view):
+        if request.user and request.user.is_authenticated:
+            scope, ident = 'user', request.user.pk
+        else:
+            scope, ident = 'anon', self.get_ident(request)
+        allowed, self._wait = consume(scope, ident, self.get_cost(view))
+        return allowed
+
+    def wait(self):
+        return self._wait
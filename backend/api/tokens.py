@@ -0,0 +1,29 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import revocation_filter
+
+
+class RevocationCheckedRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check goes through the in-memory Bloom filter
+    first (api/revocation.py), so most refreshes skip the blacklist query.
+    """
+    def check_blacklist(self):
+        if revocation_filter.might_be_revoked(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted, created = super().blacklist()
+        revocation_filter.add(self.payload[api_settings.JTI_CLAIM])
+        if not created:
+            # Someone already rotated this token (replay, or a stale filter in another worker)
+            raise TokenError(_('Token is blacklisted'))
+        return blacklisted, created
+
+
+class RotatingTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RevocationCheckedRefreshToken
@@ -2,10 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 # simplejwt views
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
 
 # DefaultRouter automatically creates the standard API routes (list, create, retrieve, update, destroy)
 router = DefaultRouter()
@@ -19,6 +16,7 @@ router.register(r'muscle-groups', views.MuscleGroupViewSet)
 router.register(r'exercises', views.ExerciseViewSet)
 router.register(r'workouts', views.WorkoutViewSet, basename='workout')
 router.register(r'plans', views.PlanViewSet, basename='plan')
+router.register(r'jobs', views.JobViewSet, basename='job') # Background job status (read-only)
 # Optional: If you created a UserViewSet, register it here
 # router.register(r'users', views.UserViewSet)
 
@@ -32,7 +30,31 @@ urlpatterns = [
     # Authentication URLs
     path('auth/register/', views.RegisterView.as_view(), name='auth_register'),
 
-    path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/login/', views.LoginView.as_view(), name='token_obtain_pair'),
 
     path('auth/login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    # Several operations in one round-trip / transaction
+    path('batch/', views.BatchView.as_view(), name='batch'),
+
+    # Incremental sync for offline clients
+    path('sync/', views.SyncView.as_view(), name='sync'),
+
+    # Active plan as a calendar (JSON for month views, streaming iCal for calendar apps)
+    path('calendar/', views.CalendarView.as_view(), name='calendar'),
+    path('calendar/feed.ics', views.CalendarFeedView.as_view(), name='calendar_feed'),
+    path('calendar/feed/rotate/', views.CalendarFeedRotateView.as_view(), name='calendar_feed_rotate'),
+
+    # Live workout session, synced across the user's devices (the stream is served from the ASGI app)
+    path('session/', views.LiveSessionView.as_view(), name='live_session'),
+    path('session/stream/', views.live_session_stream, name='live_session_stream'),
+    path('session/sets/', views.LiveSessionUpdateView.as_view(), {'action': 'sets'}, name='live_session_sets'),
+    path('session/current/', views.LiveSessionUpdateView.as_view(), {'action': 'current'}, name='live_session_current'),
+    path('session/rest/', views.LiveSessionUpdateView.as_view(), {'action': 'rest'}, name='live_session_rest'),
+
+    # Percentile of the active plan's weekly volume per muscle group
+    path('rankings/', views.RankingsView.as_view(), name='rankings'),
+
+    # Monitoring
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
 ]
@@ -0,0 +1,74 @@
+"""
+Version counters (see DataVersion) used to invalidate caches cheaply.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+CATALOG = 'catalog'
+PUBLIC_WORKOUTS = 'public_workouts' # Shared templates, visible to every user
+RANKINGS = 'rankings' # Volume histogram counts (api/rankings.py)
+
+_collecting = threading.local() # Keys bumped inside bump_once() blocks, per thread
+
+
+def user_key(user_id):
+    """Counter for everything owned by one user (their plans and workouts)."""
+    return f'user:{user_id}'
+
+
+def feed_key(user_id):
+    """Generation of a user's calendar feed tokens; bumping it revokes every issued feed URL."""
+    return f'feed:{user_id}'
+
+
+def get_version(key):
+    """Current value of a counter (0 if it was never bumped)."""
+    return DataVersion.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+
+def get_versions(*keys):
+    """Several counters in one query, returned in the order asked for."""
+    found = dict(DataVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def bump_version(key):
+    """
+    Increment a counter. Call it inside the same transaction as the write it
+    describes, so readers never see new data under the old version for long.
+    """
+    keys = getattr(_collecting, 'keys', None)
+    if keys is not None:
+        keys.add(key)
+        return
+    with transaction.atomic():
+        updated = DataVersion.objects.filter(key=key).update(version=F('version') + 1)
+        if not updated:
+            _, created = DataVersion.objects.get_or_create(key=key, defaults={'version': 1})
+            if not created: # Lost a race with another first bump
+                DataVersion.objects.filter(key=key).update(version=F('version') + 1)
+
+
+@contextmanager
+def bump_once():
+    """
+    Bump each counter once for all the writes in the block instead of once per row
+    (a nested workout save writes every exercise row). The bumps happen when the
+    block ends, so keep it inside the transaction of the writes.
+    """
+    if getattr(_collecting, 'keys', None) is not None:
+        yield # An outer block bumps them
+        return
+    _collecting.keys = set()
+    try:
+        yield
+        keys = _collecting.keys
+    finally:
+        _collecting.keys = None
+    for key in sorted(keys): # Same order everywhere, so concurrent writers don't deadlock
+        bump_version(key)
@@ -1,68 +1,241 @@
-from rest_framework import viewsets, permissions, generics
+from rest_framework import viewsets, permissions, generics, status
+from rest_framework.exceptions import Throttled
+from rest_framework.decorators import action
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework_simplejwt.views import TokenObtainPairView
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import quote_etag
+from datetime import timedelta
+import math
 from .models import (
-     MuscleGroup, Exercise, Workout, Plan, # No need to import intermediate models directly here
+     MuscleGroup, Exercise, Workout, Plan, Job, # No need to import intermediate models directly here
      # ExerciseMuscleActivation, WorkoutExercise
 )
 from .serializers import (
-    MuscleGroupSerializer, ExerciseSerializer, WorkoutSerializer, PlanSerializer, UserSerializer, RegisterSerializer
+    MuscleGroupSerializer, ExerciseSerializer, WorkoutSerializer, PlanSerializer, UserSerializer, RegisterSerializer,
+    JobSerializer, WorkoutSummarySerializer, CloneSerializer,
+    LiveSessionStartSerializer, LiveSetSerializer, LiveCurrentSerializer, LiveRestSerializer,
     # No need to import intermediate serializers directly here
     # ExerciseMuscleActivationSerializer, WorkoutExerciseSerializer
 )
+from . import batch, catalog, cloning, hashing, live, metrics, rankings, schedule, substitutes, sync, versioning
+from .conditional import ConditionalGetMixin, etag_matches
+from .permissions import HasMetricsToken
 
 # Create your views here.
-class MuscleGroupViewSet(viewsets.ModelViewSet):
+class CatalogSnapshotMixin:
+    """
+    Serve list/retrieve from the in-memory catalog snapshot (api/catalog.py)
+    instead of querying the catalog tables. Writes still go through the ORM.
+    """
+    snapshot_records = None # Attribute of the snapshot holding the records: 'muscle_groups' or 'exercises'
+
+    def list(self, request, *args, **kwargs):
+        records = getattr(catalog.get_snapshot(), self.snapshot_records)
+        serializer = self.get_serializer(list(records.values()), many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            record = getattr(catalog.get_snapshot(), self.snapshot_records).get(int(kwargs['pk']))
+        except ValueError:
+            record = None
+        if record is None: # Not in the snapshot yet (or missing): let the ORM decide
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.get_serializer(record).data)
+
+def render_substitutes(neighbors):
+    """Exercises from the catalog snapshot for (id, similarity) pairs, with the similarity added."""
+    records = catalog.get_snapshot().exercises
+    return [
+        {**ExerciseSerializer(records[exercise_id]).data, 'similarity': similarity}
+        for exercise_id, similarity in neighbors if exercise_id in records
+    ]
+
+class MuscleGroupViewSet(ConditionalGetMixin, CatalogSnapshotMixin, viewsets.ModelViewSet):
     queryset = MuscleGroup.objects.all()
     serializer_class = MuscleGroupSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    snapshot_records = 'muscle_groups'
 
-class ExerciseViewSet(viewsets.ModelViewSet):
+class ExerciseViewSet(ConditionalGetMixin, CatalogSnapshotMixin, viewsets.ModelViewSet):
     # Updated queryset to prefetch related activation data
+    # (only used for writes now, reads come from the catalog snapshot)
     queryset = Exercise.objects.all().prefetch_related(
         'muscle_activations__muscle_group' # Prefetch through intermediate model
         # the double underline traverses the relationships
     )
     serializer_class = ExerciseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    snapshot_records = 'exercises'
 
-class WorkoutViewSet(viewsets.ModelViewSet):
-    # Updated queryset to prefetch through WorkoutExercise -> Exercise -> ExerciseMuscleActivation -> MuscleGroup
-    queryset = Workout.objects.all().prefetch_related(
-        'workout_exercises__exercise__muscle_activations__muscle_group'
-    )
+    @action(detail=True, methods=['get'])
+    def substitutes(self, request, pk=None):
+        """Most similar exercises by muscle activation (api/substitutes.py). ?k= (default 5)"""
+        return self._conditional(self._substitutes, request, pk=pk)
+
+    def _substitutes(self, request, pk=None):
+        try:
+            k = substitutes.parse_k(request.query_params.get('k'))
+            exercise_id = int(pk)
+        except ValueError:
+            return Response({'detail': 'k and the exercise id must be positive integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        index = substitutes.get_index()
+        if exercise_id not in index.rows:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(render_substitutes(index.neighbors(exercise_id, k)))
+
+class WorkoutViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """
+    The caller's own workouts. ?scope=public lists the shared templates instead.
+    Public workouts can be read by anyone but only changed by their owner.
+    Lists return the flat summary (WorkoutSummarySerializer); add ?full=1 for the nested exercise trees.
+    """
     serializer_class = WorkoutSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_costs = {'list': 3} # Token-bucket weight, see api/throttling.py
+    etag_per_user = True
+
+    def get_etag_parts(self):
+        # The summary list and ?full=1 are different bodies, so they can't share a tag
+        return (*super().get_etag_parts(), 'summary' if self.summary_list() else 'full')
+
+    def summary_list(self):
+        return self.action == 'list' and self.request.query_params.get('full') not in ('1', 'true')
+
+    def get_serializer_class(self):
+        if self.summary_list():
+            return WorkoutSummarySerializer
+        return WorkoutSerializer
 
-    # Optional owner filtering/assignment
-    # def get_queryset(self): ...
-    # def perform_create(self, serializer): ...
-    # might need this to automatically link user to their workouts
+    def get_queryset(self):
+        # Ordered by id so scoped lists walk the (owner, id) index
+        queryset = Workout.objects.order_by('id')
+        if not self.summary_list():
+            # Exercises (and their muscle activations) are resolved from the catalog snapshot,
+            # so only the WorkoutExercise rows need prefetching.
+            queryset = queryset.prefetch_related('workout_exercises')
+        user = self.request.user
+        if self.action == 'list' and self.request.query_params.get('scope') == 'public':
+            return queryset.filter(is_public=True)
+        if self.action in ('retrieve', 'clone', 'substitutes'):
+            return queryset.filter(Q(owner=user) | Q(is_public=True))
+        return queryset.filter(owner=user)
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """Copy a workout (own or public) into the caller's account. Optional body: {"name": ...}"""
+        body = CloneSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        copy = cloning.clone_workout(self.get_object(), request.user, name=body.validated_data.get('name'))
+        copy = self.get_queryset().get(pk=copy.pk)
+        return Response(self.get_serializer(copy).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def substitutes(self, request, pk=None):
+        """
+        Substitutes for every exercise in the workout, leaving out exercises it already contains.
+        ?k= per exercise (default 5)
+        """
+        return self._conditional(self._substitutes, request, pk=pk)
+
+    def _substitutes(self, request, pk=None):
+        try:
+            k = substitutes.parse_k(request.query_params.get('k'))
+        except ValueError:
+            return Response({'detail': 'k must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        workout_exercises = self.get_object().workout_exercises.all() # Prefetched with the workout
+        in_workout = {item.exercise_id for item in workout_exercises}
+        index = substitutes.get_index()
+        return Response([
+            {
+                'exercise_id': item.exercise_id,
+                'substitutes': render_substitutes(index.neighbors(item.exercise_id, k, exclude=in_workout)),
+            }
+            for item in workout_exercises
+        ])
 
-class PlanViewSet(viewsets.ModelViewSet):
+class PlanViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = PlanSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_costs = {'list': 5, 'retrieve': 2} # Each plan renders up to 7 workout trees
+
+    etag_per_user = True # Plans embed the user's workouts (same counter), public templates and catalog data
+
+    # Catalog data comes from the snapshot, so prefetching stops at the WorkoutExercise rows
+    day_prefetches = [f'day{day}_workout__workout_exercises' for day in range(1, 8)]
 
     def get_queryset(self):
         # Users should only see their own plans
-        # Prefetching needs to go deep if you want all details efficiently
-        return Plan.objects.filter(owner=self.request.user).prefetch_related(
-            'day1_workout__workout_exercises__exercise__muscle_activations__muscle_group',
-            'day2_workout__workout_exercises__exercise__muscle_activations__muscle_group',
-            'day3_workout__workout_exercises__exercise__muscle_activations__muscle_group',
-            'day4_workout__workout_exercises__exercise__muscle_activations__muscle_group',
-            'day5_workout__workout_exercises__exercise__muscle_activations__muscle_group',
-            'day6_workout__workout_exercises__exercise__muscle_activations__muscle_group',
-            'day7_workout__workout_exercises__exercise__muscle_activations__muscle_group',
-        )
+        queryset = Plan.objects.filter(owner=self.request.user)
+        if self.action == 'clone':
+            return queryset # Cloning only reads the plan row itself
+        return queryset.prefetch_related(*self.day_prefetches)
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """Copy the plan and all workouts it uses. Optional body: {"name": ...}"""
+        body = CloneSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        copy = cloning.clone_plan(self.get_object(), request.user, name=body.validated_data.get('name'))
+        copy = Plan.objects.prefetch_related(*self.day_prefetches).get(pk=copy.pk)
+        return Response(self.get_serializer(copy).data, status=status.HTTP_201_CREATED)
+
     # Optional: @action for set_active etc.
     # ...
 
 
-class RegisterView(generics.CreateAPIView):
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status of background jobs (api/jobs.py): your own jobs, or every job for staff.
+    Filter with ?status=queued|running|succeeded|failed.
+    """
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Job.objects.order_by('-id')
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(owner=self.request.user)
+        job_status = self.request.query_params.get('status')
+        if job_status:
+            queryset = queryset.filter(status=job_status)
+        return queryset
+
+
+class HashingBusyMixin:
+    """
+    For the views that hash passwords: when the hashing pool is full (api/hashing.py),
+    answer 429 + Retry-After right away instead of keeping the worker waiting.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with hashing.reject_when_busy():
+            return super().dispatch(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, hashing.HashingBusy):
+            exc = Throttled(exc.retry_after, 'Too many logins in progress, please retry shortly.', 'hashing_busy')
+        return super().handle_exception(exc)
+
+
+class LoginView(HashingBusyMixin, TokenObtainPairView):
+    """Exchange a username and password for a JWT pair (simplejwt's view)."""
+
+
+class RegisterView(HashingBusyMixin, generics.CreateAPIView):
     """
     API view for user registration.
     Allows any user (even unauthenticated) to create a new account.
@@ -71,3 +244,292 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = (permissions.AllowAny,) # Anyone can register
     serializer_class = RegisterSerializer
 
+
+# Viewsets that may be called through /api/batch/
+BATCHABLE_VIEWSETS = (MuscleGroupViewSet, ExerciseViewSet, WorkoutViewSet, PlanViewSet)
+
+
+class BatchView(APIView):
+    """
+    Run an ordered list of API operations in one transaction (see api/batch.py).
+    POST /api/batch/ {"operations": [{"method": "POST", "path": "workouts/", "body": {...}}, ...]}
+    Returns 200 with per-operation results, or 400 if any operation failed
+    (in which case nothing was saved).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response({'detail': 'operations must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > settings.BATCH_MAX_OPERATIONS:
+            return Response(
+                {'detail': f'At most {settings.BATCH_MAX_OPERATIONS} operations per batch.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ok, results = batch.run_batch(request, operations, BATCHABLE_VIEWSETS)
+        return Response({'results': results}, status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST)
+
+
+class SyncView(APIView):
+    """
+    Delta sync for offline-capable clients.
+    GET /api/sync/?token=<next_token from the previous page>&limit=<rows>
+    Without a token the first page of a full sync is returned. Keep following
+    next_token while has_more is true, then store it for the next sync.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_costs = {'get': 3}
+
+    def get(self, request):
+        limit = request.query_params.get('limit')
+        try:
+            limit = int(limit) if limit else None
+        except ValueError:
+            limit = 0
+        if limit is not None and limit < 1:
+            return Response({'detail': 'limit must be a positive integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = sync.get_changes(request.user, request.query_params.get('token'), limit)
+        except sync.SyncTokenExpired as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_410_GONE)
+        except sync.SyncTokenError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(page)
+
+
+class CalendarMixin:
+    """Shared date-range parsing and ETag handling for the calendar endpoints."""
+    default_days_before = 0
+    default_days_after = 41 # Six weeks, enough for a month grid
+    max_days = 400
+
+    def get_range(self, request):
+        """(start, end) from ?start=&end= (YYYY-MM-DD), or raises ValueError."""
+        today = timezone.localdate()
+        start = request.query_params.get('start')
+        end = request.query_params.get('end')
+        start = parse_date(start) if start else today - timedelta(days=self.default_days_before)
+        if start is None:
+            raise ValueError('start and end must be dates (YYYY-MM-DD).')
+        end = parse_date(end) if end else start + timedelta(days=self.default_days_after)
+        if end is None:
+            raise ValueError('start and end must be dates (YYYY-MM-DD).')
+        if end < start:
+            raise ValueError('end must not be before start.')
+        if (end - start).days >= self.max_days:
+            raise ValueError(f'The range can span at most {self.max_days} days.')
+        return start, end
+
+    def get_etag(self, user, plan, start, end):
+        # Plan and workout edits bump the user's counter; public templates have their own.
+        # The feed generation changes the ics_url in /api/calendar/ responses.
+        own_version, public_version, feed_version = versioning.get_versions(
+            versioning.user_key(user.pk), versioning.PUBLIC_WORKOUTS, versioning.feed_key(user.pk)
+        )
+        plan_id = plan.pk if plan else 0
+        return quote_etag(
+            f'calendar-{user.pk}.{plan_id}.{own_version}.{public_version}.{feed_version}.{start:%Y%m%d}.{end:%Y%m%d}'
+        )
+
+
+def feed_url(request, token):
+    return request.build_absolute_uri(reverse('calendar_feed') + '?token=' + token)
+
+
+class CalendarView(CalendarMixin, APIView):
+    """
+    The active plan expanded over a date range (default: six weeks from today).
+    GET /api/calendar/?start=2026-10-01&end=2026-10-31
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            start, end = self.get_range(request)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        plan = schedule.get_active_plan(request.user)
+        etag = self.get_etag(request.user, plan, start, end)
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            days = []
+            if plan is not None:
+                workouts = schedule.load_workouts(plan)
+                days = [
+                    {
+                        'date': date, 'day': day, 'is_rest': is_rest,
+                        'workout': workout.id if workout else None,
+                        'workout_name': workout.name if workout else None,
+                    }
+                    for date, day, workout, is_rest in schedule.iter_days(plan, workouts, start, end)
+                ]
+            response = Response({
+                'plan': plan.pk if plan else None, 'start': start, 'end': end,
+                'days': days, 'ics_url': feed_url(request, schedule.make_feed_token(request.user)),
+            })
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class CalendarFeedRotateView(APIView):
+    """
+    POST /api/calendar/feed/rotate/ revokes every ics_url handed out so far (e.g. one that leaked)
+    and returns a new one. Calendar apps subscribed to an old URL get 403 from then on.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({'ics_url': feed_url(request, schedule.rotate_feed_token(request.user))})
+
+
+class CalendarFeedView(CalendarMixin, APIView):
+    """
+    Streaming iCalendar feed of the active plan.
+    Calendar apps can't send a JWT, so they use ?token= from the ics_url returned by /api/calendar/.
+    Default range: 30 days back to a year ahead; up to ten years per request.
+    """
+    authentication_classes = [schedule.FeedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    default_days_before = 30
+    default_days_after = 395
+    max_days = 3660
+
+    def get(self, request):
+        user = request.user
+        try:
+            start, end = self.get_range(request)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        plan = schedule.get_active_plan(user)
+        if plan is None:
+            return Response({'detail': 'No active plan.'}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = self.get_etag(user, plan, start, end)
+        if etag_matches(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = StreamingHttpResponse(
+                schedule.iter_ics(plan, schedule.load_workouts(plan), start, end),
+                content_type='text/calendar; charset=utf-8',
+            )
+            response['Content-Disposition'] = 'inline; filename="plan.ics"'
+        response['ETag'] = etag
+        # Calendar apps poll; let them (and private caches) reuse the feed for a while
+        response['Cache-Control'] = f'private, max-age={settings.CALENDAR_FEED_MAX_AGE}'
+        return response
+
+
+def live_session_response(request, state, status_code=status.HTTP_200_OK):
+    # stream_url works without a JWT, for EventSource (which can't send headers)
+    stream_url = request.build_absolute_uri(reverse('live_session_stream') + '?token=' + live.make_stream_token(request.user))
+    return Response({**state, 'stream_url': stream_url}, status=status_code)
+
+
+class LiveSessionView(APIView):
+    """
+    The user's live workout session, shared by all their devices.
+    GET returns it, POST {"workout": id} starts one (replacing any active session), DELETE ends it.
+    Devices follow the changes on stream_url (/api/session/stream/) instead of polling.
+    stream_url can only be used to connect for LIVE_STREAM_TOKEN_MAX_AGE (5 minutes): when
+    a reconnect gets 401, GET the session again for a new one.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        state = live.get_state(request.user.pk)
+        if state is None:
+            return Response({'detail': 'No live session.'}, status=status.HTTP_404_NOT_FOUND)
+        return live_session_response(request, state)
+
+    def post(self, request):
+        serializer = LiveSessionStartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            state = live.start(request.user, serializer.validated_data['workout'])
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return live_session_response(request, state, status.HTTP_201_CREATED)
+
+    def delete(self, request):
+        try:
+            return Response(live.end(request.user))
+        except live.NoActiveSession:
+            return Response({'detail': 'No live session.'}, status=status.HTTP_404_NOT_FOUND)
+
+
+class LiveSessionUpdateView(APIView):
+    """
+    Changes to the active session; each returns the delta it pushed to the streams
+    ({"type", "revision", "data"}), so the sending device can apply it right away.
+    POST /api/session/sets/ {"workout_exercise", "reps", "weight", "rest"}: a completed set
+    POST /api/session/current/ {"workout_exercise"}: move to another exercise
+    POST /api/session/rest/ {"seconds"}: start (or with 0, stop) the rest timer
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    actions = {
+        'sets': (LiveSetSerializer, live.record_set),
+        'current': (LiveCurrentSerializer, live.set_current),
+        'rest': (LiveRestSerializer, live.set_rest),
+    }
+
+    def post(self, request, action):
+        serializer_class, apply = self.actions[action]
+        serializer = serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            return Response(apply(request.user, **serializer.validated_data))
+        except live.NoActiveSession:
+            return Response({'detail': 'No live session.'}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def live_session_stream(request):
+    """
+    Server-sent events for the user's live session (see api/live.py), authenticated once when the
+    stream opens with the stream_url ?token= or a JWT. Under ASGI, asgi.py answers this path before
+    Django does (live.serve_stream); this view serves it for runserver and WSGI.
+    """
+    user_id = live.authenticate_stream(request.GET.get('token'), request.headers.get('Authorization'))
+    # A plain Django view, so DRF's throttle doesn't run
+    allowed, wait = live.throttle_stream(user_id, request.META.get('HTTP_X_FORWARDED_FOR'), request.META.get('REMOTE_ADDR'))
+    if not allowed:
+        response = JsonResponse({'detail': 'Request was throttled.'}, status=429)
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
+    if user_id is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'}, status=401)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(live.iter_stream(user_id, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Stops nginx from buffering the events
+    return response
+
+
+class RankingsView(APIView):
+    """
+    Where the weekly sets of the user's active plan rank among all users, per muscle group.
+    A percentile of 80 means the plan has more volume for that muscle than 80% of plans.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        result = rankings.rankings_for(request.user)
+        if result is None:
+            return Response({'detail': 'No active plan.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(result)
+
+
+class MetricsView(APIView):
+    """
+    Prometheus scrape endpoint (DB pool usage etc.).
+    Authenticated with the static METRICS_TOKEN instead of a JWT.
+    """
+    authentication_classes = []
+    permission_classes = [HasMetricsToken]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
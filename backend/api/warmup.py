@@ -0,0 +1,108 @@
+"""
+Work a fresh worker would otherwise do on its first requests.
+
+fitness_project/wsgi.py and asgi.py call warm_up() once the application exists.
+With WARMUP_ON_START it imports the URLconf (and with it the views, serializers
+and most of DRF), compiles the URL patterns, resolves the DRF settings classes,
+builds the serializer fields, and loads the catalog snapshot and the substitutes
+index, so the first requests don't pay for them.
+
+The imports only move the cost: a worker takes about as long to its first
+response either way (see `manage.py bench_cold_start`). They pay off with
+`gunicorn --preload`, where the master does the work once and every forked
+worker inherits the result, hence off by default. The catalog step is the one
+that saves work: without it every worker reads (or builds) the snapshot and the
+index on the first request that needs them.
+
+The catalog step uses the database, so warm_up() closes every connection, and
+the pool, when it is done: under --preload it runs in the master, and a
+connection opened there would be shared by every forked worker.
+A failing step is logged and skipped; the request that needs it will do the work.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def _walk(patterns):
+    for pattern in patterns:
+        yield pattern
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns)
+
+
+def warm_urls():
+    """Import the URLconf and compile every pattern (regexes compile lazily, on first match)."""
+    resolver = get_resolver()
+    for pattern in _walk(resolver.url_patterns):
+        pattern.pattern.regex
+    resolver.reverse_dict # Populates the reverse() lookup tables
+
+
+def warm_rest_framework():
+    from rest_framework.settings import api_settings
+    from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+    # Imported on first access, then cached
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_THROTTLE_CLASSES', 'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+                 'DEFAULT_PAGINATION_CLASS'):
+        getattr(api_settings, name)
+    jwt_settings.AUTH_TOKEN_CLASSES
+
+
+def warm_serializers():
+    """Build each API view's serializer fields once, which fills the model metadata caches they read."""
+    seen = set()
+    for pattern in _walk(get_resolver().url_patterns):
+        view_class = getattr(getattr(pattern, 'callback', None), 'cls', None)
+        serializer_class = getattr(view_class, 'serializer_class', None)
+        if serializer_class is None or serializer_class in seen:
+            continue
+        seen.add(serializer_class)
+        serializer_class().fields
+
+
+def warm_catalog():
+    """Load the catalog snapshot (from CATALOG_SNAPSHOT_PATH if it is current) and the substitutes index built from it."""
+    from . import substitutes
+    substitutes.get_index() # Loads the snapshot first
+
+
+def close_connections():
+    """Close this process's connections and connection pools, so forked workers open their own."""
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        if getattr(connection, 'pool', None) is not None:
+            connection.close_pool()
+
+
+STEPS = (
+    ('urls', warm_urls),
+    ('rest_framework', warm_rest_framework),
+    ('serializers', warm_serializers),
+    ('catalog', warm_catalog),
+)
+
+
+def warm_up():
+    """Run the warm-up steps if WARMUP_ON_START. Returns ms per step."""
+    timings = {}
+    if not settings.WARMUP_ON_START:
+        return timings
+    started = time.perf_counter()
+    for name, step in STEPS:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Warm-up step %r failed', name)
+        timings[name] = round((time.perf_counter() - step_started) * 1000, 1)
+    close_connections()
+    logger.info('Warm-up took %.1f ms %s', (time.perf_counter() - started) * 1000, timings)
+    return timings
@@ -12,5 +12,18 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitness_project.settings')
+# Tells settings not to use persistent connections (one per thread) when the pool is off
+os.environ.setdefault('DJANGO_SERVER_MODE', 'asgi')
 
 application = get_asgi_application()
+
+# Optionally do the first request's imports and load the catalog caches before the worker
+# takes traffic. warm_up() closes the connections (and the pool) it used, so workers forked
+# from a --preload master open their own.
+from api.warmup import warm_up  # noqa: E402  (needs the app registry loaded above)
+warm_up() # If WARMUP_ON_START
+
+# Live session event streams (/api/session/stream/) are served before Django's handler,
+# so thousands of idle streams don't each keep a request thread (see api/live.py)
+from api.live import with_stream  # noqa: E402
+application = with_stream(application)
@@ -12,14 +12,16 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from dotenv import load_dotenv
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# get .env variables
-load_dotenv(os.path.join(BASE_DIR, '.env'))
+# get .env variables (dotenv is only imported when there is a file to read)
+ENV_FILE = os.path.join(BASE_DIR, '.env')
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -45,6 +47,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'corsheaders',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist', # Needed for refresh token rotation/revocation
     'api',
 ]
 
@@ -55,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.profiling.ProfilingMiddleware', # Staff-requested CPU profiles (X-Profile header)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,8 +78,8 @@ SIMPLE_JWT = {
 
     # --- Other Optional Settings ---
     # These are defaults, include them only if you need to change them.
-    'ROTATE_REFRESH_TOKENS': False, # Set to True if you want a new refresh token issued each time it's used.
-    'BLACKLIST_AFTER_ROTATION': False, # Requires setting up a blacklist app if True.
+    'ROTATE_REFRESH_TOKENS': True, # A new refresh token is issued each time one is used.
+    'BLACKLIST_AFTER_ROTATION': True, # The used one is revoked (checked via a Bloom filter, see api/revocation.py).
     'UPDATE_LAST_LOGIN': False, # Set to True to update user's last_login field on token refresh.
 
     'ALGORITHM': 'HS256',
@@ -102,8 +106,18 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5), # Only relevant if using sliding tokens
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1), # Only relevant if using sliding tokens
+
+    'TOKEN_REFRESH_SERIALIZER': 'api.tokens.RotatingTokenRefreshSerializer',
 }
 
+# --- Refresh Token Revocation ---
+# Per-worker Bloom filter over revoked refresh tokens (api/revocation.py)
+REVOCATION_BLOOM_FP_RATE = 0.01 # Share of non-revoked refreshes that still hit the database
+REVOCATION_BLOOM_MIN_CAPACITY = 10000
+REVOCATION_SYNC_INTERVAL = 2 # Seconds between picking up tokens revoked by other workers
+REVOCATION_SYNC_OVERLAP = 60 # Seconds each sync re-reads, for rows that commit after a later one
+REVOCATION_REBUILD_INTERVAL = 600 # Seconds between full rebuilds (drops expired entries)
+
 ROOT_URLCONF = 'fitness_project.urls'
 
 TEMPLATES = [
@@ -135,9 +149,116 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'), 
         'HOST': os.getenv('DB_HOST'), 
         'PORT': os.getenv('DB_PORT'), 
+        # Ping a reused connection before handing it out (also turns on the pool's check callback)
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+# --- Connection Pooling ---
+# Uses the psycopg 3 pool built into Django's postgresql backend (needs psycopg[pool]).
+# A pooled connection is handed back at the end of every request instead of being closed,
+# so requests stop paying for TCP setup + auth. This is also the only safe way to reuse
+# connections under ASGI, where every request runs on a different thread.
+# Set DB_POOL=False to fall back to plain (optionally persistent) connections.
+DB_POOL = os.getenv('DB_POOL', 'True').lower() in ('1', 'true', 'yes')
+
+# asgi.py sets this before loading settings
+SERVER_MODE = os.getenv('DJANGO_SERVER_MODE', 'wsgi')
+
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        # Seconds a request may wait for a free connection before PoolTimeout
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        # Recycle connections after this many seconds, even if healthy
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        # Shrink back towards min_size after connections sit idle this long
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+    }
+    # Pooling and persistent connections are mutually exclusive in Django
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+elif SERVER_MODE == 'asgi':
+    # Persistent connections leak one connection per worker thread under ASGI
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 60))
+
+# --- Catalog Snapshot ---
+# Workers keep exercises/muscle groups in memory (api/catalog.py) and re-check the
+# catalog version at most this often (seconds). Writes in the same worker apply immediately.
+CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv('CATALOG_VERSION_CHECK_INTERVAL', 2))
+# Optional file the snapshot is written to and memory-mapped from, shared by all workers on a host
+CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH')
+
+# Exercise substitutions (/api/exercises/<id>/substitutes/): neighbors precomputed per exercise
+SUBSTITUTES_DEFAULT_K = 5
+SUBSTITUTES_MAX_K = 20
+
+# --- Delta Sync (/api/sync/) ---
+SYNC_PAGE_SIZE = 500 # Rows per page when the client doesn't ask for a limit
+SYNC_MAX_PAGE_SIZE = 2000
+SYNC_OVERLAP = 5 # Seconds each cycle re-reads before the previous one ended (covers slow commits)
+SYNC_TOMBSTONE_RETENTION_DAYS = 30 # Older sync tokens must do a full resync
+
+# --- Request Profiling (api/profiling.py, stored profiles are in the admin) ---
+# Off by default; when off the middleware removes itself. Turn it on where staff need to profile.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0')) # Share of API requests profiled unasked
+PROFILING_SAMPLE_INTERVAL = 0.005 # Seconds between stack samples (the GIL switch interval is 5 ms too)
+PROFILING_MAX_STORED = 500
+
+# --- Worker Start-up (api/warmup.py, called from wsgi.py / asgi.py) ---
+# Do the URLconf/DRF imports and load the catalog snapshot and substitutes index before the worker
+# takes traffic. Worth it with gunicorn --preload (done once in the master); otherwise the imports
+# only move their cost from the first request to start-up.
+WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'False').lower() in ('1', 'true', 'yes')
+
+# --- Live Workout Sessions (api/live.py; stream at /api/session/stream/, served by asgi.py) ---
+# 'postgres' = LISTEN/NOTIFY, so changes reach the streams on every worker; 'local' = this process only (one worker, tests)
+LIVE_BROKER = os.getenv('LIVE_BROKER', 'postgres')
+LIVE_HEARTBEAT = 15 # Seconds between keep-alive comments on an idle stream (proxies drop silent connections)
+LIVE_STREAM_MAX_AGE = 3600 # Streams are closed after this long; EventSource reconnects with Last-Event-ID
+LIVE_RETRY_MS = 3000 # Reconnect delay sent to EventSource clients
+LIVE_STREAM_TOKEN_MAX_AGE = 300 # Seconds a stream_url (?token=) can be used to connect; clients fetch a new one from /api/session/
+LIVE_QUEUE_SIZE = 64 # Events buffered per stream; a client further behind gets a fresh snapshot instead
+LIVE_MAX_REST = 3600 # Longest rest timer, in seconds
+
+# --- Volume Rankings (api/rankings.py, /api/rankings/) ---
+# Weekly sets per muscle group are ranked in steps of this size (medium/low activation sets count 0.5/0.25).
+# After changing it or RANKINGS_MAX_SETS, run `manage.py rebuild_rankings`.
+RANKINGS_STEP = 0.25
+RANKINGS_MAX_SETS = 100 # More weekly sets than this all rank the same
+RANKINGS_VERSION_CHECK_INTERVAL = float(os.getenv('RANKINGS_VERSION_CHECK_INTERVAL', 30)) # Seconds
+RANKINGS_BATCH_SIZE = 1000 # Users recomputed per transaction
+
+# --- Background Jobs (api/jobs.py, run with `manage.py run_jobs`) ---
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '4')) # Threads per run_jobs process
+JOBS_POLL_INTERVAL = 1.0 # Seconds an idle worker waits before looking for new jobs
+JOBS_LEASE_SECONDS = 300 # A job whose worker stops renewing its lease this long is run again
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 10 # Seconds before the first retry; doubles each attempt
+JOBS_RETRY_BACKOFF_MAX = 3600
+JOBS_RETENTION_DAYS = 7 # Finished jobs (and their results) are kept this long
+JOBS_METRICS_WINDOW = 300 # Seconds of finished jobs the latency metrics average over
+# Maintenance tasks run_jobs queues periodically: task name -> seconds between runs
+JOBS_SCHEDULE = {
+    'jobs.prune_finished': 3600,
+    'sync.prune_tombstones': 24 * 3600,
+    'tokens.prune_revoked': 24 * 3600,
+}
+PRUNE_BATCH_SIZE = 10000 # Rows deleted per statement by the prune tasks
+
+# Seconds calendar apps may reuse /api/calendar/feed.ics before polling again
+CALENDAR_FEED_MAX_AGE = 900
+
+# Max operations accepted by /api/batch/
+BATCH_MAX_OPERATIONS = 50
+
+# Token for scraping /api/metrics/ without a staff login (sent as "Authorization: Bearer <token>")
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -168,12 +289,50 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
 
+    # --- Throttling ---
+    # Token buckets shared across worker processes (api/throttling.py)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.TokenBucketThrottle',
+    ),
+
     # --- Optional: Default Pagination ---
     # Uncomment and configure if you want pagination on list views by default.
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     # 'PAGE_SIZE': 10
 }
 
+# --- Password Hashing ---
+# Argon2 (memory-hard) for new hashes; PBKDF2 stays listed so older hashes still verify
+# and get upgraded to argon2 on the user's next login.
+PASSWORD_HASHERS = [
+    'api.hashers.PooledArgon2PasswordHasher',
+    'api.hashers.PooledPBKDF2PasswordHasher',
+]
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 65536)) # KiB (64 MiB)
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 2))
+
+# Hashes run on a small per-process pool instead of inline on the request worker (api/hashing.py)
+PASSWORD_HASHING_POOL = os.getenv('PASSWORD_HASHING_POOL', 'True').lower() in ('1', 'true', 'yes')
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 2))
+# Concurrent login limit: hashes running + queued before new logins get a 429
+PASSWORD_HASHING_MAX_PENDING = int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 8))
+PASSWORD_HASHING_RETRY_AFTER = 1 # Seconds, sent as Retry-After with the 429
+
+# Token bucket sizes: refill `rate` tokens/second up to `burst`. Views weight their
+# actions with `throttle_costs` (e.g. nested plan lists cost more than a detail read).
+THROTTLE_BUCKETS = {
+    'user': {'rate': float(os.getenv('THROTTLE_USER_RATE', 10)), 'burst': float(os.getenv('THROTTLE_USER_BURST', 60))},
+    'anon': {'rate': float(os.getenv('THROTTLE_ANON_RATE', 2)), 'burst': float(os.getenv('THROTTLE_ANON_BURST', 20))},
+}
+# 'shared' = memory-mapped file used by every worker on the host, 'memory' = per process.
+# Without a store path (no /dev/shm) or without fcntl (Windows), 'shared' falls back to 'memory'.
+THROTTLE_STORE = os.getenv('THROTTLE_STORE', 'shared')
+THROTTLE_STORE_PATH = os.getenv('THROTTLE_STORE_PATH') or (
+    '/dev/shm/fitness-throttle' if os.path.isdir('/dev/shm') else None
+)
+THROTTLE_STORE_SLOTS = 65536 # ~1.5 MB; least recently used buckets are recycled when full
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitness_project.settings')
 
 application = get_wsgi_application()
+
+# Optionally do the first request's imports and load the catalog caches before the worker
+# takes traffic. warm_up() closes the connections (and the pool) it used, so workers forked
+# from a --preload master open their own.
+from api.warmup import warm_up  # noqa: E402  (needs the app registry loaded above)
+warm_up() # If WARMUP_ON_START
@@ -93,9 +93,8 @@ apiClient.interceptors.response.use(
 
 
         const newAccessToken = refreshResponse.data.access;
-        // Note: Your refresh endpoint might return a new refresh token as well.
-        // If so, you should update it in the store. Assuming here it only returns access.
-        const newRefreshToken = refreshToken; // Or refreshResponse.data.refresh if applicable
+        // The backend rotates refresh tokens: the old one is revoked, so store the new one
+        const newRefreshToken = refreshResponse.data.refresh || refreshToken;
 
         console.log('Token refreshed successfully.');
         // Call the action from the store instance